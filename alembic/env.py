@@ -18,6 +18,7 @@ from shared_models.documents_models import *
 from shared_models.mentor_models import *
 from shared_models.tutor_models import *
 from shared_models.rag_models import *
+from shared_models.anti_cheat_partitions import DEFAULT_PARTITION, PARTITION_PATTERN
 # Добавляем путь к нашему проекту в sys.path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
@@ -34,6 +35,20 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+
+def _is_partition(name):
+    return name == DEFAULT_PARTITION or PARTITION_PATTERN.match(name) is not None
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Партиции anti_cheat_incidents создаются вне моделей (см. anti_cheat_partitions)."""
+    if type_ == "table" and reflected:
+        return not _is_partition(name)
+    if type_ == "index" and reflected:
+        return not _is_partition(object.table.name)
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -64,6 +79,7 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -101,7 +117,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
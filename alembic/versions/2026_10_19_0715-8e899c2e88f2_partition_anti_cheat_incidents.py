@@ -0,0 +1,133 @@
+"""partition anti cheat incidents
+
+Revision ID: 8e899c2e88f2
+Revises: 941b4208b5ce
+Create Date: 2026-10-19 07:15:32.682581
+
+"""
+
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "8e899c2e88f2"
+down_revision: Union[str, Sequence[str], None] = "941b4208b5ce"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, session_id, user_id, session_type, incident_type, description, metadata, created_at"
+MONTHS_AHEAD = 2
+
+
+def _months(first: date, last: date):
+    while first <= last:
+        yield first
+        first = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+
+
+def _incident_columns():
+    return [
+        sa.Column("id", sa.Integer(), server_default=sa.text("nextval('anti_cheat_incidents_id_seq'::regclass)")),
+        sa.Column("session_id", sa.String(length=255), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "session_type", sa.String(length=32), nullable=False, comment="Type of session: 'ai_tutor' or 'quiz'"
+        ),
+        sa.Column(
+            "incident_type",
+            sa.String(length=64),
+            nullable=False,
+            comment="Type of violation: 'focus_loss', 'dev_tools_detected', 'screenshot_blocked', etc.",
+        ),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column(
+            "metadata", sa.JSON(), nullable=True, comment="Additional context: user_agent, ip, browser_info, etc."
+        ),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+    ]
+
+
+def _rename_old_table(old: str) -> None:
+    op.rename_table("anti_cheat_incidents", old)
+    for index in (
+        "anti_cheat_incidents_pkey",
+        "ix_anti_cheat_incidents_session_id",
+        "ix_anti_cheat_incidents_user_id",
+        "ix_anti_cheat_incidents_created_at",
+        "ix_anti_cheat_incidents_created_brin",
+    ):
+        op.execute(f"ALTER INDEX IF EXISTS {index} RENAME TO {old}_{index.removeprefix('anti_cheat_incidents_')}")
+    op.execute(f"ALTER TABLE {old} ALTER COLUMN id DROP DEFAULT")
+    op.execute(f"ALTER TABLE {old} DROP CONSTRAINT IF EXISTS anti_cheat_incidents_user_id_fkey")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "anti_cheat_daily_stats",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("session_type", sa.String(length=32), nullable=False),
+        sa.Column("incident_type", sa.String(length=64), nullable=False),
+        sa.Column("incident_count", sa.Integer(), nullable=False),
+        sa.Column("session_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("day", "user_id", "session_type", "incident_type"),
+    )
+
+    # anti_cheat_incidents becomes a table range-partitioned by month on created_at.
+    # A partitioned table's primary key must contain the partition key.
+    _rename_old_table("anti_cheat_incidents_unpartitioned")
+    op.create_table(
+        "anti_cheat_incidents",
+        *_incident_columns(),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    op.create_index("ix_anti_cheat_incidents_session_id", "anti_cheat_incidents", ["session_id"], unique=False)
+    op.create_index("ix_anti_cheat_incidents_user_id", "anti_cheat_incidents", ["user_id"], unique=False)
+    op.create_index(
+        "ix_anti_cheat_incidents_created_brin",
+        "anti_cheat_incidents",
+        ["created_at"],
+        unique=False,
+        postgresql_using="brin",
+    )
+    op.execute("CREATE TABLE anti_cheat_incidents_default PARTITION OF anti_cheat_incidents DEFAULT")
+
+    oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM anti_cheat_incidents_unpartitioned")).scalar()
+    now = datetime.now(timezone.utc)
+    first = (oldest or now).astimezone(timezone.utc).date().replace(day=1)
+    last = date(now.year + (now.month + MONTHS_AHEAD - 1) // 12, (now.month + MONTHS_AHEAD - 1) % 12 + 1, 1)
+    for month in _months(first, last):
+        upper = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        op.execute(
+            f"CREATE TABLE anti_cheat_incidents_p{month:%Y%m} PARTITION OF anti_cheat_incidents "
+            f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{upper} 00:00:00+00')"
+        )
+
+    op.execute(f"INSERT INTO anti_cheat_incidents ({COLUMNS}) SELECT {COLUMNS} FROM anti_cheat_incidents_unpartitioned")
+    op.execute("ALTER SEQUENCE anti_cheat_incidents_id_seq OWNED BY anti_cheat_incidents.id")
+    op.drop_table("anti_cheat_incidents_unpartitioned")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rename_old_table("anti_cheat_incidents_partitioned")
+    op.create_table(
+        "anti_cheat_incidents",
+        *_incident_columns(),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_anti_cheat_incidents_session_id", "anti_cheat_incidents", ["session_id"], unique=False)
+    op.create_index("ix_anti_cheat_incidents_user_id", "anti_cheat_incidents", ["user_id"], unique=False)
+    op.create_index("ix_anti_cheat_incidents_created_at", "anti_cheat_incidents", ["created_at"], unique=False)
+    op.execute(f"INSERT INTO anti_cheat_incidents ({COLUMNS}) SELECT {COLUMNS} FROM anti_cheat_incidents_partitioned")
+    op.execute("ALTER SEQUENCE anti_cheat_incidents_id_seq OWNED BY anti_cheat_incidents.id")
+    # Drops the partitions with it.
+    op.drop_table("anti_cheat_incidents_partitioned")
+    op.drop_table("anti_cheat_daily_stats")
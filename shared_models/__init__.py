@@ -49,7 +49,41 @@ from .payment_models import (
     TopupRequest,
     WithdrawRequest,
     TopicVote,
+    LedgerBalanceTotal,
+    LedgerReconciliationCheckpoint,
+    BalanceSnapshot,
+    BookingReservation,
+    LedgerPosting,
 )
+from .payment_manager import (
+    PaymentManager,
+    PaymentError,
+    InsufficientFundsError,
+    BalanceConflictError,
+    BalanceDelta,
+)
+from .payment_reconciliation import LedgerReconciler
+from .ai_metering import AITokenMeter, MeterWindow
+from .balance_history import BalanceSnapshotBuilder, balance_at, balance_statement
+from .booking_reservations import ReservationManager, ReservationError
+from .payment_admin import PaymentQueue
+from .ledger_export import export_csv, export_parquet, iter_ledger_chunks
+from .ledger_postings import backfill_postings, posting_balance, verify_transfers
+from .idempotency import BloomFilter, IdempotencyGuard
+from .topic_votes import TopicVoteBuffer, ingest_votes
+from .quiz_storage import load_questions, load_quiz_payload, store_payload, update_question, delete_question
+from .quiz_progress import record_answer
+from .quiz_stats import leaderboard, quiz_stats, rebuild_quiz_stats, record_results
+from .quiz_cache import CompiledQuestion, CompiledQuiz, QuizCache, compile_quiz
+from .quiz_grading import GradedBatch, grade_batch, regrade_quiz
+from .course_progress import complete_quiz, rebuild_course_progress
+from .quiz_access import check_quiz_access
+from .quiz_sweeper import sweep_abandoned_attempts
+from .quiz_bundle import clone_course, export_bundle, import_bundle
+from .anti_cheat import AntiCheatIncidentBuffer, ingest_incidents, session_incidents, violation_decision
+from .anti_cheat_partitions import ensure_partitions, roll_up_partitions
+from .tutor_transcript import TutorTranscript, load_transcript
+from .tutor_turns import TutorTurn, TutorTurnResult
 from .schemas import (
     # Category schemas
     CategoryBase,
@@ -92,6 +126,27 @@ from .schemas import (
     WithdrawRequestResponse,
     InternalTransferRequest,
     TopicVoteResponse,
+    LedgerWriteResult,
+    LedgerEntryCreate,
+    BatchSettlementResult,
+    BalanceDrift,
+    ReconciliationReport,
+    BalancePoint,
+    BalanceStatement,
+    ReservationStatus,
+    BookingReservationResponse,
+    PaymentQueueItem,
+    PaymentQueuePage,
+    BulkApprovalResult,
+    LedgerExportFilter,
+    LedgerExportResult,
+    PostingSide,
+    TransferVerification,
+    TopicVoteBatchResult,
+    AntiCheatIncidentCreate,
+    IncidentBatchResult,
+    AntiCheatAction,
+    AntiCheatDecision,
 )
 from .database import engine, SessionLocal, get_db
 
@@ -134,6 +189,70 @@ __all__ = [
     "TopupRequest",
     "WithdrawRequest",
     "TopicVote",
+    "LedgerBalanceTotal",
+    "LedgerReconciliationCheckpoint",
+    "BalanceSnapshot",
+    "BookingReservation",
+    "LedgerPosting",
+    # Ledger engine
+    "PaymentManager",
+    "PaymentError",
+    "InsufficientFundsError",
+    "BalanceConflictError",
+    "BalanceDelta",
+    "LedgerReconciler",
+    "AITokenMeter",
+    "MeterWindow",
+    "BalanceSnapshotBuilder",
+    "balance_at",
+    "balance_statement",
+    "ReservationManager",
+    "ReservationError",
+    "PaymentQueue",
+    "export_csv",
+    "export_parquet",
+    "iter_ledger_chunks",
+    "backfill_postings",
+    "posting_balance",
+    "verify_transfers",
+    "BloomFilter",
+    "IdempotencyGuard",
+    "TopicVoteBuffer",
+    "ingest_votes",
+    "load_questions",
+    "load_quiz_payload",
+    "store_payload",
+    "update_question",
+    "delete_question",
+    "record_answer",
+    "leaderboard",
+    "quiz_stats",
+    "rebuild_quiz_stats",
+    "record_results",
+    "CompiledQuestion",
+    "CompiledQuiz",
+    "QuizCache",
+    "compile_quiz",
+    "GradedBatch",
+    "grade_batch",
+    "regrade_quiz",
+    "complete_quiz",
+    "rebuild_course_progress",
+    "check_quiz_access",
+    "sweep_abandoned_attempts",
+    "clone_course",
+    "export_bundle",
+    "import_bundle",
+    "AntiCheatIncidentBuffer",
+    "ingest_incidents",
+    "violation_decision",
+    "session_incidents",
+    "ensure_partitions",
+    "roll_up_partitions",
+    "TutorTranscript",
+    "load_transcript",
+    "TutorTurn",
+    "TutorTurnResult",
     # Category schemas
     "CategoryBase",
     "CategoryCreate",
@@ -175,6 +294,27 @@ __all__ = [
     "WithdrawRequestResponse",
     "InternalTransferRequest",
     "TopicVoteResponse",
+    "LedgerWriteResult",
+    "LedgerEntryCreate",
+    "BatchSettlementResult",
+    "BalanceDrift",
+    "ReconciliationReport",
+    "BalancePoint",
+    "BalanceStatement",
+    "ReservationStatus",
+    "BookingReservationResponse",
+    "PaymentQueueItem",
+    "PaymentQueuePage",
+    "BulkApprovalResult",
+    "LedgerExportFilter",
+    "LedgerExportResult",
+    "PostingSide",
+    "TransferVerification",
+    "TopicVoteBatchResult",
+    "AntiCheatIncidentCreate",
+    "IncidentBatchResult",
+    "AntiCheatAction",
+    "AntiCheatDecision",
     # Database
     "engine",
     "SessionLocal",
@@ -0,0 +1,213 @@
+"""Buffered metering of AI token usage into ``spend_ai_tokens`` ledger entries.
+
+Writing one ``balance_transactions`` row per LLM call multiplies ledger
+writes by the number of calls in a tutor session, while the same usage is
+already recorded per call in ``TutorMessage.tokens_used`` and
+``TutorRAGUsage.total_tokens``. ``AITokenMeter`` accumulates usage in memory
+per ``(user_id, session_id)`` window and turns each closed window into a
+single ``spend_ai_tokens`` entry, settled with ``PaymentManager.settle_batch``.
+
+A window is closed when it reaches ``max_tokens`` / ``max_calls`` or is older
+than ``max_age``. Its idempotency key is derived from the window itself
+(user, session, the timestamp of its first call and its size), so re-flushing
+an unchanged window after a failed transaction never charges twice, while a
+window that grew in the meantime is charged under a new key.
+"""
+
+from __future__ import annotations
+
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy.orm import Session
+
+from shared_models.payment_manager import ZERO, PaymentManager, quantize
+from shared_models.schemas import BatchSettlementResult, LedgerEntryCreate, TransactionType
+
+SessionKey = Union[uuid.UUID, str, None]
+WindowKey = Tuple[int, Optional[str]]
+
+
+@dataclass
+class MeterWindow:
+    """Token usage of one user/session accumulated since ``started_at``."""
+
+    user_id: int
+    session_id: Optional[str]
+    started_at: datetime
+    last_at: datetime
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    models: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def idempotency_key(self) -> str:
+        started = int(self.started_at.timestamp() * 1_000_000)
+        return f"ai_tokens:{self.user_id}:{self.session_id or '-'}:{started}:{self.calls}:{self.total_tokens}"
+
+    def merge(self, other: "MeterWindow") -> None:
+        """Fold a newer window of the same user/session into this one."""
+        self.last_at = max(self.last_at, other.last_at)
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        for model, tokens in other.models.items():
+            self.models[model] = self.models.get(model, 0) + tokens
+
+
+class AITokenMeter:
+    """In-process aggregation buffer for ``spend_ai_tokens`` charges.
+
+    Thread-safe; one instance is meant to be shared by the whole worker.
+
+    Args:
+        price_per_1k_tokens: Credits charged per 1000 tokens (prompt + completion).
+        max_tokens: Close a window once it holds this many tokens.
+        max_calls: Close a window once it holds this many calls.
+        max_age: Close a window this long after its first call.
+        allow_overdraft: Passed to ``settle_batch`` — usage has already
+            happened, so by default it is charged even past zero.
+    """
+
+    def __init__(
+        self,
+        price_per_1k_tokens: Decimal,
+        *,
+        max_tokens: int = 20_000,
+        max_calls: int = 50,
+        max_age: timedelta = timedelta(minutes=5),
+        allow_overdraft: bool = True,
+    ):
+        self.price_per_1k_tokens = Decimal(price_per_1k_tokens)
+        self.max_tokens = max_tokens
+        self.max_calls = max_calls
+        self.max_age = max_age
+        self.allow_overdraft = allow_overdraft
+        self._windows: Dict[WindowKey, MeterWindow] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def record(
+        self,
+        user_id: int,
+        session_id: SessionKey,
+        prompt_tokens: int,
+        completion_tokens: int,
+        *,
+        model: Optional[str] = None,
+        at: Optional[datetime] = None,
+    ) -> bool:
+        """Add one LLM call to the buffer.
+
+        Returns True when the user/session window is due for flushing, so
+        request handlers can trigger ``flush()`` without polling.
+        """
+        if prompt_tokens < 0 or completion_tokens < 0:
+            raise ValueError("Token counts must be non-negative")
+        at = at or datetime.now(timezone.utc)
+        key = (user_id, str(session_id) if session_id is not None else None)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = MeterWindow(user_id, key[1], started_at=at, last_at=at)
+            window.last_at = max(window.last_at, at)
+            window.calls += 1
+            window.prompt_tokens += prompt_tokens
+            window.completion_tokens += completion_tokens
+            if model:
+                window.models[model] = window.models.get(model, 0) + prompt_tokens + completion_tokens
+            return self._is_due(window, at)
+
+    def flush(
+        self,
+        db: Session,
+        *,
+        force: bool = False,
+        now: Optional[datetime] = None,
+        payments: Optional[PaymentManager] = None,
+    ) -> BatchSettlementResult:
+        """Settle every due window (or all of them with ``force``) in one batch.
+
+        Settled with ``payments`` (a default ``PaymentManager`` on ``db``).
+        The caller commits. If settlement raises, the drained windows are put
+        back into the buffer; a window that picks up newer usage before the
+        retry is charged under a new key, the others under the same ones.
+        """
+        windows = self.drain(force=force, now=now)
+        if not windows:
+            return BatchSettlementResult()
+        entries: List[LedgerEntryCreate] = []
+        pending: List[MeterWindow] = []
+        for window in windows:
+            entry = self.to_entry(window)
+            if entry is not None:
+                entries.append(entry)
+            elif not force:
+                # Below one cent so far — keep accumulating instead of rounding away.
+                pending.append(window)
+        self.requeue(pending)
+        try:
+            return (payments or PaymentManager(db)).settle_batch(entries, allow_overdraft=self.allow_overdraft)
+        except Exception:
+            kept = {id(window) for window in pending}
+            self.requeue([window for window in windows if id(window) not in kept])
+            raise
+
+    def drain(self, *, force: bool = False, now: Optional[datetime] = None) -> List[MeterWindow]:
+        """Remove and return the windows that are due (all of them with ``force``)."""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            due = [key for key, window in self._windows.items() if force or self._is_due(window, now)]
+            return [self._windows.pop(key) for key in due]
+
+    def requeue(self, windows: List[MeterWindow]) -> None:
+        """Return drained windows to the buffer, merging usage recorded since they were drained."""
+        with self._lock:
+            for window in windows:
+                key = (window.user_id, window.session_id)
+                newer = self._windows.get(key)
+                self._windows[key] = window
+                if newer is not None:
+                    window.merge(newer)
+
+    def to_entry(self, window: MeterWindow) -> Optional[LedgerEntryCreate]:
+        """Ledger entry for a closed window; None when it rounds to zero credits."""
+        amount = quantize(self.price_per_1k_tokens * window.total_tokens / 1000)
+        if amount <= ZERO:
+            return None
+        return LedgerEntryCreate(
+            user_id=window.user_id,
+            amount=amount,
+            transaction_type=TransactionType.spend_ai_tokens,
+            idempotency_key=window.idempotency_key,
+            reference_type="ai_session",
+            description=f"AI usage: {window.calls} calls, {window.total_tokens} tokens",
+            ai_tokens_used=window.total_tokens,
+            ai_tokens_prompt=window.prompt_tokens,
+            ai_tokens_completion=window.completion_tokens,
+            extra_metadata={
+                "session_id": window.session_id,
+                "calls": window.calls,
+                "window_start": window.started_at.isoformat(),
+                "window_end": window.last_at.isoformat(),
+                "models": window.models or None,
+            },
+        )
+
+    def _is_due(self, window: MeterWindow, now: datetime) -> bool:
+        return (
+            window.total_tokens >= self.max_tokens
+            or window.calls >= self.max_calls
+            or now - window.started_at >= self.max_age
+        )
@@ -0,0 +1,300 @@
+"""Batched ingestion of ``AntiCheatIncident`` rows.
+
+Exam clients report incidents in bursts — a student alt-tabbing produces a
+``focus_loss`` every few hundred milliseconds — and one ``INSERT`` (and one
+pooled connection) per report does not survive exam day.
+``AntiCheatIncidentBuffer`` collects incidents in memory and
+``ingest_incidents`` writes a whole batch with one ``executemany``, which
+SQLAlchemy sends as multi-row ``INSERT … VALUES`` pages.
+
+The buffer also collapses repeats: an incident of the same type as the
+previous incident of the same session, within ``repeat_window`` of it, is not
+stored again. While the first one is still buffered the repeat is counted in
+its ``metadata["repeat_count"]`` (and ``metadata["last_seen_at"]``). Every
+repeat, including those arriving after the first one was flushed, is also
+added to the session's ``anti_cheat_session_counters.repeat_count`` by the
+next ``flush``. Client timestamps without a time zone are taken as UTC.
+
+Every insert also bumps ``anti_cheat_session_counters`` (one additive upsert
+per batch), so enforcing ``anti_cheat_config.warnings_limit`` is a primary-key
+read instead of a ``COUNT`` over the session's incidents:
+``violation_decision`` returns ``warn`` for the first ``warnings_limit``
+violations and ``terminate`` after that. Given the worker's buffer it also
+counts the session's incidents that are not flushed yet.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from shared_models.models import AntiCheatIncident, AntiCheatSessionCounter
+from shared_models.schemas import (
+    AntiCheatAction,
+    AntiCheatDecision,
+    AntiCheatIncidentCreate,
+    IncidentBatchResult,
+)
+
+IncidentLike = Union[AntiCheatIncidentCreate, Dict[str, Any]]
+
+
+def incident_row(incident: IncidentLike, *, at: Optional[datetime] = None) -> Dict[str, Any]:
+    """Insert parameters of one incident; ``created_at`` falls back to ``at`` or now and is converted to UTC."""
+    if not isinstance(incident, AntiCheatIncidentCreate):
+        incident = AntiCheatIncidentCreate.model_validate(incident)
+    created_at = incident.created_at or at or datetime.now(timezone.utc)
+    return {
+        "session_id": incident.session_id,
+        "user_id": incident.user_id,
+        "session_type": incident.session_type,
+        "incident_type": incident.incident_type,
+        "description": incident.description,
+        "metadata": dict(incident.metadata) if incident.metadata is not None else None,
+        "created_at": (
+            created_at.astimezone(timezone.utc) if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+        ),
+    }
+
+
+def ingest_incidents(db: Session, incidents: Iterable[IncidentLike]) -> int:
+    """Insert incidents with one ``executemany``; returns how many. The caller commits."""
+    return _insert(db, [incident_row(incident) for incident in incidents])
+
+
+class AntiCheatIncidentBuffer:
+    """In-process buffer of incidents, flushed with ``ingest_incidents``.
+
+    Thread-safe; one instance is meant to be shared by the whole worker.
+
+    Args:
+        max_incidents: The buffer is due for flushing once it holds this many incidents.
+        max_age: ... or once its oldest incident is this old.
+        repeat_window: Same-type incidents of a session closer than this are collapsed.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_incidents: int = 1000,
+        max_age: timedelta = timedelta(seconds=1),
+        repeat_window: timedelta = timedelta(seconds=5),
+    ):
+        self.max_incidents = max_incidents
+        self.max_age = max_age
+        self.repeat_window = repeat_window
+        self._rows: List[Dict[str, Any]] = []
+        self._oldest: Optional[datetime] = None
+        # session_id → counter row of the repeats collapsed since the last flush
+        self._repeats: Dict[str, Dict[str, Any]] = {}
+        self._pending: Counter[str] = Counter()
+        # session_id → (incident_type, last seen, buffered row or None once flushed)
+        self._last: Dict[str, Tuple[str, datetime, Optional[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def pending(self, session_id: str) -> int:
+        """Incidents of ``session_id`` buffered but not flushed yet."""
+        with self._lock:
+            return self._pending[session_id]
+
+    def record(self, incident: IncidentLike, *, at: Optional[datetime] = None) -> bool:
+        """Buffer one incident; returns True when the buffer is due for flushing."""
+        at = at or datetime.now(timezone.utc)
+        row = incident_row(incident, at=at)
+        with self._lock:
+            last = self._last.get(row["session_id"])
+            if (
+                last is not None
+                and last[0] == row["incident_type"]
+                and row["created_at"] - last[1] <= self.repeat_window
+            ):
+                repeats = self._repeats.get(row["session_id"])
+                if repeats is None:
+                    repeats = self._repeats[row["session_id"]] = _counter_row(row, violations=0)
+                repeats["repeat_count"] += 1
+                repeats["last_incident_at"] = max(repeats["last_incident_at"], row["created_at"])
+                if self._oldest is None:
+                    self._oldest = at
+                previous = last[2]
+                if previous is not None:
+                    metadata = previous["metadata"] = dict(previous["metadata"] or {})
+                    metadata["repeat_count"] = metadata.get("repeat_count", 0) + 1
+                    metadata["last_seen_at"] = row["created_at"].isoformat()
+                self._last[row["session_id"]] = (last[0], row["created_at"], previous)
+            else:
+                self._rows.append(row)
+                self._pending[row["session_id"]] += 1
+                self._last[row["session_id"]] = (row["incident_type"], row["created_at"], row)
+                if self._oldest is None or at < self._oldest:
+                    self._oldest = at
+            return self._is_due(at)
+
+    def flush(self, db: Session, *, force: bool = False, now: Optional[datetime] = None) -> IncidentBatchResult:
+        """Write the buffered incidents if the buffer is due (always with ``force``).
+
+        The caller commits. If the insert raises, the incidents are put back
+        into the buffer.
+        """
+        rows, repeats = self._take(force=force, now=now, repeats=True)
+        try:
+            inserted = _insert(db, rows, repeats)
+        except Exception:
+            self.requeue(rows, repeats)
+            raise
+        return IncidentBatchResult(inserted=inserted, collapsed=sum(counter["repeat_count"] for counter in repeats))
+
+    def drain(self, *, force: bool = False, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Remove and return the buffered insert rows if due (all of them with ``force``).
+
+        Repeat counts stay in the buffer for the next ``flush``.
+        """
+        return self._take(force=force, now=now, repeats=False)[0]
+
+    def requeue(self, rows: Iterable[Dict[str, Any]], repeats: Iterable[Dict[str, Any]] = ()) -> None:
+        """Return drained rows (and the repeat counts taken with them) to the buffer."""
+        with self._lock:
+            rows = list(rows)
+            self._rows[:0] = rows
+            self._pending.update(row["session_id"] for row in rows)
+            for counter in repeats:
+                current = self._repeats.get(counter["session_id"])
+                if current is None:
+                    self._repeats[counter["session_id"]] = dict(counter)
+                else:
+                    current["repeat_count"] += counter["repeat_count"]
+                    current["last_incident_at"] = max(current["last_incident_at"], counter["last_incident_at"])
+            if (self._rows or self._repeats) and self._oldest is None:
+                self._oldest = datetime.now(timezone.utc)
+
+    def _take(
+        self, *, force: bool, now: Optional[datetime], repeats: bool
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            if not (self._rows or (repeats and self._repeats)) or not (force or self._is_due(now)):
+                return [], []
+            rows, self._rows = self._rows, []
+            taken: List[Dict[str, Any]] = []
+            if repeats:
+                taken, self._repeats = list(self._repeats.values()), {}
+            self._oldest = now if self._repeats else None
+            self._pending.clear()
+            # Flushed rows can no longer absorb repeats; forget sessions that went quiet.
+            self._last = {
+                session_id: (incident_type, seen, None)
+                for session_id, (incident_type, seen, _) in self._last.items()
+                if now - seen <= self.repeat_window
+            }
+            return rows, taken
+
+    def _is_due(self, now: datetime) -> bool:
+        return len(self._rows) >= self.max_incidents or (
+            self._oldest is not None and now - self._oldest >= self.max_age
+        )
+
+
+def session_incidents(
+    db: Session, session_id: str, *, since: datetime, until: Optional[datetime] = None
+) -> List[AntiCheatIncident]:
+    """Incidents of ``session_id`` between ``since`` (e.g. the session start) and ``until``, oldest first.
+
+    The ``created_at`` bounds let PostgreSQL skip every monthly partition
+    outside them, so a live session only reads the current month.
+    """
+    conditions = [AntiCheatIncident.session_id == session_id, AntiCheatIncident.created_at >= since]
+    if until is not None:
+        conditions.append(AntiCheatIncident.created_at < until)
+    return list(
+        db.scalars(
+            select(AntiCheatIncident).where(*conditions).order_by(AntiCheatIncident.created_at, AntiCheatIncident.id)
+        )
+    )
+
+
+def violation_decision(
+    db: Session,
+    session_id: str,
+    config: Optional[Dict[str, Any]],
+    *,
+    buffer: Optional[AntiCheatIncidentBuffer] = None,
+) -> AntiCheatDecision:
+    """Decision for ``session_id`` under a quiz's or tutor session's ``anti_cheat_config``."""
+    counters = AntiCheatSessionCounter.__table__
+    count = db.execute(
+        select(counters.c.violation_count).where(counters.c.session_id == session_id)
+    ).scalar_one_or_none()
+    return decide_violations(session_id, (count or 0) + (buffer.pending(session_id) if buffer else 0), config)
+
+
+def decide_violations(session_id: str, count: int, config: Optional[Dict[str, Any]]) -> AntiCheatDecision:
+    """``warn`` up to ``warnings_limit`` violations, ``terminate`` beyond; ``none`` when disabled."""
+    config = config or {}
+    limit = config.get("warnings_limit")
+    limit = int(limit) if limit is not None else None
+    decision = dict(
+        session_id=session_id,
+        violation_count=count,
+        warnings_limit=limit,
+        warnings_left=max(limit - count, 0) if limit is not None else None,
+    )
+    if not config.get("enabled", bool(config)) or count <= 0:
+        return AntiCheatDecision(action=AntiCheatAction.none, **decision)
+    if limit is not None and count > limit:
+        return AntiCheatDecision(action=AntiCheatAction.terminate, **decision)
+    return AntiCheatDecision(action=AntiCheatAction.warn, **decision)
+
+
+def _insert(db: Session, rows: List[Dict[str, Any]], repeats: Iterable[Dict[str, Any]] = ()) -> int:
+    if rows:
+        db.execute(insert(AntiCheatIncident.__table__), rows)
+    _count(db, [_counter_row(row) for row in rows] + list(repeats))
+    return len(rows)
+
+
+def _counter_row(row: Dict[str, Any], *, violations: int = 1) -> Dict[str, Any]:
+    return {
+        "session_id": row["session_id"],
+        "user_id": row["user_id"],
+        "session_type": row["session_type"],
+        "violation_count": violations,
+        "repeat_count": 0,
+        "last_incident_at": row["created_at"],
+    }
+
+
+def _count(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Add counter rows (see ``_counter_row``) to ``anti_cheat_session_counters``."""
+    if not rows:
+        return
+    sessions: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        counter = sessions.get(row["session_id"])
+        if counter is None:
+            sessions[row["session_id"]] = dict(row)
+            continue
+        counter["violation_count"] += row["violation_count"]
+        counter["repeat_count"] += row["repeat_count"]
+        counter["last_incident_at"] = max(counter["last_incident_at"], row["last_incident_at"])
+    counters = AntiCheatSessionCounter.__table__
+    stmt = pg_insert(counters)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[counters.c.session_id],
+            set_={
+                "violation_count": counters.c.violation_count + stmt.excluded.violation_count,
+                "repeat_count": counters.c.repeat_count + stmt.excluded.repeat_count,
+                "last_incident_at": func.greatest(counters.c.last_incident_at, stmt.excluded.last_incident_at),
+            },
+        ),
+        # Sorted, so concurrent batches lock the counter rows in the same order.
+        [sessions[session_id] for session_id in sorted(sessions)],
+    )
@@ -0,0 +1,123 @@
+"""Monthly partitions of ``anti_cheat_incidents`` and their retention.
+
+``anti_cheat_incidents`` is range-partitioned on ``created_at``, one
+partition per calendar month (UTC) named ``anti_cheat_incidents_pYYYYMM``,
+plus ``anti_cheat_incidents_default`` for rows outside every partition.
+``created_at`` has a BRIN index: incidents are appended in time order, so a
+few pages per block range replace a btree over the whole history.
+
+* ``ensure_partitions`` creates the partitions of the current and the next
+  ``months_ahead`` months; run it from a periodic job. Rows that already
+  landed in the default partition for such a month are moved into the new one.
+* ``roll_up_partitions`` folds every partition older than ``keep_months``
+  into ``anti_cheat_daily_stats`` (incidents and distinct sessions per day,
+  user, session type and incident type), then detaches and drops it. Old
+  rows of the default partition are rolled up and deleted the same way.
+
+Neither function commits.
+"""
+
+from __future__ import annotations
+
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from shared_models.models import AntiCheatIncident
+
+PARENT = AntiCheatIncident.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+PARTITION_PATTERN = re.compile(rf"^{PARENT}_p(\d{{4}})(\d{{2}})$")
+MONTHS_AHEAD = 2
+KEEP_MONTHS = 12
+
+_ROLL_UP = """
+    {prefix}
+    INSERT INTO anti_cheat_daily_stats (day, user_id, session_type, incident_type, incident_count, session_count)
+    SELECT (created_at AT TIME ZONE 'UTC')::date, user_id, session_type, incident_type,
+           count(*), count(DISTINCT session_id)
+    FROM {source}
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (day, user_id, session_type, incident_type) DO UPDATE
+    SET incident_count = anti_cheat_daily_stats.incident_count + excluded.incident_count,
+        session_count = anti_cheat_daily_stats.session_count + excluded.session_count
+"""
+
+
+def month_start(value: datetime) -> date:
+    value = value.astimezone(timezone.utc) if value.tzinfo else value
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def ensure_partitions(db: Session, *, months_ahead: int = MONTHS_AHEAD, now: Optional[datetime] = None) -> List[str]:
+    """Create the missing partitions from this month to ``months_ahead``; returns the created names."""
+    current = month_start(now or datetime.now(timezone.utc))
+    existing = {name for name, _ in list_partitions(db)}
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        lower, upper = _bound(month), _bound(add_months(month, 1))
+        # Create detached, take over matching rows of the default partition, then attach.
+        db.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        db.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :lower AND created_at < :upper "
+                f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            ),
+            {"lower": lower, "upper": upper},
+        )
+        db.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"))
+        created.append(name)
+    return created
+
+
+def roll_up_partitions(db: Session, *, keep_months: int = KEEP_MONTHS, now: Optional[datetime] = None) -> List[str]:
+    """Aggregate and drop partitions that ended more than ``keep_months`` ago; returns the dropped names."""
+    cutoff = add_months(month_start(now or datetime.now(timezone.utc)), -keep_months)
+    dropped = []
+    for name, month in list_partitions(db):
+        if add_months(month, 1) > cutoff:
+            continue
+        db.execute(text(_ROLL_UP.format(prefix="", source=name)))
+        db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        db.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    stale = f"WITH stale AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff RETURNING *)"
+    db.execute(text(_ROLL_UP.format(prefix=stale, source="stale")), {"cutoff": _bound(cutoff)})
+    return dropped
+
+
+def list_partitions(db: Session) -> List[Tuple[str, date]]:
+    """Monthly partitions of ``anti_cheat_incidents`` with the month they hold, oldest first."""
+    names = db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": PARENT},
+    ).scalars()
+    partitions = []
+    for name in names:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _bound(month: date) -> str:
+    return f"{month.isoformat()} 00:00:00+00"
@@ -0,0 +1,193 @@
+"""Balance history: monthly snapshots and point-in-time balances.
+
+Summing every ``balance_transactions`` row up to a date makes "balance at X"
+and statement pages O(lifetime). ``BalanceSnapshotBuilder`` writes per-user
+closing balances into ``balance_snapshots`` one month at a time, each month
+aggregated in SQL from that month's ledger rows only. ``balance_at`` then
+starts from the nearest snapshot and scans just the rows after it through
+``ix_btx_user_created`` / ``ix_btx_counterpart_created``.
+
+Periods are calendar months in UTC; ``period_end`` is exclusive.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import DateTime, func, literal, or_, select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from shared_models.payment_manager import TRANSFER_TYPES, ZERO, BalanceDelta, balance_delta, counterpart_delta
+from shared_models.payment_models import BalanceSnapshot, BalanceTransaction
+from shared_models.payment_reconciliation import APPLIED_STATUSES, BALANCE_FIELDS, ledger_movements
+from shared_models.schemas import BalancePoint, BalanceStatement, TransactionResponse
+
+
+def month_start(value: datetime) -> datetime:
+    """First instant (UTC) of the month containing ``value``."""
+    value = value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value: datetime) -> datetime:
+    start = month_start(value)
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+
+class BalanceSnapshotBuilder:
+    """Incremental job filling ``balance_snapshots`` with closed months.
+
+    Resumes after the latest ``period_end`` already stored, so each run only
+    aggregates months that were not snapshotted yet. A month is considered
+    closed once it ended more than ``safety_lag`` ago.
+
+    Args:
+        db: Session; ``build()`` leaves committing to the caller.
+        safety_lag: Wait this long after a month ends before snapshotting it,
+            so transactions that were still open at midnight are included.
+    """
+
+    def __init__(self, db: Session, *, safety_lag: timedelta = timedelta(hours=1)):
+        self.db = db
+        self.safety_lag = safety_lag
+
+    def build(self, *, until: Optional[datetime] = None) -> int:
+        """Snapshot every closed month up to ``until`` (default: now). Returns rows written."""
+        bound = month_start((until or datetime.now(timezone.utc)) - self.safety_lag)
+        period = self._first_pending_period()
+        written = 0
+        while period is not None and next_month(period) <= bound:
+            written += self.build_period(period)
+            period = next_month(period)
+        return written
+
+    def build_period(self, period_start: datetime) -> int:
+        """Write snapshots of one month for the users active in it."""
+        bt = BalanceTransaction.__table__
+        snap = BalanceSnapshot.__table__
+        period_start = month_start(period_start)
+        period_end = next_month(period_start)
+
+        movements = ledger_movements(bt.c.created_at >= period_start, bt.c.created_at < period_end).subquery(
+            "movements"
+        )
+        sums = (
+            select(
+                movements.c.user_id,
+                *(func.sum(movements.c[field]).label(field) for field in BALANCE_FIELDS),
+                func.count().label("transaction_count"),
+                func.max(movements.c.transaction_id).label("last_transaction_id"),
+            )
+            .group_by(movements.c.user_id)
+            .subquery("sums")
+        )
+        previous = (
+            select(*(snap.c[field] for field in BALANCE_FIELDS))
+            .where(snap.c.user_id == sums.c.user_id, snap.c.period_end <= period_start)
+            .order_by(snap.c.period_end.desc())
+            .limit(1)
+            .lateral("previous")
+        )
+        rows = select(
+            sums.c.user_id,
+            literal(period_start, DateTime(timezone=True)),
+            literal(period_end, DateTime(timezone=True)),
+            *((func.coalesce(previous.c[field], ZERO) + sums.c[field]).label(field) for field in BALANCE_FIELDS),
+            sums.c.transaction_count,
+            sums.c.last_transaction_id,
+        ).select_from(sums.outerjoin(previous, true()))
+        stmt = (
+            pg_insert(snap)
+            .from_select(
+                ["user_id", "period_start", "period_end", *BALANCE_FIELDS, "transaction_count", "last_transaction_id"],
+                rows,
+            )
+            .on_conflict_do_nothing(index_elements=[snap.c.user_id, snap.c.period_end])
+        )
+        return self.db.execute(stmt).rowcount
+
+    def _first_pending_period(self) -> Optional[datetime]:
+        snap = BalanceSnapshot.__table__
+        latest = self.db.execute(select(func.max(snap.c.period_end))).scalar()
+        if latest is not None:
+            return month_start(latest)
+        bt = BalanceTransaction.__table__
+        first = self.db.execute(select(func.min(bt.c.created_at))).scalar()
+        return month_start(first) if first is not None else None
+
+
+def balance_at(db: Session, user_id: int, at: datetime) -> BalancePoint:
+    """Balance of ``user_id`` as of ``at``: nearest snapshot plus the ledger rows after it."""
+    bt = BalanceTransaction.__table__
+    snap = BalanceSnapshot.__table__
+    snapshot = db.execute(
+        select(snap.c.period_end, *(snap.c[field] for field in BALANCE_FIELDS))
+        .where(snap.c.user_id == user_id, snap.c.period_end <= at)
+        .order_by(snap.c.period_end.desc())
+        .limit(1)
+    ).first()
+
+    conditions = [bt.c.created_at < at]
+    if snapshot is not None:
+        conditions.append(bt.c.created_at >= snapshot.period_end)
+    movements = ledger_movements(*conditions, user_id=user_id).subquery("movements")
+    tail = db.execute(
+        select(*(func.coalesce(func.sum(movements.c[field]), ZERO).label(field) for field in BALANCE_FIELDS))
+    ).one()
+
+    point = BalancePoint(user_id=user_id, at=at, snapshot_period_end=snapshot.period_end if snapshot else None)
+    for field in BALANCE_FIELDS:
+        base = getattr(snapshot, field) if snapshot is not None else ZERO
+        setattr(point, field, base + getattr(tail, field))
+    return point
+
+
+def balance_statement(db: Session, user_id: int, period_start: datetime, period_end: datetime) -> BalanceStatement:
+    """Opening balance, entries and closing balance of ``[period_start, period_end)``.
+
+    Costs one snapshot lookup, a bounded delta scan for the opening balance
+    and a read of the period's own entries; the closing balance is derived
+    from those entries.
+    """
+    opening = balance_at(db, user_id, period_start)
+    transactions = (
+        db.execute(
+            select(BalanceTransaction)
+            .where(
+                or_(BalanceTransaction.user_id == user_id, BalanceTransaction.counterpart_user_id == user_id),
+                BalanceTransaction.created_at >= period_start,
+                BalanceTransaction.created_at < period_end,
+            )
+            .order_by(BalanceTransaction.created_at, BalanceTransaction.id)
+        )
+        .scalars()
+        .all()
+    )
+
+    total = BalanceDelta()
+    for tx in transactions:
+        if tx.status not in APPLIED_STATUSES:
+            continue
+        if tx.user_id == user_id:
+            total += balance_delta(tx.transaction_type, tx.amount)
+        elif tx.transaction_type in TRANSFER_TYPES:
+            total += counterpart_delta(tx.transaction_type, tx.amount)
+    closing = BalancePoint(
+        user_id=user_id,
+        at=period_end,
+        available_credits=opening.available_credits + total.available,
+        reserved_credits=opening.reserved_credits + total.reserved,
+        total_earned=opening.total_earned + total.earned,
+        total_spent=opening.total_spent + total.spent,
+        snapshot_period_end=opening.snapshot_period_end,
+    )
+    return BalanceStatement(
+        user_id=user_id,
+        period_start=period_start,
+        period_end=period_end,
+        opening=opening,
+        closing=closing,
+        transactions=[TransactionResponse.model_validate(tx) for tx in transactions],
+    )
@@ -0,0 +1,282 @@
+"""Hold/capture workflow for ``SubjectSchedule`` booking credits.
+
+A booking places a hold (``reserve``: available → reserved) that lives in
+``booking_reservations`` next to its ledger entry. The hold is then either
+
+* captured when the booking reaches ``SubjectBookStatus.finished`` —
+  ``release`` followed by ``transfer_to_mentor`` (``spend_booking`` when the
+  subject has no owner), so the student's ``reserved_credits`` drop and the
+  mentor is paid in the same database transaction;
+* released when the booking is cancelled/released;
+* expired by ``ReservationManager.expire_batch`` once ``expires_at`` passes,
+  so orphaned holds never lock up funds.
+
+Every ledger entry uses a key derived from the booking
+(``booking:<schedule_id>:<step>``), so each step is idempotent.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import String, cast, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from shared_models.models import Subject, SubjectSchedule
+from shared_models.payment_manager import PaymentError, PaymentManager, quantize
+from shared_models.payment_models import BalanceTransaction, BookingReservation
+from shared_models.schemas import (
+    BookingReservationResponse,
+    LedgerEntryCreate,
+    ReservationStatus,
+    SubjectBookStatus,
+    TransactionType,
+)
+
+REFERENCE_TYPE = "subject_schedule"
+EXPIRY_BATCH_SIZE = 500
+
+
+class ReservationError(PaymentError):
+    """The reservation is missing or not in a state that allows the operation."""
+
+
+def booking_key(schedule_id: int, step: str) -> str:
+    """Idempotency key of one ledger step of a booking."""
+    return f"booking:{schedule_id}:{step}"
+
+
+class ReservationManager:
+    """Creates, captures, releases and expires booking credit holds.
+
+    Like ``PaymentManager`` it never commits.
+
+    Args:
+        db: Session owning the unit of work.
+        grace: Holds expire this long after the booked date (or after
+            creation when the booking has no date).
+        payments: Manager for the ledger writes; a default one on ``db``.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        *,
+        grace: timedelta = timedelta(days=2),
+        payments: Optional[PaymentManager] = None,
+    ):
+        self.db = db
+        self.grace = grace
+        self.payments = payments or PaymentManager(db)
+
+    def hold(
+        self,
+        schedule_id: int,
+        *,
+        amount: Optional[Decimal] = None,
+        expires_at: Optional[datetime] = None,
+    ) -> BookingReservationResponse:
+        """Reserve the booking price from the student's available credits.
+
+        ``amount`` defaults to ``Subject.price`` and the mentor to the subject
+        owner. Calling it again for the same booking returns the existing hold.
+
+        Raises:
+            InsufficientFundsError: the student can not cover the hold.
+        """
+        existing = self._get(schedule_id)
+        if existing is not None:
+            return BookingReservationResponse.model_validate(existing)
+
+        booking = self.db.execute(
+            select(
+                SubjectSchedule.user_id,
+                SubjectSchedule.booked_date,
+                Subject.user_id.label("mentor_id"),
+                Subject.price,
+            )
+            .join(Subject, Subject.id == SubjectSchedule.subject_id)
+            .where(SubjectSchedule.id == schedule_id)
+        ).first()
+        if booking is None:
+            raise ReservationError(f"Booking {schedule_id} not found")
+
+        amount = quantize(amount if amount is not None else booking.price)
+        if expires_at is None:
+            now = datetime.now(timezone.utc)
+            expires_at = max(booking.booked_date or now, now) + self.grace
+        ledger = self.payments.apply_transaction(
+            booking.user_id,
+            amount,
+            TransactionType.reserve,
+            booking_key(schedule_id, "reserve"),
+            reference_type=REFERENCE_TYPE,
+            reference_id=schedule_id,
+            description="Booking hold",
+        )
+
+        br = BookingReservation.__table__
+        self.db.execute(
+            pg_insert(br)
+            .values(
+                schedule_id=schedule_id,
+                user_id=booking.user_id,
+                mentor_id=booking.mentor_id if booking.mentor_id != booking.user_id else None,
+                amount=amount,
+                status=ReservationStatus.held,
+                expires_at=expires_at,
+                reserve_transaction_id=ledger.transaction_id,
+            )
+            .on_conflict_do_nothing(index_elements=[br.c.schedule_id])
+        )
+        return BookingReservationResponse.model_validate(self._get(schedule_id))
+
+    def capture(self, schedule_id: int) -> BookingReservationResponse:
+        """Pay out a held reservation: release it and charge the booking."""
+        reservation = self._lock_held(schedule_id, ReservationStatus.captured)
+        if reservation.status == ReservationStatus.captured:
+            return BookingReservationResponse.model_validate(reservation)
+
+        with self.db.begin_nested():
+            self._release_entry(reservation, "capture-release")
+            if reservation.mentor_id is not None:
+                charge = self.payments.transfer(
+                    reservation.user_id,
+                    reservation.mentor_id,
+                    reservation.amount,
+                    booking_key(schedule_id, "capture"),
+                    reference_type=REFERENCE_TYPE,
+                    reference_id=schedule_id,
+                    description="Booking payment",
+                )
+            else:
+                charge = self.payments.apply_transaction(
+                    reservation.user_id,
+                    reservation.amount,
+                    TransactionType.spend_booking,
+                    booking_key(schedule_id, "capture"),
+                    reference_type=REFERENCE_TYPE,
+                    reference_id=schedule_id,
+                    description="Booking payment",
+                )
+            self._settle(reservation, ReservationStatus.captured, charge.transaction_id)
+        return BookingReservationResponse.model_validate(reservation)
+
+    def release(self, schedule_id: int) -> BookingReservationResponse:
+        """Return a held reservation to the student's available credits."""
+        reservation = self._lock_held(schedule_id, ReservationStatus.released)
+        if reservation.status == ReservationStatus.released:
+            return BookingReservationResponse.model_validate(reservation)
+        with self.db.begin_nested():
+            entry = self._release_entry(reservation, "release")
+            self._settle(reservation, ReservationStatus.released, entry.transaction_id)
+        return BookingReservationResponse.model_validate(reservation)
+
+    def on_booking_status(self, schedule_id: int, status: SubjectBookStatus) -> Optional[BookingReservationResponse]:
+        """Apply a ``SubjectSchedule.status`` change to the booking's hold, if any."""
+        if self._get(schedule_id) is None:
+            return None
+        if status == SubjectBookStatus.finished:
+            return self.capture(schedule_id)
+        if status in (SubjectBookStatus.cancelled, SubjectBookStatus.released):
+            return self.release(schedule_id)
+        return None
+
+    def expire_batch(self, *, limit: int = EXPIRY_BATCH_SIZE, now: Optional[datetime] = None) -> int:
+        """Release up to ``limit`` holds past ``expires_at``; returns how many left ``held``.
+
+        Picks rows through the partial index on held reservations with
+        ``FOR UPDATE SKIP LOCKED``, so several sweepers (or a concurrent
+        capture) never block each other, and settles all releases with one
+        ``settle_batch``. Holds of a user whose releases ``settle_batch``
+        rejects (their ``reserved_credits`` no longer cover them) are marked
+        ``failed`` instead of ``expired``, so they are not picked again. Call
+        repeatedly, committing in between, until it returns 0.
+        """
+        br = BookingReservation.__table__
+        bt = BalanceTransaction.__table__
+        now = now or datetime.now(timezone.utc)
+        expired = self.db.execute(
+            select(br.c.id, br.c.schedule_id, br.c.user_id, br.c.amount)
+            .where(br.c.status == ReservationStatus.held, br.c.expires_at <= now)
+            .order_by(br.c.expires_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not expired:
+            return 0
+
+        settlement = self.payments.settle_batch(
+            [
+                LedgerEntryCreate(
+                    user_id=row.user_id,
+                    amount=row.amount,
+                    transaction_type=TransactionType.release,
+                    idempotency_key=booking_key(row.schedule_id, "release"),
+                    reference_type=REFERENCE_TYPE,
+                    reference_id=row.schedule_id,
+                    description="Booking hold expired",
+                )
+                for row in expired
+            ]
+        )
+        # Rejected releases leave no ledger row to join on.
+        rejected = set(settlement.failed_user_ids)
+        failed = [row.id for row in expired if row.user_id in rejected]
+        if failed:
+            self.db.execute(
+                update(br).where(br.c.id.in_(failed)).values(status=ReservationStatus.failed, settled_at=func.now())
+            )
+        released = [row.id for row in expired if row.user_id not in rejected]
+        if not released:
+            return len(failed)
+        release_key = literal("booking:") + cast(br.c.schedule_id, String) + ":release"
+        return (
+            len(failed)
+            + self.db.execute(
+                update(br)
+                .where(br.c.id.in_(released), bt.c.idempotency_key == release_key)
+                .values(status=ReservationStatus.expired, settle_transaction_id=bt.c.id, settled_at=func.now())
+            ).rowcount
+        )
+
+    # ── Internals ────────────────────────────────────────────────────────
+
+    def _get(self, schedule_id: int) -> Optional[BookingReservation]:
+        return self.db.execute(
+            select(BookingReservation).where(BookingReservation.schedule_id == schedule_id)
+        ).scalar_one_or_none()
+
+    def _lock_held(self, schedule_id: int, target: ReservationStatus) -> BookingReservation:
+        """Lock the reservation; it must be ``held`` (or already in ``target``)."""
+        reservation = self.db.execute(
+            select(BookingReservation)
+            .where(BookingReservation.schedule_id == schedule_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+        if reservation is None:
+            raise ReservationError(f"Booking {schedule_id} has no reservation")
+        if reservation.status not in (ReservationStatus.held, target):
+            raise ReservationError(f"Booking {schedule_id} reservation is already {reservation.status.value}")
+        return reservation
+
+    def _release_entry(self, reservation: BookingReservation, step: str):
+        return self.payments.apply_transaction(
+            reservation.user_id,
+            reservation.amount,
+            TransactionType.release,
+            booking_key(reservation.schedule_id, step),
+            reference_type=REFERENCE_TYPE,
+            reference_id=reservation.schedule_id,
+            description="Booking hold released",
+        )
+
+    def _settle(self, reservation: BookingReservation, status: ReservationStatus, transaction_id: int) -> None:
+        reservation.status = status
+        reservation.settle_transaction_id = transaction_id
+        reservation.settled_at = datetime.now(timezone.utc)
+        self.db.flush()
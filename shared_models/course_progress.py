@@ -0,0 +1,250 @@
+"""Course progress backed by the ``quiz_course_item_completions`` table.
+
+``CourseProgress.completed_item_ids`` is a JSON list; deriving
+``completion_percentage`` and the next item from it means loading every
+``QuizCourseItem`` of the course and comparing in Python. Completed items are
+instead stored one row per ``(progress_id, item_id)`` and the progress row
+keeps ``completed_required_count``, so completing an item is one statement
+whose cost does not depend on the size of the course or its audience:
+
+* ``complete_quiz`` marks the items of a passed quiz as completed for every
+  course progress of the user and updates ``completion_percentage``,
+  ``current_item_id``, ``is_completed`` and ``last_activity_at`` (the JSON list
+  is still appended to for existing readers). In a sequential course an item
+  only counts once every earlier required item is completed. It runs
+  automatically for every passed ``UserQuizResult`` inserted through the ORM.
+* ``rebuild_course_progress`` recomputes every progress of a course from the
+  completion rows, e.g. after items were added, removed or made optional.
+
+Only required items count towards the percentage; a course without required
+items counts all of them. Neither function commits.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Union
+
+from sqlalchemy import (
+    JSON,
+    Float,
+    Integer,
+    Numeric,
+    and_,
+    cast,
+    event,
+    exists,
+    func,
+    literal,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from shared_models.quiz_model import (
+    CourseProgress,
+    CourseProgressUpdate,
+    QuizCourse,
+    QuizCourseItem,
+    QuizCourseItemCompletion,
+    UserQuizResult,
+)
+
+
+def complete_quiz(
+    db: Union[Session, Connection],
+    user_id: int,
+    quiz_id: int,
+    *,
+    result_id: Optional[int] = None,
+) -> List[CourseProgressUpdate]:
+    """Complete the course items of ``quiz_id`` for ``user_id``; returns the progress rows that changed.
+
+    Items that were already completed, or that are still locked in a
+    sequential course, are left alone.
+    """
+    progress = CourseProgress.__table__
+    items = QuizCourseItem.__table__
+    completions = QuizCourseItemCompletion.__table__
+    courses = QuizCourse.__table__
+
+    # Lock the affected progress rows first: the update below then sees every
+    # completion committed by concurrent calls for the same user.
+    locked = db.execute(
+        select(progress.c.id)
+        .join(items, items.c.course_id == progress.c.course_id)
+        .where(progress.c.user_id == user_id, items.c.quiz_id == quiz_id)
+        .order_by(progress.c.id)
+        .with_for_update(of=progress, key_share=True)
+    ).all()
+    if not locked:
+        return []
+
+    earlier = items.alias("earlier")
+    done = completions.alias("done")
+    blocked = exists().where(
+        earlier.c.course_id == items.c.course_id,
+        earlier.c.is_required.is_(True),
+        tuple_(earlier.c.order_index, earlier.c.id) < tuple_(items.c.order_index, items.c.id),
+        ~exists()
+        .where(done.c.progress_id == progress.c.id, done.c.item_id == earlier.c.id)
+        .correlate(progress, earlier),
+    )
+    inserted = (
+        pg_insert(completions)
+        .from_select(
+            ["progress_id", "item_id", "result_id"],
+            select(progress.c.id, items.c.id, literal(result_id, Integer))
+            .select_from(
+                progress.join(items, items.c.course_id == progress.c.course_id).join(
+                    courses, courses.c.id == progress.c.course_id
+                )
+            )
+            .where(
+                progress.c.user_id == user_id,
+                items.c.quiz_id == quiz_id,
+                or_(courses.c.is_sequential.is_(False), ~blocked),
+            ),
+        )
+        .on_conflict_do_nothing()
+        .returning(completions.c.progress_id, completions.c.item_id)
+        .cte("inserted")
+    )
+    new = (
+        select(
+            inserted.c.progress_id,
+            func.count().filter(_counts(items)).label("counted"),
+            func.jsonb_agg(inserted.c.item_id).label("item_ids"),
+            func.array_agg(inserted.c.item_id).label("new_item_ids"),
+        )
+        .select_from(inserted.join(items, items.c.id == inserted.c.item_id))
+        .group_by(inserted.c.progress_id)
+        .cte("new")
+    )
+
+    completed = progress.c.completed_required_count + new.c.counted
+    total = _total(progress)
+    following = items.alias("following")
+    current = (
+        select(following.c.id)
+        .where(
+            following.c.course_id == progress.c.course_id,
+            ~exists()
+            .where(done.c.progress_id == progress.c.id, done.c.item_id == following.c.id)
+            .correlate(progress, following),
+            # Rows inserted by this statement are not visible to it yet.
+            following.c.id.notin_(
+                select(inserted.c.item_id).where(inserted.c.progress_id == progress.c.id).correlate(progress)
+            ),
+        )
+        .order_by(following.c.order_index, following.c.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        update(progress)
+        .where(progress.c.id == new.c.progress_id)
+        .values(
+            completed_required_count=completed,
+            completion_percentage=_percentage(completed, total),
+            is_completed=or_(progress.c.is_completed.is_(True), completed >= total),
+            current_item_id=current,
+            completed_item_ids=cast(
+                func.coalesce(cast(progress.c.completed_item_ids, JSONB), cast(literal("[]"), JSONB)).op("||")(
+                    new.c.item_ids
+                ),
+                JSON,
+            ),
+            last_activity_at=func.now(),
+        )
+        .returning(
+            progress.c.id,
+            progress.c.course_id,
+            progress.c.completion_percentage,
+            progress.c.current_item_id,
+            progress.c.is_completed,
+            new.c.new_item_ids,
+        )
+    ).all()
+    return [
+        CourseProgressUpdate(
+            progress_id=row.id,
+            course_id=row.course_id,
+            new_item_ids=sorted(row.new_item_ids),
+            completion_percentage=row.completion_percentage,
+            current_item_id=row.current_item_id,
+            is_completed=row.is_completed,
+        )
+        for row in sorted(rows, key=lambda row: row.id)
+    ]
+
+
+def rebuild_course_progress(db: Session, course_id: int) -> int:
+    """Recompute every progress of ``course_id`` from its completion rows; returns rows updated."""
+    progress = CourseProgress.__table__
+    items = QuizCourseItem.__table__
+    completions = QuizCourseItemCompletion.__table__
+    completed = (
+        select(func.count())
+        .select_from(completions.join(items, items.c.id == completions.c.item_id))
+        .where(completions.c.progress_id == progress.c.id, _counts(items))
+        .scalar_subquery()
+    )
+    total = _total(progress)
+    current = (
+        select(items.c.id)
+        .where(
+            items.c.course_id == progress.c.course_id,
+            ~exists()
+            .where(completions.c.progress_id == progress.c.id, completions.c.item_id == items.c.id)
+            .correlate(progress, items),
+        )
+        .order_by(items.c.order_index, items.c.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    return db.execute(
+        update(progress)
+        .where(progress.c.course_id == course_id)
+        .values(
+            completed_required_count=completed,
+            completion_percentage=_percentage(completed, total),
+            is_completed=and_(total > 0, completed >= total),
+            current_item_id=current,
+        )
+    ).rowcount
+
+
+def _counts(items):
+    """Whether a completed item counts: it is required, or its course has no required items."""
+    required = QuizCourseItem.__table__.alias("required")
+    return or_(
+        items.c.is_required.is_(True),
+        ~exists().where(required.c.course_id == items.c.course_id, required.c.is_required.is_(True)),
+    )
+
+
+def _total(progress):
+    """Number of items that count towards completion in the progress row's course."""
+    items = QuizCourseItem.__table__.alias("course_item")
+    return (
+        select(func.coalesce(func.nullif(func.count().filter(items.c.is_required.is_(True)), 0), func.count()))
+        .where(items.c.course_id == progress.c.course_id)
+        .scalar_subquery()
+    )
+
+
+def _percentage(completed, total):
+    # least() skips NULLs, so an empty course is mapped to 0 before the cap.
+    share = func.least(func.coalesce(completed * 100.0 / func.nullif(total, 0), 0), 100)
+    return cast(func.round(cast(share, Numeric), 2), Float)
+
+
+@event.listens_for(UserQuizResult, "after_insert")
+def _complete_course_items(mapper, connection: Connection, target: UserQuizResult) -> None:
+    if target.passed:
+        complete_quiz(connection, target.user_id, target.quiz_id, result_id=target.id)
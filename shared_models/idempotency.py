@@ -0,0 +1,155 @@
+"""In-process idempotency fast path for ledger writes.
+
+``PaymentManager`` already inserts with ``ON CONFLICT (idempotency_key) DO
+NOTHING RETURNING``, so a replayed key never raises. ``IdempotencyGuard``
+additionally keeps replay storms (e.g. a consumer re-reading its queue after
+a restart) away from the primary:
+
+* a bounded LRU of recently *committed* writes answers replays of those keys
+  without any query;
+* a bloom filter of keys seen by this process (optionally warmed from
+  recent ledger rows) tells which keys are certainly new — for those the
+  idempotency lookup is skipped and the write goes straight to the CAS.
+
+Both structures only ever save work: a bloom false positive costs one
+indexed lookup, and a key missing from them still hits the unique index.
+Keys reach the LRU only after the session commits, so a rolled-back write is
+never reported as a replay.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from shared_models.payment_models import BalanceTransaction
+from shared_models.schemas import LedgerWriteResult
+
+_PENDING_KEY = "idempotency_guard_pending"
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (double hashing on blake2b)."""
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate in (0, 1)")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def clear(self) -> None:
+        self._bits = bytearray(len(self._bits))
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+
+class IdempotencyGuard:
+    """Process-wide cache of idempotency keys; share one per worker.
+
+    Args:
+        capacity: Expected distinct keys before the bloom filter is reset
+            (a reset only makes lookups happen again, it is never unsafe).
+        error_rate: Bloom false-positive rate at ``capacity``.
+        lru_size: Committed writes kept for query-free replays.
+    """
+
+    def __init__(self, *, capacity: int = 1_000_000, error_rate: float = 0.001, lru_size: int = 10_000):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.lru_size = lru_size
+        self._recent: "OrderedDict[str, LedgerWriteResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._info_key = (_PENDING_KEY, id(self))
+
+    # ── Lookups ──────────────────────────────────────────────────────────
+
+    def cached(self, key: str) -> Optional[LedgerWriteResult]:
+        """Committed write for ``key`` from this process, marked as a replay."""
+        with self._lock:
+            result = self._recent.get(key)
+            if result is None:
+                return None
+            self._recent.move_to_end(key)
+        return result.model_copy(update={"replayed": True})
+
+    def might_exist(self, key: str) -> bool:
+        """False means the key was certainly never written through this guard."""
+        with self._lock:
+            return key in self.bloom
+
+    # ── Updates ──────────────────────────────────────────────────────────
+
+    def seen(self, keys: Iterable[str]) -> None:
+        """Add keys to the bloom filter (e.g. keys that exist in the ledger)."""
+        with self._lock:
+            for key in keys:
+                if self.bloom.count >= self.bloom.capacity:
+                    self.bloom.clear()
+                self.bloom.add(key)
+
+    def track(self, db: Session, key: str, result: LedgerWriteResult) -> None:
+        """Register a write made in ``db``; it is cached once ``db`` commits."""
+        self.seen([key])
+        pending: Optional[Dict[str, LedgerWriteResult]] = db.info.get(self._info_key)
+        if pending is None:
+            pending = db.info[self._info_key] = {}
+            event.listen(db, "after_commit", self._on_commit)
+            event.listen(db, "after_soft_rollback", self._on_rollback)
+        pending[key] = result.model_copy(update={"replayed": False})
+
+    def warm(self, db: Session, *, since: timedelta = timedelta(days=1), chunk_size: int = 10_000) -> int:
+        """Load keys of recent ledger rows into the bloom filter; returns how many."""
+        bt = BalanceTransaction.__table__
+        result = db.execute(
+            select(bt.c.idempotency_key).where(bt.c.created_at >= datetime.now(timezone.utc) - since),
+            execution_options={"yield_per": chunk_size},
+        )
+        loaded = 0
+        for keys in result.scalars().partitions():
+            self.seen(keys)
+            loaded += len(keys)
+        return loaded
+
+    # ── Session events ───────────────────────────────────────────────────
+
+    def _on_commit(self, session: Session) -> None:
+        pending = session.info.get(self._info_key)
+        if not pending:
+            return
+        with self._lock:
+            for key, result in pending.items():
+                self._recent[key] = result
+                self._recent.move_to_end(key)
+            while len(self._recent) > self.lru_size:
+                self._recent.popitem(last=False)
+        pending.clear()
+
+    def _on_rollback(self, session: Session, previous_transaction) -> None:
+        # Any rollback (savepoints included) drops the staged keys: missing
+        # a cache entry costs one lookup, caching an undone write would not.
+        pending = session.info.get(self._info_key)
+        if pending:
+            pending.clear()
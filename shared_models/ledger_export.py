@@ -0,0 +1,181 @@
+"""Streaming export of ``balance_transactions`` to CSV / Parquet.
+
+Rows are read with a server-side cursor (``yield_per``) as plain Core rows —
+no ORM identity map, no ``TransactionResponse`` objects; enums and JSON come
+back as their stored text — and written chunk by chunk, so memory stays flat
+no matter how large the export is.
+
+* ``amount`` keeps its ``Decimal`` value: written as the exact string in CSV
+  and as ``decimal128(15, 2)`` in Parquet.
+* Rows are exported in ``id`` order; the returned ``last_id`` can be passed
+  back as ``after_id`` to resume an interrupted export.
+* A per-user export (``filters.user_id``) includes the transfers where the
+  user is the ``counterpart_user_id`` (e.g. a mentor's incoming
+  ``transfer_to_mentor``), so it is the user's complete statement.
+
+Parquet needs the optional ``pyarrow`` dependency (``pip install
+shared-models[export]``).
+"""
+
+from __future__ import annotations
+
+import csv
+from datetime import datetime
+from typing import IO, Any, Iterator, Optional, Sequence
+
+from sqlalchemy import JSON, Enum as SAEnum, Select, String, Text, cast, or_, select, type_coerce
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from shared_models.payment_models import BalanceTransaction
+from shared_models.schemas import LedgerExportFilter, LedgerExportResult
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None  # type: ignore[assignment]
+    pq = None  # type: ignore[assignment]
+
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_COLUMNS = (
+    "id",
+    "user_id",
+    "counterpart_user_id",
+    "transaction_type",
+    "status",
+    "amount",
+    "reference_type",
+    "reference_id",
+    "description",
+    "idempotency_key",
+    "created_by_admin_id",
+    "ai_tokens_used",
+    "ai_tokens_prompt",
+    "ai_tokens_completion",
+    "extra_metadata",
+    "created_at",
+    "completed_at",
+)
+
+
+def iter_ledger_chunks(
+    db: Session,
+    filters: Optional[LedgerExportFilter] = None,
+    *,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[Sequence[Row]]:
+    """Yield ledger rows matching ``filters`` in ``id`` order, ``chunk_size`` at a time."""
+    result = db.execute(export_query(filters), execution_options={"yield_per": chunk_size})
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def export_query(filters: Optional[LedgerExportFilter] = None) -> Select:
+    """The ``SELECT`` behind an export."""
+    filters = filters or LedgerExportFilter()
+    bt = BalanceTransaction.__table__
+    stmt = select(*(_export_column(bt.c[name]) for name in EXPORT_COLUMNS)).order_by(bt.c.id)
+    if filters.user_id is not None:
+        # Both legs of a transfer: ix_btx_user_created and ix_btx_counterpart_created.
+        stmt = stmt.where(or_(bt.c.user_id == filters.user_id, bt.c.counterpart_user_id == filters.user_id))
+    if filters.transaction_types:
+        stmt = stmt.where(bt.c.transaction_type.in_(filters.transaction_types))
+    if filters.statuses:
+        stmt = stmt.where(bt.c.status.in_(filters.statuses))
+    if filters.created_from is not None:
+        stmt = stmt.where(bt.c.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        stmt = stmt.where(bt.c.created_at < filters.created_to)
+    if filters.after_id is not None:
+        stmt = stmt.where(bt.c.id > filters.after_id)
+    return stmt
+
+
+def export_csv(
+    db: Session,
+    out: IO[str],
+    filters: Optional[LedgerExportFilter] = None,
+    *,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    header: bool = True,
+) -> LedgerExportResult:
+    """Write the ledger to a text stream as CSV.
+
+    Pass ``header=False`` when appending to a file after resuming with
+    ``filters.after_id``.
+    """
+    writer = csv.writer(out)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    exported = LedgerExportResult(last_id=filters.after_id if filters else None)
+    for chunk in iter_ledger_chunks(db, filters, chunk_size=chunk_size):
+        writer.writerows([_csv_value(value) for value in row] for row in chunk)
+        exported.rows += len(chunk)
+        exported.last_id = chunk[-1].id
+    return exported
+
+
+def export_parquet(
+    db: Session,
+    path: str,
+    filters: Optional[LedgerExportFilter] = None,
+    *,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> LedgerExportResult:
+    """Write the ledger to a Parquet file, one row group per chunk.
+
+    A resumed export (``filters.after_id``) should go to a new part file.
+    """
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow: pip install shared-models[export]")
+    schema = parquet_schema()
+    exported = LedgerExportResult(last_id=filters.after_id if filters else None)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_ledger_chunks(db, filters, chunk_size=chunk_size):
+            columns = [list(values) for values in zip(*chunk)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            exported.rows += len(chunk)
+            exported.last_id = chunk[-1].id
+    return exported
+
+
+def parquet_schema():
+    """Arrow schema of the export; ``amount`` stays an exact decimal."""
+    if pa is None:
+        raise RuntimeError("Parquet export requires pyarrow: pip install shared-models[export]")
+    timestamp = pa.timestamp("us", tz="UTC")
+    types = {
+        "id": pa.int64(),
+        "user_id": pa.int64(),
+        "counterpart_user_id": pa.int64(),
+        "amount": pa.decimal128(15, 2),
+        "reference_id": pa.int64(),
+        "created_by_admin_id": pa.int64(),
+        "ai_tokens_used": pa.int64(),
+        "ai_tokens_prompt": pa.int64(),
+        "ai_tokens_completion": pa.int64(),
+        "created_at": timestamp,
+        "completed_at": timestamp,
+    }
+    return pa.schema([(name, types.get(name, pa.string())) for name in EXPORT_COLUMNS])
+
+
+def _export_column(column: ColumnElement) -> ColumnElement:
+    """Select enums and JSON as their stored text — no per-value conversion in Python."""
+    if isinstance(column.type, SAEnum):
+        return type_coerce(column, String).label(column.name)
+    if isinstance(column.type, JSON):
+        return cast(column, Text).label(column.name)
+    return column
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
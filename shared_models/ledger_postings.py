@@ -0,0 +1,105 @@
+"""Queries over ``ledger_postings`` (double-entry mode).
+
+``PaymentManager`` in double-entry mode (``LEDGER_DOUBLE_ENTRY``) writes one posting per user and ledger
+entry; transfers get a debit and a credit posting under one ``transfer_id``.
+These helpers read balances from the postings with a single range scan per
+user, verify that transfers net to zero, and backfill postings for ledger
+rows written before the mode was enabled.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import UUID, case, cast, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from shared_models.payment_manager import TRANSFER_TYPES, ZERO
+from shared_models.payment_models import BalanceTransaction, LedgerPosting
+from shared_models.payment_reconciliation import BALANCE_FIELDS, ledger_movements
+from shared_models.schemas import BalancePoint, PostingSide, TransferVerification
+
+POSTING_FIELDS = ("available_delta", "reserved_delta", "earned_delta", "spent_delta")
+MAX_REPORTED_TRANSFERS = 1000
+
+
+def posting_balance(db: Session, user_id: int, at: Optional[datetime] = None) -> BalancePoint:
+    """Balance of ``user_id`` from its postings (``created_at < at`` when given)."""
+    lp = LedgerPosting.__table__
+    stmt = select(*(func.coalesce(func.sum(lp.c[field]), ZERO) for field in POSTING_FIELDS)).where(
+        lp.c.user_id == user_id
+    )
+    if at is not None:
+        stmt = stmt.where(lp.c.created_at < at)
+    totals = db.execute(stmt).one()
+    return BalancePoint(
+        user_id=user_id,
+        at=at or datetime.now(timezone.utc),
+        **dict(zip(BALANCE_FIELDS, totals)),
+    )
+
+
+def verify_transfers(db: Session, *, since: Optional[datetime] = None) -> TransferVerification:
+    """Check that every transfer has two postings summing to zero ``available_delta``."""
+    lp = LedgerPosting.__table__
+    conditions = [lp.c.transfer_id.isnot(None)]
+    if since is not None:
+        conditions.append(lp.c.created_at >= since)
+    per_transfer = (
+        select(
+            lp.c.transfer_id,
+            func.sum(lp.c.available_delta).label("net"),
+            func.count().label("postings"),
+        )
+        .where(*conditions)
+        .group_by(lp.c.transfer_id)
+        .subquery("per_transfer")
+    )
+    unbalanced = (per_transfer.c.net != 0) | (per_transfer.c.postings != 2)
+    transfers, net, unbalanced_count = db.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(per_transfer.c.net), ZERO),
+            func.count().filter(unbalanced),
+        )
+    ).one()
+    report = TransferVerification(transfers=transfers, net_available=net, unbalanced_count=unbalanced_count)
+    if unbalanced_count:
+        report.unbalanced = list(
+            db.execute(select(per_transfer.c.transfer_id).where(unbalanced).limit(MAX_REPORTED_TRANSFERS)).scalars()
+        )
+    return report
+
+
+def backfill_postings(db: Session, *, after_id: int = 0, up_to_id: Optional[int] = None) -> int:
+    """Write postings for applied ledger rows in ``(after_id, up_to_id]`` that have none.
+
+    Uses the same per-leg rules as the reconciler; ``transfer_id`` is
+    ``md5(idempotency_key)::uuid``, matching ``transfer_uuid()``.
+    """
+    bt = BalanceTransaction.__table__
+    lp = LedgerPosting.__table__
+    conditions = [bt.c.id > after_id]
+    if up_to_id is not None:
+        conditions.append(bt.c.id <= up_to_id)
+    movements = ledger_movements(*conditions).subquery("movements")
+    source = bt.alias("source")
+    rows = select(
+        movements.c.transaction_id,
+        case(
+            (source.c.transaction_type.in_(TRANSFER_TYPES), cast(func.md5(source.c.idempotency_key), UUID)),
+            else_=None,
+        ),
+        movements.c.user_id,
+        case((movements.c.available_credits < 0, PostingSide.debit.value), else_=PostingSide.credit.value),
+        *(movements.c[field] for field in BALANCE_FIELDS),
+        source.c.created_at,
+    ).select_from(movements.join(source, source.c.id == movements.c.transaction_id))
+    stmt = (
+        pg_insert(lp)
+        .from_select(["transaction_id", "transfer_id", "user_id", "side", *POSTING_FIELDS, "created_at"], rows)
+        .on_conflict_do_nothing(index_elements=[lp.c.transaction_id, lp.c.user_id])
+    )
+    return db.execute(stmt).rowcount
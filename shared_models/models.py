@@ -12,23 +12,27 @@ The rest of the file is IDENTICAL to the original.
 """
 
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from typing import Dict, List, Optional, Any
 
 from pgvector.sqlalchemy import Vector
 from sqlalchemy import (
     ARRAY,
+    DDL,
     JSON,
     UUID,
     Boolean,
     Column,
+    Date,
     DateTime,
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    event,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
@@ -492,9 +496,18 @@ class UserMessage(Base):
 
 
 class AntiCheatIncident(Base):
-    """Record of a detected anti-cheat violation during a session."""
+    """Record of a detected anti-cheat violation during a session.
+
+    Range-partitioned by month on ``created_at`` (see ``anti_cheat_partitions``),
+    hence the composite primary key; filter on ``created_at`` to let PostgreSQL
+    skip old partitions.
+    """
 
     __tablename__ = "anti_cheat_incidents"
+    __table_args__ = (
+        Index("ix_anti_cheat_incidents_created_brin", "created_at", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
@@ -524,13 +537,56 @@ class AntiCheatIncident(Base):
         comment="Additional context: user_agent, ip, browser_info, etc."
     )
     
-    # Timestamps
+    # Timestamps (partition key, so part of the primary key)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
         nullable=False,
-        index=True
+        primary_key=True,
     )
     
     def __repr__(self) -> str:
         return f"<AntiCheatIncident(id={self.id}, session_id={self.session_id}, type={self.incident_type})>"
+
+
+class AntiCheatSessionCounter(Base):
+    """Number of stored anti-cheat incidents per session, and of repeats collapsed into them, kept up to date on ingestion."""
+
+    __tablename__ = "anti_cheat_session_counters"
+
+    session_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    session_type: Mapped[str] = mapped_column(String(32), nullable=False)
+    violation_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    repeat_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Repeats collapsed by the ingestion buffer instead of being stored as incidents",
+    )
+    last_incident_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+
+# A partitioned table rejects rows no partition accepts; the default one
+# catches them until ``anti_cheat_partitions.ensure_partitions`` has run.
+event.listen(
+    AntiCheatIncident.__table__,
+    "after_create",
+    DDL(
+        "CREATE TABLE IF NOT EXISTS anti_cheat_incidents_default PARTITION OF anti_cheat_incidents DEFAULT"
+    ).execute_if(dialect="postgresql"),
+)
+
+
+class AntiCheatDailyStat(Base):
+    """Daily incident counts per user and type, kept after detail partitions are dropped."""
+
+    __tablename__ = "anti_cheat_daily_stats"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    session_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+    incident_type: Mapped[str] = mapped_column(String(64), primary_key=True)
+    incident_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    session_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
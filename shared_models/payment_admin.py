@@ -0,0 +1,210 @@
+"""Admin queue for ``TopupRequest`` / ``WithdrawRequest``.
+
+The queue pages through open requests with keyset pagination on
+``(created_at, id)`` (backed by ``ix_topup_status_created`` /
+``ix_withdraw_status_created``) and returns the requesting user and their
+balance in the same query, so a page is one round-trip regardless of size.
+
+Bulk approval turns a batch of requests into ledger entries with one
+``PaymentManager.settle_batch`` call and marks all of them with one
+``UPDATE … FROM balance_transactions``. Ledger keys are derived from the
+request (``topup_request:<id>`` / ``withdraw_request:<id>``), so approving
+the same request twice never credits or debits twice.
+"""
+
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Tuple, Type, Union
+
+from sqlalchemy import String, cast, func, literal, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from shared_models.models import User
+from shared_models.payment_manager import ZERO, PaymentManager
+from shared_models.payment_models import BalanceTransaction, TopupRequest, UserBalance, WithdrawRequest
+from shared_models.schemas import (
+    BulkApprovalResult,
+    LedgerEntryCreate,
+    PaymentQueueItem,
+    PaymentQueuePage,
+    TransactionType,
+    WithdrawRequestStatus,
+)
+
+OPEN_STATUSES = (WithdrawRequestStatus.pending, WithdrawRequestStatus.processing)
+QUEUE_PAGE_SIZE = 50
+
+PaymentRequest = Union[Type[TopupRequest], Type[WithdrawRequest]]
+
+
+def encode_cursor(created_at: datetime, request_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{request_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    created_at, request_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+    return datetime.fromisoformat(created_at), int(request_id)
+
+
+class PaymentQueue:
+    """Admin views and bulk processing of topup/withdraw stub requests.
+
+    Like ``PaymentManager`` it never commits.
+
+    Args:
+        db: Session owning the unit of work.
+        payments: Manager for the ledger writes; a default one on ``db``.
+    """
+
+    def __init__(self, db: Session, *, payments: Optional[PaymentManager] = None):
+        self.db = db
+        self.payments = payments or PaymentManager(db)
+
+    # ── Queue views ──────────────────────────────────────────────────────
+
+    def topups(
+        self,
+        *,
+        statuses: Sequence[WithdrawRequestStatus] = OPEN_STATUSES,
+        after: Optional[str] = None,
+        limit: int = QUEUE_PAGE_SIZE,
+    ) -> PaymentQueuePage:
+        """Oldest-first page of topup requests in ``statuses``."""
+        return self._page(TopupRequest, statuses, after, limit)
+
+    def withdrawals(
+        self,
+        *,
+        statuses: Sequence[WithdrawRequestStatus] = OPEN_STATUSES,
+        after: Optional[str] = None,
+        limit: int = QUEUE_PAGE_SIZE,
+    ) -> PaymentQueuePage:
+        """Oldest-first page of withdraw requests in ``statuses``."""
+        return self._page(WithdrawRequest, statuses, after, limit)
+
+    # ── Bulk approval ────────────────────────────────────────────────────
+
+    def approve_topups(self, request_ids: Iterable[int], admin_id: int) -> BulkApprovalResult:
+        """Credit every open topup request in ``request_ids`` (``topup_stub``)."""
+        return self._approve(TopupRequest, request_ids, admin_id)
+
+    def approve_withdrawals(self, request_ids: Iterable[int], admin_id: int) -> BulkApprovalResult:
+        """Debit every open withdraw request in ``request_ids`` (``withdraw_stub``).
+
+        Requests whose user can not cover their net withdrawals are marked
+        ``failed`` (and listed in ``failed``); their balance is left untouched.
+        """
+        return self._approve(WithdrawRequest, request_ids, admin_id)
+
+    # ── Internals ────────────────────────────────────────────────────────
+
+    def _page(
+        self,
+        model: PaymentRequest,
+        statuses: Sequence[WithdrawRequestStatus],
+        after: Optional[str],
+        limit: int,
+    ) -> PaymentQueuePage:
+        req = model.__table__
+        ub = UserBalance.__table__
+        users = User.__table__
+        is_topup = model is TopupRequest
+        stmt = (
+            select(
+                req.c.id,
+                req.c.user_id,
+                users.c.username,
+                users.c.email,
+                req.c.amount_requested,
+                (req.c.payment_method if is_topup else req.c.payout_method).label("method"),
+                (req.c.external_reference if is_topup else req.c.payout_details_masked).label("reference"),
+                req.c.status,
+                req.c.notes,
+                req.c.created_at,
+                func.coalesce(ub.c.available_credits, ZERO).label("available_credits"),
+                func.coalesce(ub.c.reserved_credits, ZERO).label("reserved_credits"),
+            )
+            .select_from(req.join(users, users.c.id == req.c.user_id).outerjoin(ub, ub.c.user_id == req.c.user_id))
+            .where(req.c.status.in_(statuses))
+            .order_by(req.c.created_at, req.c.id)
+            .limit(limit + 1)
+        )
+        if after:
+            stmt = stmt.where(tuple_(req.c.created_at, req.c.id) > tuple_(*decode_cursor(after)))
+
+        rows = self.db.execute(stmt).all()
+        items = [PaymentQueueItem.model_validate(row._mapping) for row in rows[:limit]]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+        return PaymentQueuePage(items=items, next_cursor=next_cursor)
+
+    def _approve(self, model: PaymentRequest, request_ids: Iterable[int], admin_id: int) -> BulkApprovalResult:
+        req = model.__table__
+        bt = BalanceTransaction.__table__
+        is_topup = model is TopupRequest
+        prefix = "topup_request" if is_topup else "withdraw_request"
+        request_ids = sorted(set(request_ids))
+        result = BulkApprovalResult()
+        if not request_ids:
+            return result
+
+        # Lock the open requests; ones being processed by another admin are skipped.
+        requests = self.db.execute(
+            select(req.c.id, req.c.user_id, req.c.amount_requested)
+            .where(req.c.id.in_(request_ids), req.c.status.in_(OPEN_STATUSES))
+            .order_by(req.c.id)
+            .with_for_update(skip_locked=True)
+        ).all()
+        locked = {row.id for row in requests}
+        result.skipped = [request_id for request_id in request_ids if request_id not in locked]
+        if not requests:
+            return result
+
+        settlement = self.payments.settle_batch(
+            [
+                LedgerEntryCreate(
+                    user_id=row.user_id,
+                    amount=row.amount_requested,
+                    transaction_type=TransactionType.topup_stub if is_topup else TransactionType.withdraw_stub,
+                    idempotency_key=f"{prefix}:{row.id}",
+                    reference_type=prefix,
+                    reference_id=row.id,
+                    description="Topup approved" if is_topup else "Withdrawal approved",
+                )
+                for row in requests
+            ]
+        )
+
+        # Entries of users the balance could not cover leave no ledger row to join on.
+        rejected = set(settlement.failed_user_ids)
+        result.failed = [row.id for row in requests if row.user_id in rejected]
+        if result.failed:
+            self.db.execute(
+                update(req)
+                .where(req.c.id.in_(result.failed))
+                .values(
+                    status=WithdrawRequestStatus.failed,
+                    processed_by_admin_id=admin_id,
+                    processed_at=func.now(),
+                )
+            )
+
+        settled = locked - set(result.failed)
+        if settled:
+            ledger_key = literal(f"{prefix}:") + cast(req.c.id, String)
+            result.approved = sorted(
+                self.db.execute(
+                    update(req)
+                    .where(req.c.id.in_(sorted(settled)), bt.c.idempotency_key == ledger_key)
+                    .values(
+                        status=WithdrawRequestStatus.completed,
+                        transaction_id=bt.c.id,
+                        processed_by_admin_id=admin_id,
+                        processed_at=func.now(),
+                    )
+                    .returning(req.c.id)
+                ).scalars()
+            )
+        return result
@@ -0,0 +1,766 @@
+"""Ledger engine that keeps BalanceTransaction and UserBalance consistent.
+
+Every balance movement goes through ``PaymentManager``:
+
+* the aggregate row in ``user_balance`` is updated with a compare-and-swap on
+  ``version`` (``UPDATE … WHERE user_id = :u AND version = :v AND
+  available_credits >= :x``), so concurrent writers never lose updates;
+* the matching ``balance_transactions`` row is inserted in the *same*
+  statement (data-modifying CTE), so the ledger and the aggregate can not
+  drift apart;
+* ``idempotency_key`` is honoured — replaying a key returns the original
+  entry instead of charging twice.
+
+Double-entry mode (``ledger_postings``) is one deployment-wide setting,
+``LEDGER_DOUBLE_ENTRY`` (environment variable, read into ``DOUBLE_ENTRY``);
+every manager follows it unless ``double_entry`` is passed explicitly, so
+services that build their own manager write postings too.
+
+The manager never commits: the caller owns the unit of work and decides when
+to ``db.commit()``. Retries rely on READ COMMITTED (PostgreSQL default), where
+each retried statement sees the latest committed ``version``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    ARRAY,
+    Integer,
+    Numeric,
+    and_,
+    bindparam,
+    case,
+    column,
+    delete,
+    func,
+    literal,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ClauseElement, ColumnElement
+
+from shared_models.idempotency import IdempotencyGuard
+from shared_models.payment_models import BalanceTransaction, LedgerPosting, UserBalance
+from shared_models.schemas import (
+    BatchSettlementResult,
+    LedgerEntryCreate,
+    LedgerWriteResult,
+    PostingSide,
+    TransactionStatus,
+    TransactionType,
+)
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+SETTLEMENT_CHUNK_SIZE = 1000
+DOUBLE_ENTRY = os.getenv("LEDGER_DOUBLE_ENTRY", "").lower() in ("1", "true", "yes")
+
+# Direction of every TransactionType from the point of view of ``user_id``.
+CREDIT_TYPES = frozenset(
+    {
+        TransactionType.topup_stub,
+        TransactionType.reward_forum_topic,
+        TransactionType.reward_public_quiz,
+        TransactionType.reward_ai_course,
+        TransactionType.refund_to_student,
+    }
+)
+DEBIT_TYPES = frozenset(
+    {
+        TransactionType.spend_quiz,
+        TransactionType.spend_ai_tokens,
+        TransactionType.spend_course_access,
+        TransactionType.spend_booking,
+        TransactionType.transfer_to_mentor,
+        TransactionType.withdraw_stub,
+    }
+)
+# Single-row transfers: ``user_id`` gets the direction above, the
+# ``counterpart_user_id`` gets the opposite one.
+TRANSFER_TYPES = frozenset({TransactionType.transfer_to_mentor, TransactionType.refund_to_student})
+
+
+class PaymentError(Exception):
+    """Base class for ledger engine errors."""
+
+
+class InsufficientFundsError(PaymentError):
+    """The balance does not cover the requested debit or reserve."""
+
+    def __init__(self, user_id: int, required: Decimal, available: Decimal):
+        self.user_id = user_id
+        self.required = required
+        self.available = available
+        super().__init__(f"User {user_id}: insufficient credits (required {required}, available {available})")
+
+
+class BalanceConflictError(PaymentError):
+    """Compare-and-swap kept losing against concurrent writers."""
+
+
+@dataclass(frozen=True)
+class BalanceDelta:
+    """Signed change applied to the ``user_balance`` columns."""
+
+    available: Decimal = ZERO
+    reserved: Decimal = ZERO
+    earned: Decimal = ZERO
+    spent: Decimal = ZERO
+
+    def __neg__(self) -> "BalanceDelta":
+        return BalanceDelta(-self.available, -self.reserved, -self.earned, -self.spent)
+
+    def __add__(self, other: "BalanceDelta") -> "BalanceDelta":
+        return BalanceDelta(
+            self.available + other.available,
+            self.reserved + other.reserved,
+            self.earned + other.earned,
+            self.spent + other.spent,
+        )
+
+
+def quantize(amount: Decimal | int | str) -> Decimal:
+    """Normalise an amount to NUMERIC(15,2) precision."""
+    return Decimal(amount).quantize(CENT)
+
+
+def balance_delta(transaction_type: TransactionType, amount: Decimal) -> BalanceDelta:
+    """Effect of a ledger entry on the owner's (``user_id``) balance."""
+    amount = quantize(amount)
+    if transaction_type == TransactionType.admin_adjustment:
+        return BalanceDelta(available=amount)
+    if amount < 0:
+        raise ValueError(f"{transaction_type.value}: amount must be >= 0")
+    if transaction_type in CREDIT_TYPES:
+        return BalanceDelta(available=amount, earned=amount)
+    if transaction_type in DEBIT_TYPES:
+        return BalanceDelta(available=-amount, spent=amount)
+    if transaction_type == TransactionType.reserve:
+        return BalanceDelta(available=-amount, reserved=amount)
+    if transaction_type == TransactionType.release:
+        return BalanceDelta(available=amount, reserved=-amount)
+    raise ValueError(f"Unsupported transaction type: {transaction_type}")
+
+
+def counterpart_delta(transaction_type: TransactionType, amount: Decimal) -> BalanceDelta:
+    """Effect of a single-row transfer on ``counterpart_user_id``."""
+    if transaction_type not in TRANSFER_TYPES:
+        return BalanceDelta()
+    owner = balance_delta(transaction_type, amount)
+    if transaction_type in DEBIT_TYPES:
+        return BalanceDelta(available=-owner.available, earned=owner.spent)
+    return BalanceDelta(available=-owner.available, spent=owner.earned)
+
+
+def ledger_delta_exprs(
+    transaction_type: ColumnElement, amount: ColumnElement, *, counterpart: bool = False
+) -> Tuple[ColumnElement, ColumnElement, ColumnElement, ColumnElement]:
+    """SQL mirror of ``balance_delta`` for set-based jobs.
+
+    Returns ``CASE`` expressions for the (available, reserved, earned, spent)
+    deltas of a ledger row. The branches are derived from ``balance_delta`` /
+    ``counterpart_delta`` themselves, so SQL and Python can not disagree.
+    With ``counterpart=True`` the expressions describe the effect on
+    ``counterpart_user_id`` (0 for non-transfer rows).
+    """
+    unit = Decimal("1")
+    coefficients = {t: counterpart_delta(t, unit) if counterpart else balance_delta(t, unit) for t in TransactionType}
+    exprs = []
+    for field in ("available", "reserved", "earned", "spent"):
+        by_sign: Dict[Decimal, List[TransactionType]] = {}
+        for tx_type, delta in coefficients.items():
+            coefficient = getattr(delta, field)
+            if coefficient:
+                by_sign.setdefault(coefficient, []).append(tx_type)
+        whens = [
+            (transaction_type.in_(_names(types)), amount if coefficient > 0 else -amount)
+            for coefficient, types in sorted(by_sign.items(), reverse=True)
+        ]
+        exprs.append(case(*whens, else_=literal(ZERO)) if whens else literal(ZERO))
+    return tuple(exprs)
+
+
+def transfer_uuid(idempotency_key: str) -> uuid.UUID:
+    """Transfer id shared by both postings of a transfer (``md5(key)::uuid`` in SQL)."""
+    return uuid.UUID(hashlib.md5(idempotency_key.encode()).hexdigest())
+
+
+def posting_row(
+    transaction_id: int,
+    user_id: int,
+    delta: BalanceDelta,
+    transfer_id: Optional[uuid.UUID] = None,
+) -> Dict[str, Any]:
+    """``ledger_postings`` values for one user's side of an entry."""
+    return {
+        "transaction_id": transaction_id,
+        "transfer_id": transfer_id,
+        "user_id": user_id,
+        "side": PostingSide.debit if delta.available < 0 else PostingSide.credit,
+        "available_delta": delta.available,
+        "reserved_delta": delta.reserved,
+        "earned_delta": delta.earned,
+        "spent_delta": delta.spent,
+    }
+
+
+def _as_sql(value: Any, type_) -> ColumnElement:
+    return value if isinstance(value, ClauseElement) else literal(value, type_)
+
+
+def _names(types: Iterable[TransactionType]) -> List[str]:
+    # Enum(native_enum=False) stores member names in a VARCHAR column.
+    return sorted(t.name for t in types)
+
+
+class PaymentManager:
+    """Applies ledger entries and keeps ``user_balance`` in sync.
+
+    Args:
+        db: Session whose transaction the writes join; never committed here.
+        max_retries: CAS attempts before ``BalanceConflictError`` is raised.
+        lock_rows: Always read the balance with ``SELECT … FOR UPDATE``.
+            By default only retries lock the row (optimistic first attempt,
+            pessimistic fallback); the CAS stays in place either way.
+        double_entry: Also write ``ledger_postings`` for every applied
+            entry — one per user, a debit/credit pair under one
+            ``transfer_id`` for transfers — in the same savepoint.
+            Defaults to the ``DOUBLE_ENTRY`` setting.
+        idempotency: Shared ``IdempotencyGuard`` — replays of recently
+            committed keys are answered without queries, and keys it has
+            never seen skip the existing-key lookup.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        *,
+        max_retries: int = 5,
+        lock_rows: bool = False,
+        double_entry: Optional[bool] = None,
+        idempotency: Optional[IdempotencyGuard] = None,
+    ):
+        self.db = db
+        self.max_retries = max_retries
+        self.lock_rows = lock_rows
+        self.double_entry = DOUBLE_ENTRY if double_entry is None else double_entry
+        self.idempotency = idempotency
+
+    # ── Public API ───────────────────────────────────────────────────────
+
+    def apply_transaction(
+        self,
+        user_id: int,
+        amount: Decimal,
+        transaction_type: TransactionType,
+        idempotency_key: str,
+        *,
+        reference_type: Optional[str] = None,
+        reference_id: Optional[int] = None,
+        description: Optional[str] = None,
+        created_by_admin_id: Optional[int] = None,
+        ai_tokens_used: Optional[int] = None,
+        ai_tokens_prompt: Optional[int] = None,
+        ai_tokens_completion: Optional[int] = None,
+        extra_metadata: Optional[Dict[str, Any]] = None,
+    ) -> LedgerWriteResult:
+        """Record one ledger entry and update the owner's balance atomically.
+
+        The happy path is two round-trips: a read of ``version`` (combined
+        with the idempotency lookup) and a single ``UPDATE … RETURNING`` that
+        also inserts the ledger row.
+
+        Raises:
+            InsufficientFundsError: the debit/reserve is not covered.
+            BalanceConflictError: ``max_retries`` CAS attempts were lost.
+        """
+        if transaction_type in TRANSFER_TYPES:
+            raise ValueError(f"{transaction_type.value} affects two users; use PaymentManager.transfer()")
+        amount = quantize(amount)
+        delta = balance_delta(transaction_type, amount)
+        row = self._ledger_row(
+            user_id=user_id,
+            amount=amount,
+            transaction_type=transaction_type,
+            idempotency_key=idempotency_key,
+            reference_type=reference_type,
+            reference_id=reference_id,
+            description=description,
+            created_by_admin_id=created_by_admin_id,
+            ai_tokens_used=ai_tokens_used,
+            ai_tokens_prompt=ai_tokens_prompt,
+            ai_tokens_completion=ai_tokens_completion,
+            extra_metadata=extra_metadata,
+        )
+
+        cached = self._cached(idempotency_key)
+        if cached is not None:
+            return cached
+        lookup = self._needs_lookup(idempotency_key)
+
+        for attempt in range(self.max_retries):
+            version, available, reserved, existing_id = self._read_state(
+                user_id, idempotency_key if lookup or attempt else None, lock=attempt > 0
+            )
+            if existing_id is not None:
+                return self._track(idempotency_key, self._replayed(user_id, existing_id, version, available, reserved))
+            self._check_funds(user_id, delta, available, reserved)
+
+            with self.db.begin_nested() as savepoint:
+                result = self.db.execute(self._cas_and_insert(user_id, version, delta, row)).first()
+                if result is None:
+                    # Lost the CAS (or funds moved under us) — re-read with a lock and retry.
+                    savepoint.rollback()
+                    continue
+                if result.transaction_id is None:
+                    # Same idempotency_key committed concurrently: undo our UPDATE.
+                    savepoint.rollback()
+                    continue
+                if self.double_entry:
+                    self._post([posting_row(result.transaction_id, user_id, delta)])
+            return self._track(
+                idempotency_key,
+                LedgerWriteResult(
+                    transaction_id=result.transaction_id,
+                    user_id=user_id,
+                    available_credits=result.available_credits,
+                    reserved_credits=result.reserved_credits,
+                    version=result.version,
+                ),
+            )
+        raise BalanceConflictError(f"User {user_id}: balance update lost {self.max_retries} CAS attempts")
+
+    def transfer(
+        self,
+        user_id: int,
+        counterpart_user_id: int,
+        amount: Decimal,
+        idempotency_key: str,
+        *,
+        transaction_type: TransactionType = TransactionType.transfer_to_mentor,
+        reference_type: Optional[str] = None,
+        reference_id: Optional[int] = None,
+        description: Optional[str] = None,
+        extra_metadata: Optional[Dict[str, Any]] = None,
+    ) -> LedgerWriteResult:
+        """Move credits between two users and record a single ledger row.
+
+        ``transfer_to_mentor`` debits ``user_id`` (student) and credits the
+        mentor; ``refund_to_student`` credits ``user_id`` (student) and debits
+        the mentor. Both balance rows are updated in ``user_id`` order so
+        opposite transfers can not deadlock.
+        """
+        if transaction_type not in TRANSFER_TYPES:
+            raise ValueError(f"{transaction_type.value} is not a transfer type")
+        if user_id == counterpart_user_id:
+            raise ValueError("Transfer parties must differ")
+        amount = quantize(amount)
+        legs = sorted(
+            [
+                (user_id, balance_delta(transaction_type, amount)),
+                (counterpart_user_id, counterpart_delta(transaction_type, amount)),
+            ],
+            key=lambda leg: leg[0],
+        )
+        row = self._ledger_row(
+            user_id=user_id,
+            amount=amount,
+            transaction_type=transaction_type,
+            idempotency_key=idempotency_key,
+            counterpart_user_id=counterpart_user_id,
+            reference_type=reference_type,
+            reference_id=reference_id,
+            description=description,
+            extra_metadata=extra_metadata,
+        )
+        bt = BalanceTransaction.__table__
+        cached = self._cached(idempotency_key)
+        if cached is not None:
+            return cached
+        lookup = self._needs_lookup(idempotency_key)
+
+        for attempt in range(self.max_retries):
+            existing_id = None
+            if lookup or attempt:
+                existing_id = self.db.execute(
+                    select(bt.c.id).where(bt.c.idempotency_key == idempotency_key)
+                ).scalar_one_or_none()
+            if existing_id is not None:
+                version, available, reserved, _ = self._read_state(user_id, idempotency_key)
+                return self._track(idempotency_key, self._replayed(user_id, existing_id, version, available, reserved))
+
+            with self.db.begin_nested() as savepoint:
+                owner_state = None
+                for leg_user_id, delta in legs:
+                    state = self.apply_delta(leg_user_id, delta)
+                    if state is None:
+                        break
+                    if leg_user_id == user_id:
+                        owner_state = state
+                else:
+                    transaction_id = self.db.execute(
+                        pg_insert(bt)
+                        .values(**row)
+                        .on_conflict_do_nothing(index_elements=[bt.c.idempotency_key])
+                        .returning(bt.c.id)
+                    ).scalar_one_or_none()
+                    if transaction_id is not None:
+                        if self.double_entry:
+                            transfer_id = transfer_uuid(idempotency_key)
+                            self._post([posting_row(transaction_id, uid, delta, transfer_id) for uid, delta in legs])
+                        return self._track(
+                            idempotency_key,
+                            LedgerWriteResult(
+                                transaction_id=transaction_id,
+                                user_id=user_id,
+                                available_credits=owner_state[0],
+                                reserved_credits=owner_state[1],
+                                version=owner_state[2],
+                            ),
+                        )
+                savepoint.rollback()
+        raise BalanceConflictError(f"Transfer {idempotency_key}: lost {self.max_retries} CAS attempts")
+
+    def settle_batch(
+        self,
+        entries: Sequence[LedgerEntryCreate],
+        *,
+        allow_overdraft: bool = False,
+        chunk_size: int = SETTLEMENT_CHUNK_SIZE,
+    ) -> BatchSettlementResult:
+        """Settle many single-user ledger entries in one database transaction.
+
+        Entries are inserted with multi-row ``INSERT … ON CONFLICT
+        (idempotency_key) DO NOTHING RETURNING``, so replayed keys are skipped
+        without errors. The net delta of the *new* entries is then applied per
+        user with one ``UPDATE user_balance … FROM unnest(…)`` (one
+        ``version`` bump per user), instead of one CAS round-trip per event.
+
+        The affected balance rows are locked ``FOR UPDATE`` in ``user_id``
+        order up front, so concurrent batches and single writes can not
+        interleave with the net-delta computation.
+
+        Args:
+            entries: Rewards, charges, topups, ... Transfers are rejected
+                (they touch two balances) — use ``transfer()``.
+            allow_overdraft: When False, a user whose net delta would make
+                ``available_credits`` or ``reserved_credits`` negative is
+                skipped: their new entries are deleted again, so the balance
+                is untouched and a retry with the same keys is not a replay.
+            chunk_size: Rows per multi-row INSERT and per balance UPDATE.
+
+        Returns:
+            Counts of the batch. Entries of ``failed_user_ids`` leave no
+            ledger row behind, so callers that look up their entries by
+            idempotency key afterwards (e.g. to link a request to its
+            transaction) must handle those users from ``failed_user_ids``.
+        """
+        result = BatchSettlementResult()
+        if not entries:
+            return result
+
+        rows: List[Dict[str, Any]] = []
+        for entry in entries:
+            if entry.transaction_type in TRANSFER_TYPES:
+                raise ValueError(f"{entry.idempotency_key}: transfers can not be batch-settled")
+            amount = quantize(entry.amount)
+            balance_delta(entry.transaction_type, amount)  # validates sign / type
+            rows.append(
+                {
+                    **entry.model_dump(exclude={"amount"}),
+                    "amount": amount,
+                    "status": TransactionStatus.completed,
+                }
+            )
+
+        if self.idempotency is not None:
+            # Replay storms: drop keys that already exist with one read-only
+            # query before any balance row is locked.
+            maybe_known = [
+                row["idempotency_key"] for row in rows if self.idempotency.might_exist(row["idempotency_key"])
+            ]
+            if maybe_known:
+                bt = BalanceTransaction.__table__
+                known = set(
+                    self.db.execute(select(bt.c.idempotency_key).where(bt.c.idempotency_key.in_(maybe_known))).scalars()
+                )
+                result.replayed = len(known)
+                rows = [row for row in rows if row["idempotency_key"] not in known]
+            self.idempotency.seen(row["idempotency_key"] for row in rows)
+            if not rows:
+                return result
+
+        user_ids = sorted({row["user_id"] for row in rows})
+        self.ensure_balance_rows(user_ids)
+        ub = UserBalance.__table__
+        bt = BalanceTransaction.__table__
+        balances = {
+            user_id: (available, reserved)
+            for user_id, available, reserved in self.db.execute(
+                select(ub.c.user_id, ub.c.available_credits, ub.c.reserved_credits)
+                .where(ub.c.user_id.in_(user_ids))
+                .order_by(ub.c.user_id)
+                .with_for_update()
+            ).all()
+        }
+
+        # executemany + RETURNING: SQLAlchemy batches rows into multi-row
+        # VALUES ("insertmanyvalues") from one cached statement.
+        insert_stmt = (
+            pg_insert(bt)
+            .values(completed_at=func.now())
+            .on_conflict_do_nothing(index_elements=[bt.c.idempotency_key])
+            .returning(bt.c.id, bt.c.user_id, bt.c.transaction_type, bt.c.amount)
+        )
+        inserted: List[Tuple[int, int, TransactionType, Decimal]] = []
+        for start in range(0, len(rows), chunk_size):
+            inserted.extend(
+                self.db.execute(
+                    insert_stmt,
+                    rows[start : start + chunk_size],
+                    execution_options={"insertmanyvalues_page_size": chunk_size},
+                ).tuples()
+            )
+        result.inserted = len(inserted)
+        result.replayed += len(rows) - len(inserted)
+
+        net: Dict[int, BalanceDelta] = {}
+        entry_ids: Dict[int, List[int]] = {}
+        for tx_id, user_id, tx_type, amount in inserted:
+            net[user_id] = net.get(user_id, BalanceDelta()) + balance_delta(tx_type, amount)
+            entry_ids.setdefault(user_id, []).append(tx_id)
+
+        failed_ids: List[int] = []
+        if not allow_overdraft:
+            overdrawn = sorted(
+                uid
+                for uid, delta in net.items()
+                if balances[uid][0] + delta.available < 0 or balances[uid][1] + delta.reserved < 0
+            )
+            if overdrawn:
+                failed_ids = [tx_id for uid in overdrawn for tx_id in entry_ids[uid]]
+                # Like a single write that raises InsufficientFundsError, leave
+                # nothing behind that would turn a retry into a replay.
+                self.db.execute(delete(bt).where(bt.c.id.in_(failed_ids)))
+                for uid in overdrawn:
+                    del net[uid]
+                result.failed = len(failed_ids)
+                result.inserted -= len(failed_ids)
+                result.failed_user_ids = overdrawn
+
+        deltas = [(uid, d.available, d.reserved, d.earned, d.spent) for uid, d in sorted(net.items())]
+        for start in range(0, len(deltas), chunk_size):
+            result.users_updated += self._apply_net_deltas(deltas[start : start + chunk_size])
+
+        if self.double_entry:
+            skipped = set(failed_ids)
+            postings = [
+                posting_row(tx_id, user_id, balance_delta(tx_type, amount))
+                for tx_id, user_id, tx_type, amount in inserted
+                if tx_id not in skipped
+            ]
+            for start in range(0, len(postings), chunk_size):
+                self._post(postings[start : start + chunk_size])
+        return result
+
+    def apply_delta(self, user_id: int, delta: BalanceDelta) -> Optional[Tuple[Decimal, Decimal, int]]:
+        """CAS-update one balance row without writing a ledger entry.
+
+        Building block for multi-leg operations that record the ledger row
+        themselves. Returns ``(available, reserved, version)`` or ``None``
+        when the retry budget is spent.
+
+        Raises:
+            InsufficientFundsError: the delta would make a balance negative.
+        """
+        for attempt in range(self.max_retries):
+            version, available, reserved, _ = self._read_state(user_id, lock=attempt > 0)
+            self._check_funds(user_id, delta, available, reserved)
+            result = self.db.execute(self._cas_update(user_id, version, delta)).first()
+            if result is not None:
+                return result.available_credits, result.reserved_credits, result.version
+        return None
+
+    def ensure_balance_rows(self, user_ids: Iterable[int]) -> None:
+        """Create missing ``user_balance`` rows with zero balances (one statement)."""
+        ids = sorted(set(user_ids))
+        if not ids:
+            return
+        ub = UserBalance.__table__
+        new_ids = func.unnest(bindparam("new_user_ids", type_=ARRAY(Integer))).table_valued("user_id").render_derived()
+        stmt = (
+            pg_insert(ub)
+            .from_select(
+                ["user_id", "available_credits", "reserved_credits", "total_earned", "total_spent", "version"],
+                select(new_ids.c.user_id, literal(ZERO), literal(ZERO), literal(ZERO), literal(ZERO), literal(1)),
+            )
+            .on_conflict_do_nothing(index_elements=[ub.c.user_id])
+        )
+        self.db.execute(stmt, {"new_user_ids": ids})
+
+    # ── Internals ────────────────────────────────────────────────────────
+
+    def _read_state(
+        self, user_id: int, idempotency_key: Optional[str] = None, *, lock: bool = False
+    ) -> Tuple[int, Decimal, Decimal, Optional[int]]:
+        """Return ``(version, available, reserved, existing_tx_id)``, creating the row if missing.
+
+        After a lost CAS the row is read ``FOR UPDATE``: the next attempt is
+        then guaranteed to win instead of spinning against a hot writer.
+        """
+        ub = UserBalance.__table__
+        bt = BalanceTransaction.__table__
+        existing = (
+            select(bt.c.id).where(bt.c.idempotency_key == idempotency_key).scalar_subquery()
+            if idempotency_key is not None
+            else literal(None, Integer)
+        )
+        stmt = select(ub.c.version, ub.c.available_credits, ub.c.reserved_credits, existing.label("existing_id")).where(
+            ub.c.user_id == user_id
+        )
+        if lock or self.lock_rows:
+            stmt = stmt.with_for_update(of=ub)
+
+        state = self.db.execute(stmt).first()
+        if state is None:
+            # First movement for this user: create the aggregate row and re-read.
+            self.ensure_balance_rows([user_id])
+            state = self.db.execute(stmt).one()
+        return state.version, state.available_credits, state.reserved_credits, state.existing_id
+
+    def _apply_net_deltas(self, deltas: List[Tuple[int, Decimal, Decimal, Decimal, Decimal]]) -> int:
+        """One set-based ``UPDATE user_balance … FROM unnest(…) AS net`` for many users.
+
+        The per-user rows are shipped as parallel arrays rather than a literal
+        ``VALUES`` list, so the statement compiles once regardless of size.
+        """
+        ub = UserBalance.__table__
+        money = Numeric(15, 2)
+        names = ("user_id", "d_available", "d_reserved", "d_earned", "d_spent")
+        types = (Integer, money, money, money, money)
+        net = (
+            func.unnest(*(bindparam(f"net_{name}", type_=ARRAY(type_)) for name, type_ in zip(names, types)))
+            .table_valued(*(column(name, type_) for name, type_ in zip(names, types)))
+            .render_derived(name="net")
+        )
+        stmt = (
+            update(ub)
+            .where(ub.c.user_id == net.c.user_id)
+            .values(
+                available_credits=ub.c.available_credits + net.c.d_available,
+                reserved_credits=ub.c.reserved_credits + net.c.d_reserved,
+                total_earned=ub.c.total_earned + net.c.d_earned,
+                total_spent=ub.c.total_spent + net.c.d_spent,
+                version=ub.c.version + 1,
+                last_transaction_at=func.now(),
+                updated_at=func.now(),
+            )
+        )
+        params = {f"net_{name}": list(values_) for name, values_ in zip(names, zip(*deltas))}
+        return self.db.execute(stmt, params).rowcount
+
+    def _cached(self, idempotency_key: str) -> Optional[LedgerWriteResult]:
+        return self.idempotency.cached(idempotency_key) if self.idempotency is not None else None
+
+    def _needs_lookup(self, idempotency_key: str) -> bool:
+        """False only when the guard has certainly never seen the key."""
+        return self.idempotency is None or self.idempotency.might_exist(idempotency_key)
+
+    def _track(self, idempotency_key: str, result: LedgerWriteResult) -> LedgerWriteResult:
+        if self.idempotency is not None:
+            self.idempotency.track(self.db, idempotency_key, result)
+        return result
+
+    def _post(self, postings: List[Dict[str, Any]]) -> None:
+        if postings:
+            self.db.execute(LedgerPosting.__table__.insert(), postings)
+
+    @staticmethod
+    def _check_funds(user_id: int, delta: BalanceDelta, available: Decimal, reserved: Decimal) -> None:
+        if available + delta.available < 0:
+            raise InsufficientFundsError(user_id, -delta.available, available)
+        if reserved + delta.reserved < 0:
+            raise InsufficientFundsError(user_id, -delta.reserved, reserved)
+
+    @staticmethod
+    def _cas_update(user_id: int, version: int, delta: BalanceDelta):
+        ub = UserBalance.__table__
+        return (
+            update(ub)
+            .where(
+                and_(
+                    ub.c.user_id == user_id,
+                    ub.c.version == version,
+                    ub.c.available_credits + delta.available >= 0,
+                    ub.c.reserved_credits + delta.reserved >= 0,
+                )
+            )
+            .values(
+                available_credits=ub.c.available_credits + delta.available,
+                reserved_credits=ub.c.reserved_credits + delta.reserved,
+                total_earned=ub.c.total_earned + delta.earned,
+                total_spent=ub.c.total_spent + delta.spent,
+                version=ub.c.version + 1,
+                last_transaction_at=func.now(),
+                updated_at=func.now(),
+            )
+            .returning(ub.c.user_id, ub.c.available_credits, ub.c.reserved_credits, ub.c.version)
+        )
+
+    def _cas_and_insert(self, user_id: int, version: int, delta: BalanceDelta, row: Dict[str, Any]):
+        """``WITH upd AS (UPDATE …), ins AS (INSERT … SELECT FROM upd ON CONFLICT DO NOTHING)``."""
+        bt = BalanceTransaction.__table__
+        upd = self._cas_update(user_id, version, delta).cte("upd")
+        columns = [c for c in row if c != "user_id"]
+        ins = (
+            pg_insert(bt)
+            .from_select(
+                ["user_id", *columns],
+                select(upd.c.user_id, *(_as_sql(row[c], bt.c[c].type) for c in columns)),
+            )
+            .on_conflict_do_nothing(index_elements=[bt.c.idempotency_key])
+            .returning(bt.c.id)
+            .cte("ins")
+        )
+        return select(
+            upd.c.available_credits,
+            upd.c.reserved_credits,
+            upd.c.version,
+            ins.c.id.label("transaction_id"),
+        ).select_from(upd.outerjoin(ins, true()))
+
+    @staticmethod
+    def _ledger_row(**values: Any) -> Dict[str, Any]:
+        row = {
+            "status": TransactionStatus.completed,
+            "completed_at": func.now(),
+        }
+        row.update({k: v for k, v in values.items() if v is not None})
+        return row
+
+    @staticmethod
+    def _replayed(
+        user_id: int,
+        transaction_id: int,
+        version: Optional[int],
+        available: Optional[Decimal],
+        reserved: Optional[Decimal],
+    ) -> LedgerWriteResult:
+        return LedgerWriteResult(
+            transaction_id=transaction_id,
+            user_id=user_id,
+            available_credits=available if available is not None else ZERO,
+            reserved_credits=reserved if reserved is not None else ZERO,
+            version=version or 0,
+            replayed=True,
+        )
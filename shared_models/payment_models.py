@@ -8,6 +8,11 @@ Tables:
   - topup_requests       — stub for bank/payment topup
   - withdraw_requests    — stub for bank/card withdrawal
   - topic_votes          — forum topic upvotes (threshold >= 10 triggers reward)
+  - ledger_balance_totals              — per-user balance recomputed from the ledger
+  - ledger_reconciliation_checkpoints  — last ledger id folded into the totals
+  - balance_snapshots                  — per-user monthly closing balances
+  - booking_reservations               — credit holds for SubjectSchedule bookings
+  - ledger_postings                    — per-user postings (optional double-entry mode)
 
 Enums (TransactionType, TransactionStatus, WithdrawRequestStatus) live in
 shared_models/schemas.py to avoid circular imports:
@@ -16,6 +21,7 @@ shared_models/schemas.py to avoid circular imports:
 
 from __future__ import annotations
 
+import uuid
 from datetime import datetime
 from decimal import Decimal
 from typing import List, Optional
@@ -32,11 +38,18 @@ from sqlalchemy import (
     Text,
     UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 from shared_models.models import Base
-from shared_models.schemas import TransactionType, TransactionStatus, WithdrawRequestStatus
+from shared_models.schemas import (
+    PostingSide,
+    ReservationStatus,
+    TransactionType,
+    TransactionStatus,
+    WithdrawRequestStatus,
+)
 
 
 # NOTE: enums TransactionType / TransactionStatus / WithdrawRequestStatus
@@ -137,8 +150,8 @@ class BalanceTransaction(Base):
         UniqueConstraint("idempotency_key", name="uq_btx_idempotency"),
         Index("ix_btx_user_created", "user_id", "created_at"),
         Index("ix_btx_type_status", "transaction_type", "status"),
-        Index("ix_btx_reference", "reference_type", "reference_id"),
-        Index("ix_btx_counterpart", "counterpart_user_id"),
+        Index("ix_btx_reference_user", "reference_type", "reference_id", "user_id"),
+        Index("ix_btx_counterpart_created", "counterpart_user_id", "created_at"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -262,7 +275,10 @@ class TopupRequest(Base):
     """
 
     __tablename__ = "topup_requests"
-    __table_args__ = (Index("ix_topup_user_created", "user_id", "created_at"),)
+    __table_args__ = (
+        Index("ix_topup_user_created", "user_id", "created_at"),
+        Index("ix_topup_status_created", "status", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
@@ -319,7 +335,10 @@ class WithdrawRequest(Base):
     """
 
     __tablename__ = "withdraw_requests"
-    __table_args__ = (Index("ix_withdraw_user_created", "user_id", "created_at"),)
+    __table_args__ = (
+        Index("ix_withdraw_user_created", "user_id", "created_at"),
+        Index("ix_withdraw_status_created", "status", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
@@ -370,7 +389,7 @@ class TopicVote(Base):
     Unique per (topic_id, user_id).
     Topic rating = count of TopicVote rows for that topic.
     When rating reaches >= 10, the topic author earns a ``reward_forum_topic``
-    BalanceTransaction (handled by PaymentManager.reward_topic_if_threshold).
+    BalanceTransaction (handled in batches by ``topic_votes.ingest_votes``).
     """
 
     __tablename__ = "topic_votes"
@@ -397,3 +416,203 @@ class TopicVote(Base):
 
     topic: Mapped["Topic"] = relationship("Topic", back_populates="votes")
     user: Mapped["User"] = relationship("User")
+
+
+class LedgerBalanceTotal(Base):
+    """Per-user balance recomputed from ``balance_transactions``.
+
+    Maintained incrementally by ``LedgerReconciler``: each run folds only the
+    ledger rows after the checkpoint into these sums and compares them with
+    ``UserBalance``. Never written by the payment paths themselves.
+    """
+
+    __tablename__ = "ledger_balance_totals"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    available_credits: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    reserved_credits: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    total_earned: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    total_spent: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    last_transaction_id: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="Highest balance_transactions.id folded into this row",
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+
+class LedgerReconciliationCheckpoint(Base):
+    """Named checkpoint of an incremental ledger job.
+
+    ``last_transaction_id`` is the highest ``balance_transactions.id`` the job
+    has consumed; the next run scans ``id > last_transaction_id`` only.
+    """
+
+    __tablename__ = "ledger_reconciliation_checkpoints"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    last_transaction_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_run_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_drift_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+
+class BalanceSnapshot(Base):
+    """Per-user closing balance at the end of a (monthly) period.
+
+    Built incrementally by ``BalanceSnapshotBuilder``: a row is written only
+    for users with ledger activity in the period, carrying forward their
+    previous snapshot. A point-in-time balance is the nearest snapshot with
+    ``period_end <= at`` plus the ledger rows in ``[period_end, at)``.
+    """
+
+    __tablename__ = "balance_snapshots"
+    __table_args__ = (UniqueConstraint("user_id", "period_end", name="uq_balance_snapshot_user_period"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    period_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    period_end: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        comment="Exclusive upper bound: covers ledger rows with created_at < period_end",
+    )
+    available_credits: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    reserved_credits: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    total_earned: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    total_spent: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    transaction_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="Ledger movements of this user within the period",
+    )
+    last_transaction_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+
+class BookingReservation(Base):
+    """Credit hold backing a ``SubjectSchedule`` booking.
+
+    Lifecycle (driven by ``ReservationManager``):
+    1. ``held`` — ``reserve`` ledger entry moved ``amount`` into ``reserved_credits``.
+    2. Booking ``finished`` → ``captured``: ``release`` + ``transfer_to_mentor``
+       (or ``spend_booking`` when there is no mentor).
+    3. Booking ``cancelled``/``released`` → ``released``; past ``expires_at``
+       the sweeper releases it as ``expired`` (``failed`` when the release is
+       rejected because ``reserved_credits`` no longer cover it).
+
+    At most one reservation per booking (UNIQUE ``schedule_id``).
+    """
+
+    __tablename__ = "booking_reservations"
+    __table_args__ = (
+        UniqueConstraint("schedule_id", name="uq_booking_reservation_schedule"),
+        Index(
+            "ix_booking_reservations_held_expiry",
+            "expires_at",
+            postgresql_where=text("status = 'held'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    schedule_id: Mapped[int] = mapped_column(
+        ForeignKey("subject_schedule.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+        comment="Student whose credits are held",
+    )
+    mentor_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("users.id", ondelete="SET NULL"),
+        nullable=True,
+        comment="Receives the captured amount; NULL → captured as spend_booking",
+    )
+    amount: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False)
+    status: Mapped[ReservationStatus] = mapped_column(
+        Enum(ReservationStatus, name="reservation_status", native_enum=False),
+        nullable=False,
+        default=ReservationStatus.held,
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    reserve_transaction_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("balance_transactions.id", ondelete="SET NULL"), nullable=True
+    )
+    settle_transaction_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("balance_transactions.id", ondelete="SET NULL"),
+        nullable=True,
+        comment="Capturing transfer/spend or the release entry",
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    settled_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class LedgerPosting(Base):
+    """One user's side of a ledger entry (double-entry mode).
+
+    Written by ``PaymentManager`` in double-entry mode next to every applied
+    ``BalanceTransaction``: one posting for single-user entries, a debit and
+    a credit posting sharing ``transfer_id`` for transfers. Every user's
+    history is then a range scan on ``ix_ledger_postings_user_created``
+    (no OR over ``counterpart_user_id``), and each transfer's postings must
+    sum to zero ``available_delta``.
+    """
+
+    __tablename__ = "ledger_postings"
+    __table_args__ = (
+        Index("ix_ledger_postings_user_created", "user_id", "created_at"),
+        Index(
+            "ix_ledger_postings_transfer",
+            "transfer_id",
+            postgresql_where=text("transfer_id IS NOT NULL"),
+        ),
+        UniqueConstraint("transaction_id", "user_id", name="uq_ledger_posting_tx_user"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    transaction_id: Mapped[int] = mapped_column(
+        ForeignKey("balance_transactions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    transfer_id: Mapped[Optional[uuid.UUID]] = mapped_column(
+        UUID(as_uuid=True),
+        nullable=True,
+        comment="Shared by both postings of a transfer",
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    side: Mapped[PostingSide] = mapped_column(
+        Enum(PostingSide, name="posting_side", native_enum=False),
+        nullable=False,
+    )
+    available_delta: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False)
+    reserved_delta: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    earned_delta: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    spent_delta: Mapped[Decimal] = mapped_column(Numeric(15, 2), nullable=False, default=Decimal("0.00"))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
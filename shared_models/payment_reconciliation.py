@@ -0,0 +1,264 @@
+"""Incremental ledger → balance reconciliation.
+
+``BalanceTransaction`` is the source of truth and ``UserBalance`` a cache.
+``LedgerReconciler`` keeps per-user sums of the ledger in
+``ledger_balance_totals`` and, on every run:
+
+1. folds only the ledger rows after its checkpoint into those sums with one
+   ``INSERT … SELECT … GROUP BY … ON CONFLICT DO UPDATE`` — rows are
+   aggregated by PostgreSQL, never loaded into Python;
+2. compares ``user_balance`` with the sums (plus the short not-yet-folded
+   tail) and reports drift;
+3. optionally repairs drifted rows with a ``version``-guarded UPDATE.
+
+Only ``completed`` and ``reversed`` entries carry a balance effect (a
+reversed entry was applied and later offset by another row). Entries newer
+than ``safety_lag`` are not folded yet, so transactions that commit out of id
+order are still picked up by the next run.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Any, List, Optional
+
+from sqlalchemy import func, or_, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import ColumnElement
+
+from shared_models.payment_manager import TRANSFER_TYPES, ZERO, PaymentManager, ledger_delta_exprs
+from shared_models.payment_models import (
+    BalanceTransaction,
+    LedgerBalanceTotal,
+    LedgerReconciliationCheckpoint,
+    UserBalance,
+)
+from shared_models.schemas import BalanceDrift, ReconciliationReport, TransactionStatus
+
+APPLIED_STATUSES = (TransactionStatus.completed, TransactionStatus.reversed)
+DEFAULT_CHECKPOINT = "ledger_balance"
+BALANCE_FIELDS = ("available_credits", "reserved_credits", "total_earned", "total_spent")
+
+
+def ledger_movements(*conditions: ColumnElement[bool], user_id: Optional[int] = None) -> Select:
+    """Per-user balance movements of the applied ledger rows matching ``conditions``.
+
+    Single-row transfers yield two movements (owner and counterpart), so the
+    result can be summed per ``user_id`` without OR queries. With ``user_id``
+    each leg is restricted to that user (``ix_btx_user_created`` /
+    ``ix_btx_counterpart_created``).
+    """
+    bt = BalanceTransaction.__table__
+
+    def leg(user_column: ColumnElement, counterpart: bool) -> Select:
+        deltas = ledger_delta_exprs(bt.c.transaction_type, bt.c.amount, counterpart=counterpart)
+        stmt = select(
+            user_column.label("user_id"),
+            bt.c.id.label("transaction_id"),
+            *(delta.label(field) for delta, field in zip(deltas, BALANCE_FIELDS)),
+        ).where(bt.c.status.in_(APPLIED_STATUSES), *conditions)
+        if user_id is not None:
+            stmt = stmt.where(user_column == user_id)
+        return stmt
+
+    owner = leg(bt.c.user_id, counterpart=False)
+    counterpart = leg(bt.c.counterpart_user_id, counterpart=True).where(
+        bt.c.counterpart_user_id.isnot(None),
+        bt.c.transaction_type.in_(TRANSFER_TYPES),
+    )
+    return union_all(owner, counterpart)
+
+
+def ledger_sums(*conditions: ColumnElement[bool]) -> Select:
+    """``ledger_movements`` summed per user, with the highest ledger id seen."""
+    movements = ledger_movements(*conditions).subquery("movements")
+    return select(
+        movements.c.user_id,
+        *(func.sum(movements.c[field]).label(field) for field in BALANCE_FIELDS),
+        func.max(movements.c.transaction_id).label("last_transaction_id"),
+    ).group_by(movements.c.user_id)
+
+
+class LedgerReconciler:
+    """Incremental reconciliation job for ``balance_transactions`` vs ``user_balance``.
+
+    Args:
+        db: Session; ``run()`` leaves committing to the caller.
+        name: Checkpoint name — independent jobs keep separate checkpoints.
+        safety_lag: Ledger rows younger than this stay in the unfolded tail.
+        max_report: Cap on drift rows returned in the report.
+        check_all: Compare every ``user_balance`` row (default) or only the
+            users with ledger activity since the previous checkpoint.
+        payments: Manager used to create missing balance rows; a default one on ``db``.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        *,
+        name: str = DEFAULT_CHECKPOINT,
+        safety_lag: timedelta = timedelta(minutes=5),
+        max_report: int = 1000,
+        check_all: bool = True,
+        payments: Optional[PaymentManager] = None,
+    ):
+        self.db = db
+        self.payments = payments or PaymentManager(db)
+        self.name = name
+        self.safety_lag = safety_lag
+        self.max_report = max_report
+        self.check_all = check_all
+
+    def run(self, *, repair: bool = False) -> ReconciliationReport:
+        """Fold new ledger rows, report drift and optionally repair it."""
+        bt = BalanceTransaction.__table__
+        cp = LedgerReconciliationCheckpoint.__table__
+        lower = self._lock_checkpoint()
+        upper = self.db.execute(
+            select(func.coalesce(func.max(bt.c.id), lower)).where(
+                bt.c.id > lower,
+                bt.c.created_at < func.now() - self.safety_lag,
+            )
+        ).scalar_one()
+
+        report = ReconciliationReport(from_transaction_id=lower, to_transaction_id=upper)
+        if upper > lower:
+            report.users_folded = self._fold(lower, upper)
+
+        missing: List[int] = []
+        for row in self.db.execute(self._drift_query(lower, upper), execution_options={"yield_per": 1000}):
+            report.drift_count += 1
+            if row.available_credits is None:
+                missing.append(row.user_id)
+            if len(report.drift) < self.max_report:
+                report.drift.append(BalanceDrift.model_validate(row._mapping))
+
+        if repair and report.drift_count:
+            report.repaired = self._repair(lower, upper, missing)
+
+        self.db.execute(
+            update(cp)
+            .where(cp.c.name == self.name)
+            .values(last_transaction_id=upper, last_run_at=func.now(), last_drift_count=report.drift_count)
+        )
+        return report
+
+    def rebuild(self, *, repair: bool = False) -> ReconciliationReport:
+        """Drop the accumulated sums and recompute them from the whole ledger."""
+        self._lock_checkpoint()
+        self.db.execute(LedgerBalanceTotal.__table__.delete())
+        cp = LedgerReconciliationCheckpoint.__table__
+        self.db.execute(update(cp).where(cp.c.name == self.name).values(last_transaction_id=0))
+        return self.run(repair=repair)
+
+    # ── Internals ────────────────────────────────────────────────────────
+
+    def _lock_checkpoint(self) -> int:
+        """Create/lock the checkpoint row; concurrent runs queue up behind it."""
+        cp = LedgerReconciliationCheckpoint.__table__
+        self.db.execute(
+            pg_insert(cp)
+            .values(name=self.name, last_transaction_id=0)
+            .on_conflict_do_nothing(index_elements=[cp.c.name])
+        )
+        return self.db.execute(
+            select(cp.c.last_transaction_id).where(cp.c.name == self.name).with_for_update()
+        ).scalar_one()
+
+    def _fold(self, lower: int, upper: int) -> int:
+        bt = BalanceTransaction.__table__
+        totals = LedgerBalanceTotal.__table__
+        sums = ledger_sums(bt.c.id > lower, bt.c.id <= upper)
+        stmt = pg_insert(totals).from_select(["user_id", *BALANCE_FIELDS, "last_transaction_id"], sums)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[totals.c.user_id],
+            set_={
+                **{field: totals.c[field] + stmt.excluded[field] for field in BALANCE_FIELDS},
+                "last_transaction_id": func.greatest(totals.c.last_transaction_id, stmt.excluded.last_transaction_id),
+                "updated_at": func.now(),
+            },
+        )
+        return self.db.execute(stmt).rowcount
+
+    def _expected(self, upper: int):
+        """Ledger totals through ``upper`` plus the unfolded tail after it."""
+        bt = BalanceTransaction.__table__
+        totals = LedgerBalanceTotal.__table__
+        tail = ledger_sums(bt.c.id > upper).subquery("tail")
+        return (
+            select(
+                func.coalesce(totals.c.user_id, tail.c.user_id).label("user_id"),
+                *(
+                    (func.coalesce(totals.c[field], ZERO) + func.coalesce(tail.c[field], ZERO)).label(field)
+                    for field in BALANCE_FIELDS
+                ),
+            )
+            .select_from(totals.outerjoin(tail, totals.c.user_id == tail.c.user_id, full=True))
+            .subquery("expected")
+        )
+
+    def _drift_query(self, lower: int, upper: int) -> Select:
+        ub = UserBalance.__table__
+        expected = self._expected(upper)
+        user_id = func.coalesce(ub.c.user_id, expected.c.user_id)
+        stmt = (
+            select(
+                user_id.label("user_id"),
+                ub.c.version,
+                *_drift_columns(ub, expected),
+            )
+            .select_from(ub.outerjoin(expected, ub.c.user_id == expected.c.user_id, full=True))
+            .where(
+                or_(
+                    *(
+                        func.coalesce(ub.c[field], ZERO) != func.coalesce(expected.c[field], ZERO)
+                        for field in BALANCE_FIELDS
+                    )
+                )
+            )
+            .order_by(user_id)
+        )
+        if not self.check_all:
+            bt = BalanceTransaction.__table__
+            active = ledger_movements(bt.c.id > lower).subquery("active")
+            stmt = stmt.where(user_id.in_(select(active.c.user_id)))
+        return stmt
+
+    def _repair(self, lower: int, upper: int, missing: List[int]) -> int:
+        """Overwrite drifted balances with the ledger view, guarded by ``version``."""
+        if missing:
+            self.payments.ensure_balance_rows(missing)
+        ub = UserBalance.__table__
+        drift = self._drift_query(lower, upper).order_by(None).subquery("drift")
+        stmt = (
+            update(ub)
+            .where(
+                ub.c.user_id == drift.c.user_id,
+                ub.c.version == func.coalesce(drift.c.version, 1),
+            )
+            .values(
+                available_credits=drift.c.expected_available,
+                reserved_credits=drift.c.expected_reserved,
+                total_earned=drift.c.expected_earned,
+                total_spent=drift.c.expected_spent,
+                version=ub.c.version + 1,
+                updated_at=func.now(),
+            )
+        )
+        return self.db.execute(stmt).rowcount
+
+
+def _drift_columns(ub: Any, expected: Any) -> List[ColumnElement]:
+    labels = {
+        "available_credits": "expected_available",
+        "reserved_credits": "expected_reserved",
+        "total_earned": "expected_earned",
+        "total_spent": "expected_spent",
+    }
+    columns: List[ColumnElement] = []
+    for field, expected_label in labels.items():
+        columns.append(ub.c[field].label(field))
+        columns.append(func.coalesce(expected.c[field], ZERO).label(expected_label))
+    return columns
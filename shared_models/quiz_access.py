@@ -0,0 +1,118 @@
+"""Access decision for starting a quiz, in one round-trip.
+
+Starting a quiz depends on the quiz (``status``, ``access_type``,
+``max_attempts``), on the user's previous attempts and, for paid quizzes, on a
+completed ``spend_quiz`` ledger entry referencing the quiz. ``check_quiz_access``
+fetches all of it with a single ``SELECT`` — the attempt count and the
+in-progress attempt come from ``ix_quiz_progress_user_quiz``, the payment from
+``ix_btx_reference_user`` — and ``decide_access`` turns the row into a
+``QuizAccessDecision``:
+
+* the quiz creator may always start it;
+* unpublished quizzes are refused, ``PRIVATE`` ones too;
+* ``REGISTERED``, ``PAID`` and ``SUBSCRIPTION`` quizzes need a user, ``PAID``
+  ones also a completed payment. Subscriptions are not stored in this
+  package: the decision only sets ``subscription_required`` for the caller;
+* an attempt that is still in progress is resumed instead of counted;
+* otherwise ``max_attempts`` (0 or NULL means unlimited) caps the attempts.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from sqlalchemy import case, exists, false, func, literal, null, select
+from sqlalchemy.orm import Session
+
+from shared_models.payment_models import BalanceTransaction
+from shared_models.quiz_model import (
+    AttemptStatus,
+    Quiz,
+    QuizAccessDecision,
+    QuizAccessReason,
+    QuizAccessType,
+    QuizProgress,
+    QuizStatus,
+)
+from shared_models.schemas import TransactionStatus, TransactionType
+
+QUIZ_REFERENCE_TYPE = "quiz"
+SIGNED_IN_ACCESS = frozenset({QuizAccessType.REGISTERED, QuizAccessType.PAID, QuizAccessType.SUBSCRIPTION})
+
+
+def check_quiz_access(db: Session, quiz_id: int, user_id: Optional[int]) -> QuizAccessDecision:
+    """Whether ``user_id`` (None for anonymous visitors) may start ``quiz_id`` now."""
+    quizzes = Quiz.__table__
+    progress = QuizProgress.__table__
+    ledger = BalanceTransaction.__table__
+    if user_id is None:
+        attempts, resume_id, paid = literal(0), null(), false()
+    else:
+        own = (progress.c.user_id == user_id, progress.c.quiz_id == quizzes.c.id)
+        attempts = select(func.count()).where(*own).scalar_subquery()
+        resume_id = (
+            select(progress.c.id)
+            .where(*own, progress.c.status == AttemptStatus.IN_PROGRESS)
+            .order_by(progress.c.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        payment = exists().where(
+            ledger.c.reference_type == QUIZ_REFERENCE_TYPE,
+            ledger.c.reference_id == quizzes.c.id,
+            ledger.c.user_id == user_id,
+            ledger.c.transaction_type == TransactionType.spend_quiz,
+            ledger.c.status == TransactionStatus.completed,
+        )
+        # The ledger is only probed for paid quizzes.
+        paid = case((quizzes.c.access_type == QuizAccessType.PAID, payment), else_=false())
+    row = db.execute(
+        select(
+            quizzes.c.id,
+            quizzes.c.creator_id,
+            quizzes.c.status,
+            quizzes.c.access_type,
+            quizzes.c.max_attempts,
+            attempts.label("attempts"),
+            resume_id.label("resume_attempt_id"),
+            paid.label("paid"),
+        ).where(quizzes.c.id == quiz_id)
+    ).first()
+    return decide_access(quiz_id, user_id, row)
+
+
+def decide_access(quiz_id: int, user_id: Optional[int], row: Optional[Any]) -> QuizAccessDecision:
+    """The decision for a row of ``check_quiz_access`` (None when the quiz does not exist)."""
+    if row is None:
+        return QuizAccessDecision(quiz_id=quiz_id, allowed=False, reason=QuizAccessReason.NOT_FOUND)
+    attempts = row.attempts or 0
+    limit = row.max_attempts or None
+    decision = dict(
+        quiz_id=quiz_id,
+        attempts_used=attempts,
+        attempts_left=max(limit - attempts, 0) if limit else None,
+        subscription_required=row.access_type == QuizAccessType.SUBSCRIPTION,
+    )
+    is_creator = user_id is not None and row.creator_id == user_id
+
+    refused = None
+    if is_creator:
+        pass
+    elif row.status != QuizStatus.PUBLISHED:
+        refused = QuizAccessReason.NOT_PUBLISHED
+    elif row.access_type == QuizAccessType.PRIVATE:
+        refused = QuizAccessReason.PRIVATE
+    elif row.access_type in SIGNED_IN_ACCESS and user_id is None:
+        refused = QuizAccessReason.LOGIN_REQUIRED
+    elif row.access_type == QuizAccessType.PAID and not row.paid:
+        refused = QuizAccessReason.PAYMENT_REQUIRED
+    if refused is not None:
+        return QuizAccessDecision(allowed=False, reason=refused, **decision)
+
+    if row.resume_attempt_id is not None:
+        return QuizAccessDecision(
+            allowed=True, reason=QuizAccessReason.RESUME, resume_attempt_id=row.resume_attempt_id, **decision
+        )
+    if limit and attempts >= limit and not is_creator:
+        return QuizAccessDecision(allowed=False, reason=QuizAccessReason.ATTEMPTS_EXHAUSTED, **decision)
+    return QuizAccessDecision(allowed=True, reason=QuizAccessReason.ALLOWED, **decision)
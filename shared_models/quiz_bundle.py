@@ -0,0 +1,280 @@
+"""Quiz / course bundles: a compact binary format to move quizzes between environments.
+
+A bundle is a zstd-compressed stream of msgpack records:
+
+1. a header ``{"format": "quiz-bundle", "version": 1}``;
+2. one ``{"kind": "quiz", ...}`` record per quiz — settings, ``payload`` (the
+   normalized ``quiz_questions`` rows when the quiz uses them) and
+   ``anti_cheat_config``;
+3. one ``{"kind": "course", ...}`` record per course with its items, which
+   point at quizzes by their id in the source database.
+
+Enums travel as their values; image references inside questions
+(``image_url``) are kept as they are, the images themselves are not copied.
+
+``export_bundle`` streams quizzes chunk by chunk through a server-side cursor
+and writes records as it goes. ``import_bundle`` inserts them back in bulk
+(one multi-row ``INSERT … RETURNING`` per chunk of quizzes, one per batch of
+courses and of course items) under a new creator, remapping ids and giving
+colliding slugs a ``-2``, ``-3``, … suffix. It does not commit, so the whole
+bundle lands in the caller's transaction or not at all. ``clone_course``
+combines both in memory.
+
+Needs the optional ``msgpack`` and ``zstandard`` dependencies
+(``pip install shared-models[bundle]``).
+"""
+
+from __future__ import annotations
+
+import enum
+import io
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from shared_models.quiz_model import (
+    CourseStatus,
+    QuizAccessType,
+    QuizBundleExportResult,
+    QuizBundleImportResult,
+    Quiz,
+    QuizCourse,
+    QuizCourseItem,
+    QuizStatus,
+    ResultMode,
+)
+from shared_models.quiz_storage import load_quiz_payload
+
+try:
+    import msgpack
+    import zstandard
+except ImportError:  # pragma: no cover
+    msgpack = None  # type: ignore[assignment]
+    zstandard = None  # type: ignore[assignment]
+
+BUNDLE_FORMAT = "quiz-bundle"
+BUNDLE_VERSION = 1
+BUNDLE_CHUNK_SIZE = 500
+
+QUIZ_FIELDS = (
+    "slug",
+    "title",
+    "description",
+    "language",
+    "status",
+    "access_type",
+    "result_mode",
+    "time_limit_minutes",
+    "passing_score",
+    "max_attempts",
+    "show_correct_answers",
+    "send_email_on_completion",
+    "randomize_questions",
+    "anti_cheat_config",
+)
+COURSE_FIELDS = ("title", "description", "language", "status", "is_sequential", "certificate_enabled")
+ITEM_FIELDS = ("order_index", "is_required")
+ENUM_FIELDS = {
+    "status": QuizStatus,
+    "access_type": QuizAccessType,
+    "result_mode": ResultMode,
+}
+
+
+def export_bundle(
+    db: Session,
+    fp: IO[bytes],
+    *,
+    quiz_ids: Sequence[int] = (),
+    course_ids: Sequence[int] = (),
+    chunk_size: int = BUNDLE_CHUNK_SIZE,
+) -> QuizBundleExportResult:
+    """Write ``quiz_ids`` and ``course_ids`` (with all their quizzes) to ``fp``."""
+    _require_bundle()
+    items = QuizCourseItem.__table__
+    courses = db.execute(
+        select(QuizCourse.__table__)
+        .where(QuizCourse.__table__.c.id.in_(course_ids))
+        .order_by(QuizCourse.__table__.c.id)
+    ).all()
+    course_items = db.execute(
+        select(items).where(items.c.course_id.in_(course_ids)).order_by(items.c.course_id, items.c.order_index)
+    ).all()
+    wanted = sorted(set(quiz_ids) | {item.quiz_id for item in course_items})
+
+    result = QuizBundleExportResult()
+    with zstandard.ZstdCompressor().stream_writer(fp, closefd=False) as writer:
+        packer = msgpack.Packer()
+        writer.write(packer.pack({"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION}))
+        for record in _quiz_records(db, wanted, chunk_size):
+            writer.write(packer.pack(record))
+            result.quizzes += 1
+        by_course: Dict[int, List[Dict[str, Any]]] = {course.id: [] for course in courses}
+        for item in course_items:
+            by_course[item.course_id].append(
+                {"quiz": item.quiz_id, **{name: item._mapping[name] for name in ITEM_FIELDS}}
+            )
+        for course in courses:
+            record = {"kind": "course", "id": course.id, **_plain(course._mapping, COURSE_FIELDS)}
+            record["items"] = by_course[course.id]
+            writer.write(packer.pack(record))
+            result.courses += 1
+            result.items += len(record["items"])
+    return result
+
+
+def iter_bundle(fp: IO[bytes]) -> Iterator[Dict[str, Any]]:
+    """Records of a bundle after its header."""
+    _require_bundle()
+    reader = zstandard.ZstdDecompressor().stream_reader(fp, closefd=False)
+    records = iter(msgpack.Unpacker(reader, raw=False))
+    try:
+        header = next(records, None)
+    except zstandard.ZstdError as exc:
+        raise ValueError("Not a quiz bundle") from exc
+    if not isinstance(header, dict) or header.get("format") != BUNDLE_FORMAT:
+        raise ValueError("Not a quiz bundle")
+    if header.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"Unsupported quiz bundle version {header.get('version')}")
+    yield from records
+
+
+def import_bundle(
+    db: Session,
+    fp: IO[bytes],
+    *,
+    creator_id: int,
+    chunk_size: int = BUNDLE_CHUNK_SIZE,
+) -> QuizBundleImportResult:
+    """Insert every quiz and course of a bundle as new rows owned by ``creator_id``."""
+    result = QuizBundleImportResult()
+    pending: List[Dict[str, Any]] = []
+    courses: List[Dict[str, Any]] = []
+    taken: Set[str] = set()
+    for record in iter_bundle(fp):
+        if record.get("kind") == "quiz":
+            pending.append(record)
+            if len(pending) >= chunk_size:
+                _insert_quizzes(db, pending, creator_id, taken, result)
+                pending = []
+        elif record.get("kind") == "course":
+            courses.append(record)
+        else:
+            raise ValueError(f"Unknown quiz bundle record {record.get('kind')!r}")
+    if pending:
+        _insert_quizzes(db, pending, creator_id, taken, result)
+    if courses:
+        _insert_courses(db, courses, creator_id, result)
+    return result
+
+
+def clone_course(db: Session, course_id: int, *, creator_id: int) -> int:
+    """Copy a course and all its quizzes for ``creator_id``; returns the new course id."""
+    buffer = io.BytesIO()
+    export_bundle(db, buffer, course_ids=[course_id])
+    buffer.seek(0)
+    return import_bundle(db, buffer, creator_id=creator_id).course_ids[course_id]
+
+
+def _quiz_records(db: Session, quiz_ids: Sequence[int], chunk_size: int) -> Iterator[Dict[str, Any]]:
+    quizzes = Quiz.__table__
+    rows = db.execute(
+        select(quizzes).where(quizzes.c.id.in_(quiz_ids)).order_by(quizzes.c.id),
+        execution_options={"yield_per": chunk_size},
+    )
+    for chunk in rows.partitions():
+        for row in chunk:
+            payload = row.questions
+            if row.questions_normalized:
+                payload = load_quiz_payload(db, row.id).model_dump(mode="json")
+            yield {"kind": "quiz", "id": row.id, **_plain(row._mapping, QUIZ_FIELDS), "payload": payload}
+
+
+def _insert_quizzes(
+    db: Session,
+    records: List[Dict[str, Any]],
+    creator_id: int,
+    taken: Set[str],
+    result: QuizBundleImportResult,
+) -> None:
+    slugs = _free_slugs(db, [record.get("slug") for record in records], taken)
+    rows = []
+    for record, slug in zip(records, slugs):
+        if slug != record.get("slug"):
+            result.renamed_slugs[record["slug"]] = slug
+        row = {name: _enum(name, record.get(name), ENUM_FIELDS) for name in QUIZ_FIELDS}
+        row.update(slug=slug, creator_id=creator_id, questions=record.get("payload") or {"questions": []})
+        rows.append(row)
+    quizzes = Quiz.__table__
+    new_ids = db.scalars(insert(quizzes).returning(quizzes.c.id, sort_by_parameter_order=True), rows).all()
+    result.quiz_ids.update(zip((record["id"] for record in records), new_ids))
+
+
+def _insert_courses(
+    db: Session,
+    records: List[Dict[str, Any]],
+    creator_id: int,
+    result: QuizBundleImportResult,
+) -> None:
+    courses = QuizCourse.__table__
+    rows = [
+        dict(
+            {name: _enum(name, record.get(name), {"status": CourseStatus}) for name in COURSE_FIELDS},
+            creator_id=creator_id,
+        )
+        for record in records
+    ]
+    new_ids = db.scalars(insert(courses).returning(courses.c.id, sort_by_parameter_order=True), rows).all()
+    result.course_ids.update(zip((record["id"] for record in records), new_ids))
+    items = []
+    for record, course_id in zip(records, new_ids):
+        for item in record.get("items") or ():
+            if item["quiz"] not in result.quiz_ids:
+                raise ValueError(f"Course {record['id']} refers to quiz {item['quiz']} missing from the bundle")
+            items.append(
+                {
+                    "course_id": course_id,
+                    "quiz_id": result.quiz_ids[item["quiz"]],
+                    **{name: item.get(name) for name in ITEM_FIELDS},
+                }
+            )
+    if items:
+        db.execute(insert(QuizCourseItem.__table__), items)
+
+
+def _free_slugs(db: Session, slugs: Iterable[Optional[str]], taken: Set[str]) -> List[Optional[str]]:
+    """``slugs`` with a numeric suffix where they collide with existing quizzes or each other.
+
+    ``taken`` collects the slugs handed out so far and is updated in place.
+    """
+    slugs = list(slugs)
+    result: List[Optional[str]] = list(slugs)
+    candidates = {index: slug for index, slug in enumerate(slugs) if slug}
+    attempt = 1
+    while candidates:
+        existing = set(db.scalars(select(Quiz.slug).where(Quiz.slug.in_(set(candidates.values())))))
+        retry = {}
+        for index, candidate in candidates.items():
+            if candidate in existing or candidate in taken:
+                retry[index] = f"{slugs[index]}-{attempt + 1}"[:255]
+            else:
+                taken.add(candidate)
+                result[index] = candidate
+        candidates = retry
+        attempt += 1
+    return result
+
+
+def _plain(row: Any, fields: Sequence[str]) -> Dict[str, Any]:
+    return {name: row[name].value if isinstance(row[name], enum.Enum) else row[name] for name in fields}
+
+
+def _enum(name: str, value: Any, types: Dict[str, type]) -> Any:
+    enum_type = types.get(name)
+    return enum_type(value) if enum_type is not None and value is not None else value
+
+
+def _require_bundle() -> None:
+    if msgpack is None or zstandard is None:
+        raise RuntimeError("Quiz bundles require msgpack and zstandard: pip install shared-models[bundle]")
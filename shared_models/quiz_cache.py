@@ -0,0 +1,295 @@
+"""Compiled, cached form of ``Quiz.payload``.
+
+``Quiz.payload`` is stored as a JSON document; validating it into
+``QuizPayload`` → ``QuestionSchema`` → ``AnswerSchema`` on every render or
+graded answer repeats the same work for every attempt. ``compile_quiz``
+does it once and adds the lookup tables grading needs (answer ids, the
+correct set and points per question). ``QuizCache`` keeps compiled quizzes
+in an LRU keyed by ``(quiz_id, updated_at)``: editing a quiz bumps
+``updated_at``, so a stale entry is never served — it is simply not hit and
+ages out.
+
+Responses are read from ``QuizProgress.answers["answers"]`` keyed by
+question id: an answer id (or a list of them) for choice questions, the
+typed text for the other types. Answers without an explicit ``id`` are
+addressed by their position as a string (``"0"``, ``"1"``, …).
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, object_session
+
+from shared_models.quiz_model import QuestionSchema, QuestionType, Quiz, QuizPayload, QuizResultPayload
+from shared_models.quiz_storage import load_quiz_payload
+
+CHOICE_TYPES = frozenset({QuestionType.SINGLE_CHOICE, QuestionType.MULTIPLE_CHOICE})
+QUIZ_CACHE_SIZE = 512
+
+CacheKey = Tuple[int, datetime]
+
+
+def answer_key(value: Any) -> FrozenSet[str]:
+    """Normalize a stored response to a set of answer ids (or one typed text)."""
+    if value is None:
+        return frozenset()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return frozenset(str(item) for item in value)
+    return frozenset((str(value),))
+
+
+def normalize_text(value: Any) -> str:
+    return " ".join(str(value).split()).casefold()
+
+
+@dataclass(frozen=True)
+class CompiledQuestion:
+    """A validated question with its grading tables."""
+
+    schema: QuestionSchema
+    position: int
+    answer_ids: Tuple[str, ...]
+    correct_ids: FrozenSet[str]
+    answer_points: Dict[str, int]
+    max_points: int
+    accepted_texts: FrozenSet[str] = frozenset()
+
+    @property
+    def id(self) -> str:
+        return self.schema.id
+
+    @property
+    def is_choice(self) -> bool:
+        return self.schema.type in CHOICE_TYPES
+
+    def score(self, response: Any) -> Tuple[bool, int]:
+        """``(is_correct, earned_points)`` for one stored response.
+
+        Single choice earns the points of the chosen correct answer; multiple
+        choice is all-or-nothing over the correct set; other types earn
+        ``QuestionSchema.points`` when the text matches a correct answer.
+        """
+        if not self.is_choice:
+            correct = response is not None and normalize_text(response) in self.accepted_texts
+            return correct, self.max_points if correct else 0
+        chosen = answer_key(response)
+        if self.schema.type == QuestionType.SINGLE_CHOICE:
+            correct = len(chosen) == 1 and chosen <= self.correct_ids
+        else:
+            correct = bool(chosen) and chosen == self.correct_ids
+        return correct, sum(self.answer_points[answer_id] for answer_id in chosen) if correct else 0
+
+
+@dataclass(frozen=True)
+class CompiledQuiz:
+    """Everything needed to render and grade a quiz version without touching JSON."""
+
+    quiz_id: int
+    updated_at: Optional[datetime]
+    passing_score: float
+    randomize_questions: bool
+    payload: QuizPayload
+    questions: Tuple[CompiledQuestion, ...]
+    by_id: Dict[str, CompiledQuestion] = field(repr=False)
+
+    @property
+    def total_points(self) -> int:
+        return sum(question.max_points for question in self.questions)
+
+    def question_order(self, seed: int) -> List[str]:
+        """Question ids in display order; shuffled deterministically per ``seed`` (e.g. attempt id)."""
+        ids = [question.id for question in self.questions]
+        if self.randomize_questions:
+            random.Random(f"{self.quiz_id}:{seed}").shuffle(ids)
+        return ids
+
+    def answer_order(self, question_id: str, seed: int) -> List[str]:
+        """Answer ids of one question in display order for ``seed``."""
+        question = self.by_id[question_id]
+        ids = list(question.answer_ids)
+        if question.schema.shuffle_answers:
+            random.Random(f"{self.quiz_id}:{seed}:{question_id}").shuffle(ids)
+        return ids
+
+    def grade(self, answers: Dict[str, Any]) -> QuizResultPayload:
+        """Grade one attempt's ``{question_id: response}`` mapping."""
+        correct_answers = earned = 0
+        graded: Dict[str, Any] = {}
+        for question in self.questions:
+            response = answers.get(question.id)
+            is_correct, points = question.score(response)
+            correct_answers += is_correct
+            earned += points
+            graded[question.id] = {"response": response, "is_correct": is_correct, "points": points}
+        total = self.total_points
+        return QuizResultPayload(
+            quiz_id=self.quiz_id,
+            total_questions=len(self.questions),
+            correct_answers=correct_answers,
+            total_points=total,
+            earned_points=earned,
+            percentage=round(earned * 100.0 / total, 2) if total else 0.0,
+            answers=graded,
+        )
+
+    def passed(self, result: QuizResultPayload) -> bool:
+        return result.percentage >= self.passing_score
+
+
+def compile_question(schema: QuestionSchema, position: int) -> CompiledQuestion:
+    answer_ids = tuple(answer.id or str(index) for index, answer in enumerate(schema.answers))
+    correct = [answer_id for answer_id, answer in zip(answer_ids, schema.answers) if answer.is_correct]
+    answer_points = {answer_id: answer.points for answer_id, answer in zip(answer_ids, schema.answers)}
+    if schema.type == QuestionType.SINGLE_CHOICE:
+        max_points = max((answer_points[answer_id] for answer_id in correct), default=0)
+    elif schema.type == QuestionType.MULTIPLE_CHOICE:
+        max_points = sum(answer_points[answer_id] for answer_id in correct)
+    else:
+        max_points = schema.points
+    return CompiledQuestion(
+        schema=schema,
+        position=position,
+        answer_ids=answer_ids,
+        correct_ids=frozenset(correct),
+        answer_points=answer_points,
+        max_points=max_points,
+        accepted_texts=frozenset(normalize_text(answer.text) for answer in schema.answers if answer.is_correct),
+    )
+
+
+def compile_quiz(
+    quiz_id: int,
+    payload: Any,
+    *,
+    updated_at: Optional[datetime] = None,
+    passing_score: float = 70.0,
+    randomize_questions: bool = False,
+) -> CompiledQuiz:
+    """Validate ``payload`` (dict or ``QuizPayload``) once and build its lookup tables."""
+    payload = payload if isinstance(payload, QuizPayload) else QuizPayload.model_validate(payload or {})
+    questions = tuple(compile_question(question, position) for position, question in enumerate(payload.questions))
+    return CompiledQuiz(
+        quiz_id=quiz_id,
+        updated_at=updated_at,
+        passing_score=passing_score if passing_score is not None else 70.0,
+        randomize_questions=bool(randomize_questions),
+        payload=payload,
+        questions=questions,
+        by_id={question.id: question for question in questions},
+    )
+
+
+class QuizCache:
+    """Thread-safe LRU of ``CompiledQuiz`` keyed by ``(quiz_id, updated_at)``.
+
+    One instance is meant to be shared by the whole worker. Compiled quizzes
+    are immutable, so they are handed out without copying.
+    """
+
+    def __init__(self, maxsize: int = QUIZ_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[CacheKey, CompiledQuiz]" = OrderedDict()
+        self._versions: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, quiz: Quiz) -> CompiledQuiz:
+        """Compiled form of a loaded ``Quiz``.
+
+        A quiz with normalized questions is read through the session it belongs to.
+        """
+        cached = self._lookup(quiz.id, quiz.updated_at)
+        if cached is not None:
+            return cached
+        payload = quiz.payload
+        if quiz.questions_normalized:
+            db = object_session(quiz)
+            if db is None:
+                raise ValueError(f"Quiz {quiz.id} has normalized questions but is not attached to a session")
+            payload = load_quiz_payload(db, quiz.id)
+        return self._store(
+            compile_quiz(
+                quiz.id,
+                payload,
+                updated_at=quiz.updated_at,
+                passing_score=quiz.passing_score,
+                randomize_questions=quiz.randomize_questions,
+            )
+        )
+
+    def load(self, db: Session, quiz_id: int) -> Optional[CompiledQuiz]:
+        """Compiled quiz by id; questions are only fetched on a cache miss.
+
+        Quizzes with ``questions_normalized`` are compiled from their
+        ``quiz_questions`` rows, others from ``Quiz.payload``.
+        """
+        updated_at = db.execute(select(Quiz.updated_at).where(Quiz.id == quiz_id)).scalar_one_or_none()
+        if updated_at is None:
+            return None
+        cached = self._lookup(quiz_id, updated_at)
+        if cached is not None:
+            return cached
+        row = db.execute(
+            select(Quiz.updated_at, Quiz.passing_score, Quiz.randomize_questions).where(Quiz.id == quiz_id)
+        ).first()
+        payload = load_quiz_payload(db, quiz_id)
+        if row is None or payload is None:
+            return None
+        return self._store(
+            compile_quiz(
+                quiz_id,
+                payload,
+                updated_at=row.updated_at,
+                passing_score=row.passing_score,
+                randomize_questions=row.randomize_questions,
+            )
+        )
+
+    def invalidate(self, quiz_id: int) -> None:
+        with self._lock:
+            updated_at = self._versions.pop(quiz_id, None)
+            if updated_at is not None:
+                self._entries.pop((quiz_id, updated_at), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def _lookup(self, quiz_id: int, updated_at: Optional[datetime]) -> Optional[CompiledQuiz]:
+        with self._lock:
+            compiled = self._entries.get((quiz_id, updated_at)) if updated_at is not None else None
+            if compiled is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((quiz_id, updated_at))
+            self.hits += 1
+            return compiled
+
+    def _store(self, compiled: CompiledQuiz) -> CompiledQuiz:
+        if compiled.updated_at is None:
+            # Not flushed yet — there is no version to key it by.
+            return compiled
+        with self._lock:
+            previous = self._versions.get(compiled.quiz_id)
+            if previous is not None and previous != compiled.updated_at:
+                self._entries.pop((compiled.quiz_id, previous), None)
+            self._versions[compiled.quiz_id] = compiled.updated_at
+            self._entries[(compiled.quiz_id, compiled.updated_at)] = compiled
+            self._entries.move_to_end((compiled.quiz_id, compiled.updated_at))
+            while len(self._entries) > self.maxsize:
+                (quiz_id, updated_at), _ = self._entries.popitem(last=False)
+                if self._versions.get(quiz_id) == updated_at:
+                    del self._versions[quiz_id]
+        return compiled
@@ -0,0 +1,269 @@
+"""Vectorized grading of many quiz attempts at once.
+
+``CompiledQuiz.grade`` scores one attempt question by question. Regrading a
+quiz after its answer key changed means doing that for every attempt, so
+``grade_batch`` instead lays the choice answers of the quiz out as columns
+and the attempts as rows of a boolean selection matrix; per-question counts
+of selected / correctly selected answers and the earned points are then
+matrix products against the answer→question incidence matrix. Only text
+questions (compared as normalized strings) are scored per attempt.
+
+The rules are exactly those of ``CompiledQuestion.score``.
+
+``regrade_quiz`` streams the attempts of a quiz that already have a
+``UserQuizResult`` and rewrites those results chunk by chunk with one
+``UPDATE … FROM unnest(…)`` per chunk.
+
+Needs the optional ``numpy`` dependency (``pip install shared-models[grading]``).
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import ARRAY, JSON, Boolean, Float, Integer, Text, bindparam, cast, column, func, select, update
+from sqlalchemy.orm import Session
+
+from shared_models.quiz_cache import CompiledQuiz, QuizCache
+from shared_models.quiz_model import QuestionType, QuizProgress, QuizResultPayload, UserQuizResult
+from shared_models.quiz_stats import rebuild_quiz_stats
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+REGRADE_CHUNK_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class AnswerKeyArrays:
+    """Choice answers of a ``CompiledQuiz`` flattened into arrays (``A`` answers, ``Q`` questions)."""
+
+    columns: Dict[Tuple[int, str], int]
+    incidence: "np.ndarray"  # (A, Q) float64 (BLAS matmul; counts stay exact), answer column → its question
+    is_correct: "np.ndarray"  # (A,) bool
+    points: "np.ndarray"  # (A,) int64
+    correct_total: "np.ndarray"  # (Q,) number of correct answers per question
+    single: "np.ndarray"  # (Q,) bool, SINGLE_CHOICE
+    choice: "np.ndarray"  # (Q,) bool, single or multiple choice
+
+
+def answer_key_arrays(quiz: CompiledQuiz) -> AnswerKeyArrays:
+    _require_numpy()
+    columns: Dict[Tuple[int, str], int] = {}
+    owners: List[int] = []
+    for position, question in enumerate(quiz.questions):
+        if question.is_choice:
+            for answer_id in question.answer_ids:
+                columns[(position, answer_id)] = len(owners)
+                owners.append(position)
+    incidence = np.zeros((len(owners), len(quiz.questions)), dtype=np.float64)
+    incidence[np.arange(len(owners)), owners] = 1
+    is_correct = np.zeros(len(owners), dtype=bool)
+    points = np.zeros(len(owners), dtype=np.int64)
+    for (position, answer_id), col in columns.items():
+        question = quiz.questions[position]
+        is_correct[col] = answer_id in question.correct_ids
+        points[col] = question.answer_points[answer_id]
+    return AnswerKeyArrays(
+        columns=columns,
+        incidence=incidence,
+        is_correct=is_correct,
+        points=points,
+        correct_total=(is_correct @ incidence).astype(np.int64),
+        single=np.array([q.schema.type == QuestionType.SINGLE_CHOICE for q in quiz.questions], dtype=bool),
+        choice=np.array([q.is_choice for q in quiz.questions], dtype=bool),
+    )
+
+
+@dataclass
+class GradedBatch:
+    """Scores of ``N`` attempts: per-question ``is_correct`` and ``points`` of shape ``(N, Q)``."""
+
+    quiz: CompiledQuiz
+    responses: Sequence[Dict[str, Any]]
+    is_correct: "np.ndarray"
+    points: "np.ndarray"
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    @property
+    def correct_answers(self) -> "np.ndarray":
+        return self.is_correct.sum(axis=1)
+
+    @property
+    def earned_points(self) -> "np.ndarray":
+        return self.points.sum(axis=1)
+
+    @property
+    def percentage(self) -> "np.ndarray":
+        total = self.quiz.total_points
+        if not total:
+            return np.zeros(len(self), dtype=float)
+        return np.round(self.earned_points * 100.0 / total, 2)
+
+    @property
+    def passed(self) -> "np.ndarray":
+        return self.percentage >= self.quiz.passing_score
+
+    def payload(self, index: int) -> QuizResultPayload:
+        return self.payloads(index, index + 1)[0]
+
+    def payloads(self, start: int = 0, stop: Optional[int] = None) -> List[QuizResultPayload]:
+        """``QuizResultPayload`` per attempt, same shape as ``CompiledQuiz.grade``."""
+        return [QuizResultPayload.model_construct(**data) for data in self.payload_dicts(start, stop)]
+
+    def payload_dicts(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The payloads as plain dicts, ready for ``json.dumps`` without a pydantic round-trip."""
+        stop = len(self) if stop is None else stop
+        ids = [question.id for question in self.quiz.questions]
+        total = self.quiz.total_points
+        correct_answers = self.correct_answers[start:stop].tolist()
+        earned = self.earned_points[start:stop].tolist()
+        percentage = self.percentage[start:stop].tolist()
+        flags = self.is_correct[start:stop].tolist()
+        points = self.points[start:stop].tolist()
+        return [
+            {
+                "quiz_id": self.quiz.quiz_id,
+                "total_questions": len(ids),
+                "correct_answers": correct_answers[offset],
+                "total_points": total,
+                "earned_points": earned[offset],
+                "percentage": percentage[offset],
+                "answers": {
+                    question_id: {"response": response.get(question_id), "is_correct": ok, "points": pts}
+                    for question_id, ok, pts in zip(ids, flags[offset], points[offset])
+                },
+            }
+            for offset, response in enumerate(self.responses[start:stop])
+        ]
+
+
+def grade_batch(
+    quiz: CompiledQuiz,
+    responses: Sequence[Dict[str, Any]],
+    key: Optional[AnswerKeyArrays] = None,
+) -> GradedBatch:
+    """Score many ``{question_id: response}`` mappings against ``quiz`` at once."""
+    key = key or answer_key_arrays(quiz)
+    n, q = len(responses), len(quiz.questions)
+    # Collect coordinates in flat lists and scatter them into the matrices once.
+    rows: List[int] = []
+    cols: List[int] = []
+    unknown_at: List[Tuple[int, int]] = []
+    text_correct = np.zeros((n, q), dtype=bool)
+    plan = [
+        (position, question, {answer_id: col for (owner, answer_id), col in key.columns.items() if owner == position})
+        for position, question in enumerate(quiz.questions)
+    ]
+    for row, answers in enumerate(responses):
+        for position, question, columns in plan:
+            response = answers.get(question.id)
+            if response is None:
+                continue
+            if not question.is_choice:
+                text_correct[row, position] = question.score(response)[0]
+                continue
+            for answer_id in response if isinstance(response, (list, tuple)) else (response,):
+                col = columns.get(answer_id if isinstance(answer_id, str) else str(answer_id))
+                if col is None:
+                    unknown_at.append((row, position))
+                else:
+                    rows.append(row)
+                    cols.append(col)
+    selected = np.zeros((n, len(key.is_correct)), dtype=bool)
+    selected[rows, cols] = True
+    unknown = np.zeros((n, q), dtype=np.int64)
+    if unknown_at:
+        np.add.at(unknown, tuple(np.array(unknown_at).T), 1)
+
+    chosen = selected.astype(np.float64)
+    n_selected = (chosen @ key.incidence).astype(np.int64)
+    n_correct = ((chosen * key.is_correct) @ key.incidence).astype(np.int64)
+    chosen_points = ((chosen * key.points) @ key.incidence).astype(np.int64)
+    clean = unknown == 0
+    single_ok = (n_selected == 1) & (n_correct == 1) & clean
+    multiple_ok = (n_selected > 0) & (n_selected == n_correct) & (n_correct == key.correct_total) & clean
+    is_correct = np.where(key.choice, np.where(key.single, single_ok, multiple_ok), text_correct)
+    text_points = np.array([question.max_points for question in quiz.questions], dtype=np.int64)
+    points = np.where(is_correct, np.where(key.choice, chosen_points, text_points), 0)
+    return GradedBatch(quiz=quiz, responses=responses, is_correct=is_correct, points=points)
+
+
+def regrade_quiz(
+    db: Session,
+    quiz_id: int,
+    *,
+    cache: Optional[QuizCache] = None,
+    chunk_size: int = REGRADE_CHUNK_SIZE,
+) -> int:
+    """Recompute every ``UserQuizResult`` of ``quiz_id`` that has an attempt; returns rows updated.
+
+    Results are graded against the quiz's current payload from the attempt's
+    ``QuizProgress.answers``; the quiz statistics are rebuilt afterwards. The
+    caller commits.
+    """
+    quiz = (cache or QuizCache(maxsize=1)).load(db, quiz_id)
+    if quiz is None:
+        return 0
+    key = answer_key_arrays(quiz)
+    uqr = UserQuizResult.__table__
+    qp = QuizProgress.__table__
+    rows = db.execute(
+        select(uqr.c.id, qp.c.answers)
+        .join(qp, qp.c.id == uqr.c.attempt_id)
+        .where(uqr.c.quiz_id == quiz_id)
+        .order_by(uqr.c.id),
+        execution_options={"yield_per": chunk_size},
+    )
+    updated = 0
+    for chunk in rows.partitions():
+        result_ids = [row.id for row in chunk]
+        graded = grade_batch(quiz, [(row.answers or {}).get("answers") or {} for row in chunk], key)
+        updated += _write_results(db, result_ids, graded)
+    if updated:
+        rebuild_quiz_stats(db, quiz_id)
+    return updated
+
+
+def _write_results(db: Session, result_ids: List[int], graded: GradedBatch) -> int:
+    uqr = UserQuizResult.__table__
+    names = ("id", "correct_answers", "earned_points", "percentage", "passed", "result_payload")
+    types = (Integer, Integer, Integer, Float, Boolean, Text)
+    new = (
+        func.unnest(*(bindparam(f"new_{name}", type_=ARRAY(type_)) for name, type_ in zip(names, types)))
+        .table_valued(*(column(name, type_) for name, type_ in zip(names, types)))
+        .render_derived(name="new")
+    )
+    stmt = (
+        update(uqr)
+        .where(uqr.c.id == new.c.id)
+        .values(
+            total_questions=len(graded.quiz.questions),
+            correct_answers=new.c.correct_answers,
+            total_points=graded.quiz.total_points,
+            earned_points=new.c.earned_points,
+            percentage=new.c.percentage,
+            passed=new.c.passed,
+            result_payload=cast(new.c.result_payload, JSON),
+        )
+    )
+    values = {
+        "new_id": result_ids,
+        "new_correct_answers": graded.correct_answers.tolist(),
+        "new_earned_points": graded.earned_points.tolist(),
+        "new_percentage": graded.percentage.tolist(),
+        "new_passed": graded.passed.tolist(),
+        "new_result_payload": [json.dumps(payload) for payload in graded.payload_dicts()],
+    }
+    return db.execute(stmt, values).rowcount
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("Batch grading requires numpy: pip install shared-models[grading]")
@@ -3,22 +3,28 @@
 from __future__ import annotations
 
 import enum
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 from sqlalchemy import (
+    ARRAY,
     Boolean,
     DateTime,
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     String,
     Text,
+    UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false, func, text
 
 from shared_models.models import Base
 
@@ -67,6 +73,19 @@ class QuizAccessType(str, enum.Enum):
     PRIVATE = "private"
 
 
+class QuizAccessReason(str, enum.Enum):
+    """Why a quiz start was allowed or refused (see ``quiz_access``)."""
+
+    ALLOWED = "allowed"
+    RESUME = "resume"
+    NOT_FOUND = "not_found"
+    NOT_PUBLISHED = "not_published"
+    LOGIN_REQUIRED = "login_required"
+    PRIVATE = "private"
+    PAYMENT_REQUIRED = "payment_required"
+    ATTEMPTS_EXHAUSTED = "attempts_exhausted"
+
+
 class AttemptStatus(str, enum.Enum):
     """Lifecycle of a user's quiz attempt."""
 
@@ -75,6 +94,74 @@ class AttemptStatus(str, enum.Enum):
     ABANDONED = "abandoned"
 
 
+class _TrackedDict(dict):
+    """Nested dict that reports in-place changes to its ``NestedMutableDict`` root."""
+
+    def __init__(self, data: Dict[str, Any], root: "NestedMutableDict"):
+        super().__init__(data)
+        self._root = root
+
+    def __getitem__(self, key):
+        return self._root._track(self, key, dict.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._root.changed()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._root.changed()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._root.changed()
+
+    def pop(self, *args):
+        value = dict.pop(self, *args)
+        self._root.changed()
+        return value
+
+    def clear(self):
+        dict.clear(self)
+        self._root.changed()
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class NestedMutableDict(MutableDict):
+    """``MutableDict`` that also flags changes made inside nested dicts.
+
+    ``progress.answers["answers"][question_id] = ...`` marks the column dirty,
+    which a plain ``MutableDict`` (top-level keys only) would miss.
+    """
+
+    def __getitem__(self, key):
+        return self._track(self, key, dict.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def _track(self, container: dict, key, value):
+        if isinstance(value, dict) and not isinstance(value, _TrackedDict):
+            value = _TrackedDict(value, self)
+            dict.__setitem__(container, key, value)
+        return value
+
+
 class AnswerSchema(BaseModel):
     """Schema representing a single answer option."""
 
@@ -125,6 +212,79 @@ class QuizResultPayload(BaseModel):
     answers: Dict[str, Any]
 
 
+class QuestionStats(BaseModel):
+    """Correctness rate of one question across all results."""
+
+    question_id: str
+    answered: int
+    correct: int
+    correct_rate: float
+
+
+class QuizStatsSummary(BaseModel):
+    """Dashboard view of ``QuizStatistics``."""
+
+    quiz_id: int
+    attempt_count: int = 0
+    pass_count: int = 0
+    pass_rate: float = 0.0
+    average_percentage: float = 0.0
+    best_percentage: float = 0.0
+    score_histogram: List[int] = Field(default_factory=list)
+    questions: List[QuestionStats] = Field(default_factory=list)
+
+
+class LeaderboardEntry(BaseModel):
+    """Best result of one user on a quiz."""
+
+    rank: int
+    user_id: int
+    result_id: int
+    percentage: float
+    earned_points: int
+    time_spent_seconds: Optional[int] = None
+    created_at: datetime
+
+
+class QuizAccessDecision(BaseModel):
+    """Outcome of the access check done before starting a quiz."""
+
+    quiz_id: int
+    allowed: bool
+    reason: QuizAccessReason
+    resume_attempt_id: Optional[int] = None
+    attempts_used: int = 0
+    attempts_left: Optional[int] = None
+    subscription_required: bool = False
+
+
+class QuizBundleExportResult(BaseModel):
+    """What ``quiz_bundle.export_bundle`` wrote."""
+
+    quizzes: int = 0
+    courses: int = 0
+    items: int = 0
+
+
+class QuizBundleImportResult(BaseModel):
+    """Ids assigned by ``quiz_bundle.import_bundle``, keyed by the ids in the bundle."""
+
+    quiz_ids: Dict[int, int] = Field(default_factory=dict)
+    course_ids: Dict[int, int] = Field(default_factory=dict)
+    renamed_slugs: Dict[str, str] = Field(default_factory=dict)
+
+
+class CourseProgressUpdate(BaseModel):
+    """New state of a ``CourseProgress`` after one of its items was completed."""
+
+    progress_id: int
+    course_id: int
+    new_item_ids: List[int] = Field(default_factory=list)
+    completion_percentage: float
+    current_item_id: Optional[int] = None
+    is_completed: bool
+
+
 class Quiz(Base):
     """Quiz entity describing a standalone assessment."""
 
@@ -150,6 +310,13 @@ class Quiz(Base):
     payload: Mapped[Dict[str, Any]] = mapped_column(
         "questions", JSON, default=lambda: {"questions": []}
     )
+    questions_normalized: Mapped[bool] = mapped_column(
+        Boolean,
+        default=False,
+        server_default=false(),
+        nullable=False,
+        comment="Questions are stored in quiz_questions / quiz_answers, payload is only a snapshot",
+    )
     created_at: Mapped[str] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -174,6 +341,64 @@ class Quiz(Base):
     )
 
 
+class QuizQuestion(Base):
+    """Normalized copy of one ``QuestionSchema`` of a quiz.
+
+    Optional storage for large question banks: once ``Quiz.questions_normalized``
+    is set the rows here are authoritative, even when there are none left, and
+    ``Quiz.payload`` is only a snapshot (see ``shared_models.quiz_storage``).
+    """
+
+    __tablename__ = "quiz_questions"
+    __table_args__ = (
+        UniqueConstraint("quiz_id", "question_key", name="uq_quiz_questions_quiz_key"),
+        Index("ix_quiz_questions_quiz_position", "quiz_id", "position"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    quiz_id: Mapped[int] = mapped_column(ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False)
+    question_key: Mapped[str] = mapped_column(String(64), nullable=False, comment="QuestionSchema.id")
+    position: Mapped[int] = mapped_column(Integer, nullable=False)
+    type: Mapped[QuestionType] = mapped_column(Enum(QuestionType), default=QuestionType.SINGLE_CHOICE)
+    title: Mapped[Optional[str]] = mapped_column(String(255))
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    description: Mapped[Optional[str]] = mapped_column(Text)
+    image_url: Mapped[Optional[str]] = mapped_column(String(1024))
+    formula_template: Mapped[Optional[str]] = mapped_column(Text)
+    points: Mapped[int] = mapped_column(Integer, default=1)
+    time_limit_seconds: Mapped[Optional[int]] = mapped_column(Integer)
+    shuffle_answers: Mapped[bool] = mapped_column(Boolean, default=True)
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    answers = relationship(
+        "QuizAnswer",
+        back_populates="question",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="QuizAnswer.position",
+    )
+
+
+class QuizAnswer(Base):
+    """Normalized copy of one ``AnswerSchema`` of a ``QuizQuestion``."""
+
+    __tablename__ = "quiz_answers"
+    __table_args__ = (Index("ix_quiz_answers_question_position", "question_id", "position"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    question_id: Mapped[int] = mapped_column(ForeignKey("quiz_questions.id", ondelete="CASCADE"), nullable=False)
+    position: Mapped[int] = mapped_column(Integer, nullable=False)
+    answer_key: Mapped[Optional[str]] = mapped_column(String(64), comment="AnswerSchema.id")
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    is_correct: Mapped[bool] = mapped_column(Boolean, default=False)
+    explanation: Mapped[Optional[str]] = mapped_column(Text)
+    points: Mapped[int] = mapped_column(Integer, default=1)
+
+    question = relationship("QuizQuestion", back_populates="answers")
+
+
 class UserQuizResult(Base):
     """Finalized quiz attempt result."""
 
@@ -199,10 +424,61 @@ class UserQuizResult(Base):
     user = relationship("User")
 
 
+# Leaderboard order: best percentage first, earliest result first among ties.
+# The other columns ``quiz_stats.leaderboard`` reads are included, so it can
+# be answered with an index-only scan.
+Index(
+    "ix_user_quiz_results_leaderboard",
+    UserQuizResult.quiz_id,
+    UserQuizResult.percentage.desc(),
+    UserQuizResult.created_at,
+    UserQuizResult.id,
+    postgresql_include=["user_id", "earned_points", "time_spent_seconds"],
+)
+
+
+class QuizStatistics(Base):
+    """Per-quiz aggregates of ``UserQuizResult``, maintained on insert.
+
+    See ``shared_models.quiz_stats``; dashboards read this row instead of
+    scanning the quiz's result history.
+    """
+
+    __tablename__ = "quiz_statistics"
+
+    quiz_id: Mapped[int] = mapped_column(ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True)
+    attempt_count: Mapped[int] = mapped_column(Integer, default=0)
+    pass_count: Mapped[int] = mapped_column(Integer, default=0)
+    percentage_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    best_percentage: Mapped[float] = mapped_column(Float, default=0.0)
+    score_histogram: Mapped[List[int]] = mapped_column(
+        ARRAY(Integer), comment="Result counts per 10-point percentage bucket (90-100 in the last one)"
+    )
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class QuizQuestionStatistics(Base):
+    """How many results graded each question of a quiz, and how many of them as correct."""
+
+    __tablename__ = "quiz_question_statistics"
+
+    quiz_id: Mapped[int] = mapped_column(ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True)
+    question_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    answered_count: Mapped[int] = mapped_column(Integer, default=0)
+    correct_count: Mapped[int] = mapped_column(Integer, default=0)
+
+
 class QuizProgress(Base):
     """Represents an in-progress or completed attempt."""
 
     __tablename__ = "quiz_progress"
+    __table_args__ = (
+        Index("ix_quiz_progress_user_quiz", "user_id", "quiz_id"),
+        # Candidates of quiz_sweeper; only live attempts are indexed.
+        Index("ix_quiz_progress_in_progress", "updated_at", postgresql_where=text("status = 'IN_PROGRESS'")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -218,7 +494,11 @@ class QuizProgress(Base):
     )
     completed_at: Mapped[Optional[str]] = mapped_column(DateTime(timezone=True))
     current_index: Mapped[int] = mapped_column(Integer, default=0)
-    answers: Mapped[Dict[str, Any]] = mapped_column(JSON, default=lambda: {"answers": {}})
+    answers: Mapped[Dict[str, Any]] = mapped_column(
+        NestedMutableDict.as_mutable(JSONB),
+        default=lambda: {"answers": {}},
+        comment="{'answers': {question_id: response}}; single answers are written with quiz_progress.record_answer",
+    )
     score: Mapped[Optional[float]] = mapped_column(Float)
     show_explanations: Mapped[bool] = mapped_column(Boolean, default=False)
 
@@ -258,6 +538,10 @@ class QuizCourseItem(Base):
     """Ordering metadata for quizzes inside a course."""
 
     __tablename__ = "quiz_course_items"
+    __table_args__ = (
+        Index("ix_quiz_course_items_course_order", "course_id", "order_index", "id"),
+        Index("ix_quiz_course_items_quiz_id", "quiz_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     course_id: Mapped[int] = mapped_column(ForeignKey("quiz_courses.id"))
@@ -273,6 +557,7 @@ class CourseProgress(Base):
     """Tracks user progress throughout a quiz course."""
 
     __tablename__ = "quiz_course_progress"
+    __table_args__ = (Index("ix_quiz_course_progress_user_course", "user_id", "course_id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -287,7 +572,33 @@ class CourseProgress(Base):
     current_item_id: Mapped[Optional[int]] = mapped_column(ForeignKey("quiz_course_items.id"))
     is_completed: Mapped[bool] = mapped_column(Boolean, default=False)
     completion_percentage: Mapped[float] = mapped_column(Float, default=0.0)
+    completed_required_count: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        server_default="0",
+        comment="Completed items that count towards completion_percentage (see course_progress)",
+    )
 
     user = relationship("User")
     course = relationship("QuizCourse", back_populates="progress_entries")
     current_item = relationship("QuizCourseItem")
+    completions = relationship(
+        "QuizCourseItemCompletion", back_populates="progress", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+
+class QuizCourseItemCompletion(Base):
+    """One completed course item of a ``CourseProgress``; replaces scanning ``completed_item_ids``."""
+
+    __tablename__ = "quiz_course_item_completions"
+
+    progress_id: Mapped[int] = mapped_column(
+        ForeignKey("quiz_course_progress.id", ondelete="CASCADE"), primary_key=True
+    )
+    item_id: Mapped[int] = mapped_column(ForeignKey("quiz_course_items.id", ondelete="CASCADE"), primary_key=True)
+    result_id: Mapped[Optional[int]] = mapped_column(ForeignKey("user_quiz_results.id", ondelete="SET NULL"))
+    completed_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    progress = relationship("CourseProgress", back_populates="completions")
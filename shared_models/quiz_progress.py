@@ -0,0 +1,63 @@
+"""Single-answer writes to ``QuizProgress.answers`` (JSONB).
+
+Assigning a new dict to ``QuizProgress.answers`` (or mutating it through
+the ORM) sends the whole document on every answered question. During an
+exam that is one growing blob per keystroke-level event per student.
+``record_answer`` instead ships only the question id and its response and
+lets PostgreSQL merge it in place:
+
+    UPDATE quiz_progress
+       SET answers = jsonb_set(answers, '{answers}', (answers -> 'answers') || {question_id: response}),
+           current_index = …, updated_at = now()
+     WHERE id = … AND status = 'IN_PROGRESS'
+    RETURNING current_index
+
+``current_index`` is bumped in the same statement — by one for a question
+answered for the first time, or set explicitly with ``next_index`` — so
+concurrent requests of the same attempt (double submits, several tabs)
+never lose each other's answers.
+
+The statement bypasses the ORM: an already loaded ``QuizProgress`` in the
+same session keeps its old ``answers`` until it is refreshed.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from sqlalchemy import case, cast, func, literal, update
+from sqlalchemy.dialects.postgresql import JSONB, array
+from sqlalchemy.orm import Session
+
+from shared_models.quiz_model import AttemptStatus, QuizProgress
+
+
+def record_answer(
+    db: Session,
+    progress_id: int,
+    question_id: str,
+    response: Any,
+    *,
+    next_index: Optional[int] = None,
+) -> Optional[int]:
+    """Store one response of an in-progress attempt; returns the new ``current_index``.
+
+    Returns None when the attempt does not exist or is no longer in
+    progress. The caller commits.
+    """
+    qp = QuizProgress.__table__
+    answers = func.coalesce(qp.c.answers, cast(literal("{}"), JSONB))
+    previous = func.coalesce(answers["answers"], cast(literal("{}"), JSONB))
+    entry = func.jsonb_build_object(literal(question_id), cast(literal(response, JSONB), JSONB))
+    if next_index is None:
+        next_index = qp.c.current_index + case((previous.has_key(question_id), 0), else_=1)
+    return db.execute(
+        update(qp)
+        .where(qp.c.id == progress_id, qp.c.status == AttemptStatus.IN_PROGRESS)
+        .values(
+            answers=func.jsonb_set(answers, array([literal("answers")]), previous.op("||")(entry)),
+            current_index=next_index,
+            updated_at=func.now(),
+        )
+        .returning(qp.c.current_index)
+    ).scalar_one_or_none()
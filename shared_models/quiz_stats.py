@@ -0,0 +1,263 @@
+"""Incrementally maintained quiz statistics and the quiz leaderboard.
+
+``quiz_statistics`` keeps, per quiz, the attempt and pass counts, the sum and
+best of ``percentage`` and a 10-bucket score histogram;
+``quiz_question_statistics`` keeps answered/correct counts per question
+(from the ``is_correct`` flags of ``UserQuizResult.result_payload``).
+
+``record_results`` folds new results into both tables with one upsert each
+(``ON CONFLICT … DO UPDATE SET count = count + excluded.count``); it runs
+automatically for every ``UserQuizResult`` inserted through the ORM. Rows
+written with Core inserts must be passed to it explicitly, and
+``rebuild_quiz_stats`` recomputes a quiz from scratch after results were
+changed in place (``regrade_quiz`` calls it).
+
+``leaderboard`` walks ``ix_user_quiz_results_leaderboard`` (``quiz_id,
+percentage DESC, created_at, id``) in pages and keeps each user's best result,
+so it reads about ``limit`` index entries instead of the quiz's history.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from sqlalchemy import Integer, and_, cast, delete, event, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from shared_models.quiz_model import (
+    LeaderboardEntry,
+    QuestionStats,
+    QuizQuestionStatistics,
+    QuizStatistics,
+    QuizStatsSummary,
+    UserQuizResult,
+)
+
+HISTOGRAM_BUCKETS = 10
+LEADERBOARD_SIZE = 10
+
+ResultLike = Union[UserQuizResult, Mapping[str, Any]]
+
+
+def score_bucket(percentage: float) -> int:
+    """Histogram bucket of a percentage: 0 for [0, 10), …, 9 for [90, 100]."""
+    return min(max(int((percentage or 0) // (100 / HISTOGRAM_BUCKETS)), 0), HISTOGRAM_BUCKETS - 1)
+
+
+def record_results(db: Union[Session, Connection], results: Iterable[ResultLike]) -> int:
+    """Add new results to the statistics tables; returns how many were counted.
+
+    Accepts ``UserQuizResult`` objects or mappings with the same keys.
+    """
+    quizzes: Dict[int, Dict[str, Any]] = {}
+    questions: Dict[Tuple[int, str], List[int]] = defaultdict(lambda: [0, 0])
+    counted = 0
+    for result in results:
+        get = result.get if isinstance(result, Mapping) else lambda name: getattr(result, name, None)
+        quiz_id, percentage = get("quiz_id"), float(get("percentage") or 0)
+        stats = quizzes.setdefault(
+            quiz_id,
+            {"attempts": 0, "passes": 0, "total": 0.0, "best": 0.0, "histogram": [0] * HISTOGRAM_BUCKETS},
+        )
+        stats["attempts"] += 1
+        stats["passes"] += bool(get("passed"))
+        stats["total"] += percentage
+        stats["best"] = max(stats["best"], percentage)
+        stats["histogram"][score_bucket(percentage)] += 1
+        for question_key, answer in ((get("result_payload") or {}).get("answers") or {}).items():
+            if isinstance(answer, Mapping) and "is_correct" in answer:
+                counts = questions[(quiz_id, str(question_key))]
+                counts[0] += 1
+                counts[1] += bool(answer["is_correct"])
+        counted += 1
+    if not quizzes:
+        return 0
+
+    qs = QuizStatistics.__table__
+    stmt = pg_insert(qs)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[qs.c.quiz_id],
+            set_={
+                "attempt_count": qs.c.attempt_count + stmt.excluded.attempt_count,
+                "pass_count": qs.c.pass_count + stmt.excluded.pass_count,
+                "percentage_sum": qs.c.percentage_sum + stmt.excluded.percentage_sum,
+                "best_percentage": func.greatest(qs.c.best_percentage, stmt.excluded.best_percentage),
+                "score_histogram": array(
+                    [
+                        func.coalesce(qs.c.score_histogram[i], 0) + stmt.excluded.score_histogram[i]
+                        for i in range(1, HISTOGRAM_BUCKETS + 1)
+                    ]
+                ),
+                "updated_at": func.now(),
+            },
+        ),
+        [
+            {
+                "quiz_id": quiz_id,
+                "attempt_count": stats["attempts"],
+                "pass_count": stats["passes"],
+                "percentage_sum": stats["total"],
+                "best_percentage": stats["best"],
+                "score_histogram": stats["histogram"],
+            }
+            # Sorted, so concurrent batches lock the statistics rows in the same order.
+            for quiz_id, stats in sorted(quizzes.items())
+        ],
+    )
+    if questions:
+        qqs = QuizQuestionStatistics.__table__
+        stmt = pg_insert(qqs)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[qqs.c.quiz_id, qqs.c.question_key],
+                set_={
+                    "answered_count": qqs.c.answered_count + stmt.excluded.answered_count,
+                    "correct_count": qqs.c.correct_count + stmt.excluded.correct_count,
+                },
+            ),
+            [
+                {"quiz_id": quiz_id, "question_key": key, "answered_count": answered, "correct_count": correct}
+                for (quiz_id, key), (answered, correct) in sorted(questions.items())
+            ],
+        )
+    return counted
+
+
+def rebuild_quiz_stats(db: Session, quiz_id: int) -> None:
+    """Recompute both statistics tables of ``quiz_id`` from ``user_quiz_results``."""
+    qs = QuizStatistics.__table__
+    qqs = QuizQuestionStatistics.__table__
+    uqr = UserQuizResult.__table__
+    db.execute(delete(qqs).where(qqs.c.quiz_id == quiz_id))
+    db.execute(delete(qs).where(qs.c.quiz_id == quiz_id))
+
+    bucket = func.least(cast(func.floor(func.coalesce(uqr.c.percentage, 0) / (100 / HISTOGRAM_BUCKETS)), Integer), 9)
+    db.execute(
+        pg_insert(qs).from_select(
+            ["quiz_id", "attempt_count", "pass_count", "percentage_sum", "best_percentage", "score_histogram"],
+            select(
+                literal(quiz_id),
+                func.count(),
+                func.count().filter(uqr.c.passed.is_(True)),
+                func.coalesce(func.sum(uqr.c.percentage), 0.0),
+                func.coalesce(func.max(uqr.c.percentage), 0.0),
+                array([func.count().filter(bucket == i) for i in range(HISTOGRAM_BUCKETS)]),
+            )
+            .where(uqr.c.quiz_id == quiz_id)
+            .having(func.count() > 0),
+        )
+    )
+    answers = func.json_each(uqr.c.result_payload["answers"]).table_valued("key", "value").render_derived("answer")
+    is_correct = answers.c.value.op("->>")("is_correct")
+    db.execute(
+        pg_insert(qqs).from_select(
+            ["quiz_id", "question_key", "answered_count", "correct_count"],
+            select(literal(quiz_id), answers.c.key, func.count(), func.count().filter(is_correct == "true"))
+            .select_from(uqr.join(answers, literal(True)))
+            .where(
+                uqr.c.quiz_id == quiz_id,
+                func.json_typeof(uqr.c.result_payload["answers"]) == "object",
+                is_correct.isnot(None),
+            )
+            .group_by(answers.c.key),
+        )
+    )
+
+
+def quiz_stats(db: Session, quiz_id: int) -> QuizStatsSummary:
+    """Statistics of ``quiz_id``: two primary-key lookups, no result scan."""
+    row = db.get(QuizStatistics, quiz_id)
+    if row is None:
+        return QuizStatsSummary(quiz_id=quiz_id, score_histogram=[0] * HISTOGRAM_BUCKETS)
+    qqs = QuizQuestionStatistics.__table__
+    questions = db.execute(select(qqs).where(qqs.c.quiz_id == quiz_id).order_by(qqs.c.question_key)).all()
+    attempts = row.attempt_count or 0
+    return QuizStatsSummary(
+        quiz_id=quiz_id,
+        attempt_count=attempts,
+        pass_count=row.pass_count,
+        pass_rate=round(row.pass_count * 100.0 / attempts, 2) if attempts else 0.0,
+        average_percentage=round(row.percentage_sum / attempts, 2) if attempts else 0.0,
+        best_percentage=row.best_percentage,
+        score_histogram=list(row.score_histogram or [0] * HISTOGRAM_BUCKETS),
+        questions=[
+            QuestionStats(
+                question_id=q.question_key,
+                answered=q.answered_count,
+                correct=q.correct_count,
+                correct_rate=round(q.correct_count * 100.0 / q.answered_count, 2) if q.answered_count else 0.0,
+            )
+            for q in questions
+        ],
+    )
+
+
+def leaderboard(db: Session, quiz_id: int, *, limit: int = LEADERBOARD_SIZE) -> List[LeaderboardEntry]:
+    """Top ``limit`` users of a quiz by their best result (earliest wins ties)."""
+    uqr = UserQuizResult.__table__
+    entries: List[LeaderboardEntry] = []
+    seen = set()
+    after: Optional[Tuple[float, datetime, int]] = None
+    page_size = max(limit * 2, 20)
+    while len(entries) < limit:
+        stmt = (
+            select(
+                uqr.c.id,
+                uqr.c.user_id,
+                uqr.c.percentage,
+                uqr.c.earned_points,
+                uqr.c.time_spent_seconds,
+                uqr.c.created_at,
+            )
+            .where(uqr.c.quiz_id == quiz_id, uqr.c.percentage.isnot(None))
+            .order_by(uqr.c.percentage.desc(), uqr.c.created_at, uqr.c.id)
+            .limit(page_size)
+        )
+        if after is not None:
+            percentage, created_at, result_id = after
+            stmt = stmt.where(
+                or_(
+                    uqr.c.percentage < percentage,
+                    and_(
+                        uqr.c.percentage == percentage,
+                        or_(
+                            uqr.c.created_at > created_at,
+                            and_(uqr.c.created_at == created_at, uqr.c.id > result_id),
+                        ),
+                    ),
+                )
+            )
+        rows = db.execute(stmt).all()
+        for row in rows:
+            if row.user_id in seen:
+                continue
+            seen.add(row.user_id)
+            entries.append(
+                LeaderboardEntry(
+                    rank=len(entries) + 1,
+                    user_id=row.user_id,
+                    result_id=row.id,
+                    percentage=row.percentage,
+                    earned_points=row.earned_points or 0,
+                    time_spent_seconds=row.time_spent_seconds,
+                    created_at=row.created_at,
+                )
+            )
+            if len(entries) == limit:
+                break
+        if len(rows) < page_size:
+            break
+        after = (rows[-1].percentage, rows[-1].created_at, rows[-1].id)
+        page_size *= 2
+    return entries
+
+
+@event.listens_for(UserQuizResult, "after_insert")
+def _count_inserted_result(mapper, connection: Connection, target: UserQuizResult) -> None:
+    record_results(connection, [target])
@@ -0,0 +1,202 @@
+"""Normalized storage of quiz questions (``quiz_questions`` / ``quiz_answers``).
+
+By default a quiz keeps all its questions in the ``Quiz.payload`` JSON
+document. For large question banks the same data can be stored one row per
+question and per answer:
+
+* ``store_payload`` writes a whole ``QuizPayload`` into the tables (upsert by
+  ``(quiz_id, question_key)``, removing questions that are gone);
+* ``update_question`` / ``delete_question`` change a single question without
+  touching the others;
+* ``load_questions`` reads a page of questions in ``position`` order through
+  ``ix_quiz_questions_quiz_position``, ``load_quiz_payload`` the whole quiz.
+
+Every write sets ``Quiz.questions_normalized``: from then on the rows here are
+authoritative, also when the last question was deleted, and
+``load_quiz_payload`` (and ``QuizCache``) no longer read ``Quiz.payload``.
+Every write also bumps ``Quiz.updated_at`` so cached compiled quizzes are not
+served stale. None of the functions commit.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from shared_models.quiz_model import AnswerSchema, QuestionSchema, Quiz, QuizAnswer, QuizPayload, QuizQuestion
+
+QUESTION_FIELDS = (
+    "title",
+    "text",
+    "type",
+    "description",
+    "image_url",
+    "formula_template",
+    "points",
+    "time_limit_seconds",
+    "shuffle_answers",
+)
+ANSWER_FIELDS = ("text", "is_correct", "explanation", "points")
+
+
+def question_values(quiz_id: int, question: QuestionSchema, position: int) -> Dict[str, Any]:
+    values = {field: getattr(question, field) for field in QUESTION_FIELDS}
+    values.update(quiz_id=quiz_id, question_key=question.id, position=position)
+    return values
+
+
+def answer_values(question_id: int, answers: Sequence[AnswerSchema]) -> List[Dict[str, Any]]:
+    return [
+        dict(
+            {field: getattr(answer, field) for field in ANSWER_FIELDS},
+            question_id=question_id,
+            position=position,
+            answer_key=answer.id,
+        )
+        for position, answer in enumerate(answers)
+    ]
+
+
+def store_payload(db: Session, quiz_id: int, payload: Any) -> int:
+    """Write every question of ``payload`` (dict or ``QuizPayload``); returns how many.
+
+    Questions are matched to existing rows by their id, so unchanged questions
+    keep their row ids; questions missing from ``payload`` are deleted.
+    """
+    payload = payload if isinstance(payload, QuizPayload) else QuizPayload.model_validate(payload or {})
+    qq = QuizQuestion.__table__
+    keys = [question.id for question in payload.questions]
+    if len(set(keys)) != len(keys):
+        raise ValueError(f"Quiz {quiz_id} payload has duplicate question ids")
+    db.execute(delete(qq).where(qq.c.quiz_id == quiz_id, qq.c.question_key.notin_(keys)))
+    if not payload.questions:
+        _touch(db, quiz_id)
+        return 0
+
+    stmt = pg_insert(qq)
+    question_ids = dict(
+        db.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_quiz_questions_quiz_key",
+                set_={name: stmt.excluded[name] for name in (*QUESTION_FIELDS, "position")}
+                | {"updated_at": func.now()},
+            ).returning(qq.c.question_key, qq.c.id),
+            [question_values(quiz_id, question, position) for position, question in enumerate(payload.questions)],
+        ).all()
+    )
+    qa = QuizAnswer.__table__
+    db.execute(delete(qa).where(qa.c.question_id.in_(question_ids.values())))
+    answers = [
+        row for question in payload.questions for row in answer_values(question_ids[question.id], question.answers)
+    ]
+    if answers:
+        db.execute(insert(qa), answers)
+    _touch(db, quiz_id)
+    return len(payload.questions)
+
+
+def update_question(db: Session, quiz_id: int, question: QuestionSchema, *, position: Optional[int] = None) -> int:
+    """Insert or replace one question and its answers; returns the row id.
+
+    ``position`` defaults to the question's current position, or to the end
+    of the quiz for a new question.
+    """
+    qq = QuizQuestion.__table__
+    if position is None:
+        position = db.execute(
+            select(
+                func.coalesce(
+                    select(qq.c.position)
+                    .where(qq.c.quiz_id == quiz_id, qq.c.question_key == question.id)
+                    .scalar_subquery(),
+                    select(func.coalesce(func.max(qq.c.position) + 1, 0))
+                    .where(qq.c.quiz_id == quiz_id)
+                    .scalar_subquery(),
+                )
+            )
+        ).scalar_one()
+    stmt = pg_insert(qq).values(question_values(quiz_id, question, position))
+    question_id = db.execute(
+        stmt.on_conflict_do_update(
+            constraint="uq_quiz_questions_quiz_key",
+            set_={name: stmt.excluded[name] for name in (*QUESTION_FIELDS, "position")} | {"updated_at": func.now()},
+        ).returning(qq.c.id)
+    ).scalar_one()
+    qa = QuizAnswer.__table__
+    db.execute(delete(qa).where(qa.c.question_id == question_id))
+    if question.answers:
+        db.execute(insert(qa), answer_values(question_id, question.answers))
+    _touch(db, quiz_id)
+    return question_id
+
+
+def delete_question(db: Session, quiz_id: int, question_key: str) -> bool:
+    """Delete one question (its answers cascade); False when it did not exist."""
+    qq = QuizQuestion.__table__
+    deleted = db.execute(delete(qq).where(qq.c.quiz_id == quiz_id, qq.c.question_key == question_key)).rowcount
+    if deleted:
+        _touch(db, quiz_id)
+    return bool(deleted)
+
+
+def is_normalized(db: Session, quiz_id: int) -> bool:
+    return bool(db.execute(select(Quiz.questions_normalized).where(Quiz.id == quiz_id)).scalar_one_or_none())
+
+
+def load_questions(
+    db: Session,
+    quiz_id: int,
+    *,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    keys: Optional[Sequence[str]] = None,
+) -> List[QuestionSchema]:
+    """Questions of ``quiz_id`` in ``position`` order; a page of them or only ``keys``.
+
+    Two queries regardless of size: one for the questions, one for their answers.
+    """
+    qq = QuizQuestion.__table__
+    qa = QuizAnswer.__table__
+    stmt = select(qq).where(qq.c.quiz_id == quiz_id).order_by(qq.c.position, qq.c.id).offset(offset).limit(limit)
+    if keys is not None:
+        stmt = stmt.where(qq.c.question_key.in_(keys))
+    questions = db.execute(stmt).all()
+    if not questions:
+        return []
+
+    answers: Dict[int, List[AnswerSchema]] = {row.id: [] for row in questions}
+    for row in db.execute(
+        select(qa).where(qa.c.question_id.in_(answers)).order_by(qa.c.question_id, qa.c.position)
+    ).all():
+        answers[row.question_id].append(
+            AnswerSchema(id=row.answer_key, **{field: getattr(row, field) for field in ANSWER_FIELDS})
+        )
+    return [
+        QuestionSchema(
+            id=row.question_key,
+            answers=answers[row.id],
+            **{field: getattr(row, field) for field in QUESTION_FIELDS},
+        )
+        for row in questions
+    ]
+
+
+def load_quiz_payload(db: Session, quiz_id: int) -> Optional[QuizPayload]:
+    """The quiz's questions from the normalized tables if it uses them, else from ``Quiz.payload``."""
+    row = db.execute(select(Quiz.questions_normalized, Quiz.payload).where(Quiz.id == quiz_id)).first()
+    if row is None:
+        return None
+    if row.questions_normalized:
+        return QuizPayload(questions=load_questions(db, quiz_id))
+    return QuizPayload.model_validate(row.payload or {})
+
+
+def _touch(db: Session, quiz_id: int) -> None:
+    db.execute(
+        update(Quiz.__table__)
+        .where(Quiz.__table__.c.id == quiz_id)
+        .values(updated_at=func.now(), questions_normalized=True)
+    )
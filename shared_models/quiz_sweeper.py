@@ -0,0 +1,113 @@
+"""Sweeper for quiz attempts that were left ``IN_PROGRESS``.
+
+An attempt is abandoned when nothing was answered for ``idle_timeout``, or
+when the quiz has a ``time_limit_minutes`` and that limit (plus ``grace``) has
+passed since ``started_at``. ``sweep_abandoned_attempts`` marks one bounded
+batch of them ``ABANDONED``; candidates come from the partial index
+``ix_quiz_progress_in_progress`` (in-progress rows only, so it stays small
+however many attempts the table holds) and are locked with ``FOR UPDATE SKIP
+LOCKED``, so several workers can sweep at the same time and an answer being
+written concurrently wins over the sweeper.
+
+With ``grade=True`` the answers given so far are graded with the compiled
+quiz and stored as a ``UserQuizResult`` of the attempt, which also updates the
+quiz statistics and course progress like any other result.
+
+Typical worker loop::
+
+    while sweep_abandoned_attempts(db, grade=True):
+        db.commit()
+    db.commit()
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from shared_models.quiz_cache import QuizCache
+from shared_models.quiz_model import AttemptStatus, Quiz, QuizProgress, UserQuizResult
+
+SWEEP_BATCH_SIZE = 500
+IDLE_TIMEOUT = timedelta(hours=2)
+TIME_LIMIT_GRACE = timedelta(minutes=5)
+
+
+def sweep_abandoned_attempts(
+    db: Session,
+    *,
+    limit: int = SWEEP_BATCH_SIZE,
+    idle_timeout: timedelta = IDLE_TIMEOUT,
+    grace: timedelta = TIME_LIMIT_GRACE,
+    grade: bool = False,
+    cache: Optional[QuizCache] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """Mark up to ``limit`` stale attempts ``ABANDONED``; returns how many.
+
+    Call repeatedly, committing in between, until it returns 0.
+    """
+    qp = QuizProgress.__table__
+    quizzes = Quiz.__table__
+    now = now or datetime.now(timezone.utc)
+    time_limit = func.make_interval(0, 0, 0, 0, 0, quizzes.c.time_limit_minutes)
+    stale = db.execute(
+        select(qp.c.id, qp.c.updated_at)
+        .join(quizzes, quizzes.c.id == qp.c.quiz_id)
+        .where(
+            qp.c.status == AttemptStatus.IN_PROGRESS,
+            or_(
+                qp.c.updated_at < now - idle_timeout,
+                qp.c.started_at + time_limit < now - grace,
+            ),
+        )
+        .order_by(qp.c.updated_at)
+        .limit(limit)
+        .with_for_update(of=qp, skip_locked=True)
+    ).all()
+    if not stale:
+        return 0
+
+    abandoned = db.execute(
+        update(qp)
+        .where(qp.c.id.in_([row.id for row in stale]), qp.c.status == AttemptStatus.IN_PROGRESS)
+        .values(status=AttemptStatus.ABANDONED, updated_at=func.now())
+        .returning(qp.c.id, qp.c.user_id, qp.c.quiz_id, qp.c.answers, qp.c.started_at)
+    ).all()
+    if grade:
+        last_activity = {row.id: row.updated_at for row in stale}
+        _grade_partial(db, abandoned, last_activity, cache or QuizCache(maxsize=64))
+    return len(abandoned)
+
+
+def _grade_partial(db: Session, attempts, last_activity: Dict[int, datetime], cache: QuizCache) -> None:
+    results = []
+    for attempt in attempts:
+        answers = (attempt.answers or {}).get("answers") or {}
+        if not answers:
+            continue
+        quiz = cache.load(db, attempt.quiz_id)
+        if quiz is None:
+            continue
+        graded = quiz.grade(answers)
+        results.append(
+            UserQuizResult(
+                user_id=attempt.user_id,
+                quiz_id=attempt.quiz_id,
+                attempt_id=attempt.id,
+                total_questions=graded.total_questions,
+                correct_answers=graded.correct_answers,
+                total_points=graded.total_points,
+                earned_points=graded.earned_points,
+                percentage=graded.percentage,
+                passed=quiz.passed(graded),
+                time_spent_seconds=int((last_activity[attempt.id] - attempt.started_at).total_seconds()),
+                result_payload=graded.model_dump(mode="json"),
+            )
+        )
+    if results:
+        db.add_all(results)
+        db.flush()
@@ -16,7 +16,7 @@ import uuid
 from datetime import datetime
 from decimal import Decimal
 from enum import Enum as PyEnum
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 
@@ -186,6 +186,30 @@ class WithdrawRequestStatus(str, PyEnum):
     canceled = "canceled"
 
 
+class PostingSide(str, PyEnum):
+    """Side of a double-entry posting from the posted user's point of view."""
+
+    debit = "debit"
+    """Available credits decrease."""
+    credit = "credit"
+    """Available credits increase (or stay, e.g. zero-available movements)."""
+
+
+class ReservationStatus(str, PyEnum):
+    """Lifecycle of a credit hold placed for a booking."""
+
+    held = "held"
+    """Credits moved from available to reserved."""
+    captured = "captured"
+    """Booking finished; the hold was paid out to the mentor."""
+    released = "released"
+    """Booking cancelled/released; credits returned to available."""
+    expired = "expired"
+    """Released automatically by the sweeper after ``expires_at``."""
+    failed = "failed"
+    """The sweeper's release was rejected (reserved credits did not cover it); needs reconciliation."""
+
+
 # =============================================================================
 # Existing Pydantic schemas (unchanged from original)
 # =============================================================================
@@ -493,5 +517,219 @@ class TopicVoteResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class LedgerWriteResult(BaseModel):
+    """Outcome of a ledger write performed by ``PaymentManager``."""
+
+    transaction_id: int
+    user_id: int
+    available_credits: Decimal
+    reserved_credits: Decimal
+    version: int
+    replayed: bool = Field(False, description="True when idempotency_key matched an existing entry")
+
+
+class LedgerEntryCreate(BaseModel):
+    """A single ledger entry submitted for batch settlement."""
+
+    user_id: int
+    amount: Decimal
+    transaction_type: TransactionType
+    idempotency_key: str = Field(..., max_length=128)
+    reference_type: Optional[str] = None
+    reference_id: Optional[int] = None
+    description: Optional[str] = None
+    ai_tokens_used: Optional[int] = None
+    ai_tokens_prompt: Optional[int] = None
+    ai_tokens_completion: Optional[int] = None
+    extra_metadata: Optional[dict] = None
+
+
+class BatchSettlementResult(BaseModel):
+    """Summary of ``PaymentManager.settle_batch``."""
+
+    inserted: int = 0
+    replayed: int = Field(0, description="Entries skipped because their idempotency_key already existed")
+    failed: int = Field(0, description="Entries not recorded because the user's balance could not cover them")
+    users_updated: int = 0
+    failed_user_ids: List[int] = Field(default_factory=list)
+
+
+class BalanceDrift(BaseModel):
+    """A user whose ``user_balance`` row disagrees with the ledger."""
+
+    user_id: int
+    available_credits: Optional[Decimal] = None
+    expected_available: Decimal
+    reserved_credits: Optional[Decimal] = None
+    expected_reserved: Decimal
+    total_earned: Optional[Decimal] = None
+    expected_earned: Decimal
+    total_spent: Optional[Decimal] = None
+    expected_spent: Decimal
+
+
+class ReconciliationReport(BaseModel):
+    """Outcome of one ``LedgerReconciler.run``."""
+
+    from_transaction_id: int
+    to_transaction_id: int
+    users_folded: int = Field(0, description="Users whose ledger totals changed in this run")
+    drift_count: int = 0
+    repaired: int = 0
+    drift: List[BalanceDrift] = Field(default_factory=list)
+
+
+class BalancePoint(BaseModel):
+    """A user's balance as of ``at`` (ledger rows with ``created_at < at``)."""
+
+    user_id: int
+    at: datetime
+    available_credits: Decimal = Decimal("0.00")
+    reserved_credits: Decimal = Decimal("0.00")
+    total_earned: Decimal = Decimal("0.00")
+    total_spent: Decimal = Decimal("0.00")
+    snapshot_period_end: Optional[datetime] = Field(None, description="Snapshot the balance was computed from")
+
+
+class BalanceStatement(BaseModel):
+    """Opening/closing balances and the ledger entries of one period."""
+
+    user_id: int
+    period_start: datetime
+    period_end: datetime
+    opening: BalancePoint
+    closing: BalancePoint
+    transactions: List[TransactionResponse] = Field(default_factory=list)
+
+
+class BookingReservationResponse(BaseModel):
+    """Public view of a booking credit hold."""
+
+    id: int
+    schedule_id: int
+    user_id: int
+    mentor_id: Optional[int] = None
+    amount: Decimal
+    status: ReservationStatus
+    expires_at: datetime
+    reserve_transaction_id: Optional[int] = None
+    settle_transaction_id: Optional[int] = None
+    created_at: datetime
+    settled_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PaymentQueueItem(BaseModel):
+    """Topup/withdraw request row of the admin queue, with user and balance pre-joined."""
+
+    id: int
+    user_id: int
+    username: str
+    email: str
+    amount_requested: Decimal
+    method: Optional[str] = Field(None, description="payment_method / payout_method")
+    reference: Optional[str] = Field(None, description="external_reference / payout_details_masked")
+    status: WithdrawRequestStatus
+    notes: Optional[str] = None
+    created_at: datetime
+    available_credits: Decimal = Decimal("0.00")
+    reserved_credits: Decimal = Decimal("0.00")
+
+
+class PaymentQueuePage(BaseModel):
+    """One keyset page of the admin queue."""
+
+    items: List[PaymentQueueItem] = Field(default_factory=list)
+    next_cursor: Optional[str] = Field(None, description="Pass as ``after`` to fetch the next page")
+
+
+class BulkApprovalResult(BaseModel):
+    """Outcome of approving a batch of topup/withdraw requests."""
+
+    approved: List[int] = Field(default_factory=list)
+    failed: List[int] = Field(default_factory=list, description="Not covered by the balance (withdrawals)")
+    skipped: List[int] = Field(default_factory=list, description="Unknown, already processed or locked elsewhere")
+
+
+class LedgerExportFilter(BaseModel):
+    """Row selection of a ledger export; all filters are optional."""
+
+    user_id: Optional[int] = None
+    transaction_types: List[TransactionType] = Field(default_factory=list)
+    statuses: List[TransactionStatus] = Field(default_factory=list)
+    created_from: Optional[datetime] = Field(None, description="Inclusive lower bound on created_at")
+    created_to: Optional[datetime] = Field(None, description="Exclusive upper bound on created_at")
+    after_id: Optional[int] = Field(None, description="Resume after this balance_transactions.id")
+
+
+class LedgerExportResult(BaseModel):
+    """Outcome of a ledger export."""
+
+    rows: int = 0
+    last_id: Optional[int] = Field(None, description="Pass as after_id to resume")
+
+
+class TransferVerification(BaseModel):
+    """Result of checking that double-entry transfers net to zero."""
+
+    transfers: int = 0
+    net_available: Decimal = Field(Decimal("0.00"), description="Sum of all transfer postings; must be 0")
+    unbalanced_count: int = 0
+    unbalanced: List[uuid.UUID] = Field(default_factory=list, description="First unbalanced transfer ids")
+
+
+class TopicVoteBatchResult(BaseModel):
+    """Outcome of flushing a batch of buffered topic votes."""
+
+    inserted: int = 0
+    duplicates: int = Field(0, description="Votes skipped because the user had already voted for the topic")
+    rewarded_topic_ids: List[int] = Field(
+        default_factory=list, description="Topics that reached the reward threshold in this batch"
+    )
+    settlement: BatchSettlementResult = Field(default_factory=BatchSettlementResult)
+
+
+# =============================================================================
+# Anti-cheat schemas
+# =============================================================================
+
+class AntiCheatIncidentCreate(BaseModel):
+    """One incident reported by an exam client."""
+
+    session_id: str = Field(..., max_length=255)
+    user_id: int
+    session_type: str = Field(..., max_length=32, description="'ai_tutor' or 'quiz'")
+    incident_type: str = Field(..., max_length=64, description="'focus_loss', 'dev_tools_detected', ...")
+    description: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+    created_at: Optional[datetime] = Field(None, description="When the client observed it; defaults to now")
+
+
+class AntiCheatAction(str, PyEnum):
+    """What the exam client should do after an incident."""
+
+    none = "none"
+    warn = "warn"
+    terminate = "terminate"
+
+
+class AntiCheatDecision(BaseModel):
+    """Enforcement of ``anti_cheat_config.warnings_limit`` for one session."""
+
+    session_id: str
+    action: AntiCheatAction
+    violation_count: int = 0
+    warnings_limit: Optional[int] = None
+    warnings_left: Optional[int] = None
+
+
+class IncidentBatchResult(BaseModel):
+    """Outcome of flushing a batch of buffered anti-cheat incidents."""
+
+    inserted: int = 0
+    collapsed: int = Field(0, description="Repeats of the session's previous incident type merged into it")
+
+
 # Update forward references
 MessageResponse.model_rebuild()
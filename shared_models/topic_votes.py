@@ -0,0 +1,212 @@
+"""Batched ingestion of ``TopicVote`` upvotes and ``reward_forum_topic`` payouts.
+
+Handling each upvote on its own — insert, count the topic's votes, maybe
+reward the author — turns a viral topic into a hot row that every request
+queues on. ``TopicVoteBuffer`` collects votes in memory and ``ingest_votes``
+writes a whole batch at once:
+
+1. the touched topics are locked ``FOR NO KEY UPDATE`` in id order — one lock
+   per topic per batch instead of per vote — which serializes concurrent
+   batches on the same topic so that a threshold crossing is seen by exactly
+   one of them (votes still take only ``FOR KEY SHARE`` through their FK);
+2. all votes go in with one ``INSERT … SELECT FROM unnest(…) ON CONFLICT
+   (topic_id, user_id) DO NOTHING RETURNING topic_id``;
+3. one grouped query returns the vote count of every touched topic at or
+   above the threshold; the topics whose count was below it before this batch
+   are the ones that crossed;
+4. their authors are rewarded with one ``PaymentManager.settle_batch`` under
+   ``forum_topic_reward:<topic_id>`` keys, so a topic is paid at most once.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import ARRAY, Integer, bindparam, column, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from shared_models.models import Topic
+from shared_models.payment_manager import ZERO, PaymentManager, quantize
+from shared_models.payment_models import TopicVote
+from shared_models.schemas import LedgerEntryCreate, TopicVoteBatchResult, TransactionType
+
+VOTE_REWARD_THRESHOLD = 10
+REFERENCE_TYPE = "topic"
+
+Vote = Tuple[int, int]
+
+
+def topic_reward_key(topic_id: int) -> str:
+    """Idempotency key of the one-time reward for ``topic_id``."""
+    return f"forum_topic_reward:{topic_id}"
+
+
+def ingest_votes(
+    db: Session,
+    votes: Iterable[Vote],
+    reward_amount: Decimal,
+    *,
+    threshold: int = VOTE_REWARD_THRESHOLD,
+    payments: Optional[PaymentManager] = None,
+) -> TopicVoteBatchResult:
+    """Insert ``(topic_id, user_id)`` votes and reward topics that reach ``threshold``.
+
+    Votes for topics that no longer exist are dropped. Topics without an
+    author are never rewarded. Rewards are settled with ``payments`` (a
+    default ``PaymentManager`` on ``db``). The caller commits.
+    """
+    votes = sorted(set(votes))
+    result = TopicVoteBatchResult()
+    if not votes:
+        return result
+
+    topics = Topic.__table__
+    authors = dict(
+        db.execute(
+            select(topics.c.id, topics.c.user_id)
+            .where(topics.c.id.in_({topic_id for topic_id, _ in votes}))
+            .order_by(topics.c.id)
+            .with_for_update(key_share=True)
+        ).all()
+    )
+    votes = [vote for vote in votes if vote[0] in authors]
+    if not votes:
+        return result
+
+    tv = TopicVote.__table__
+    batch = (
+        func.unnest(bindparam("topic_ids", type_=ARRAY(Integer)), bindparam("user_ids", type_=ARRAY(Integer)))
+        .table_valued(column("topic_id", Integer), column("user_id", Integer))
+        .render_derived(name="batch")
+    )
+    inserted = Counter(
+        db.execute(
+            pg_insert(tv)
+            .from_select(["topic_id", "user_id"], select(batch.c.topic_id, batch.c.user_id))
+            .on_conflict_do_nothing(index_elements=[tv.c.topic_id, tv.c.user_id])
+            .returning(tv.c.topic_id),
+            {"topic_ids": [topic_id for topic_id, _ in votes], "user_ids": [user_id for _, user_id in votes]},
+        ).scalars()
+    )
+    result.inserted = sum(inserted.values())
+    result.duplicates = len(votes) - result.inserted
+    if not inserted:
+        return result
+
+    totals = db.execute(
+        select(tv.c.topic_id, func.count())
+        .where(tv.c.topic_id.in_(inserted))
+        .group_by(tv.c.topic_id)
+        .having(func.count() >= threshold)
+    ).all()
+    crossed = sorted(
+        topic_id
+        for topic_id, total in totals
+        if total - inserted[topic_id] < threshold and authors[topic_id] is not None
+    )
+    result.rewarded_topic_ids = crossed
+    result.settlement = (payments or PaymentManager(db)).settle_batch(
+        [
+            LedgerEntryCreate(
+                user_id=authors[topic_id],
+                amount=reward_amount,
+                transaction_type=TransactionType.reward_forum_topic,
+                idempotency_key=topic_reward_key(topic_id),
+                reference_type=REFERENCE_TYPE,
+                reference_id=topic_id,
+                description=f"Topic reached {threshold} votes",
+            )
+            for topic_id in crossed
+        ]
+    )
+    return result
+
+
+class TopicVoteBuffer:
+    """In-process buffer of upvotes, flushed with ``ingest_votes``.
+
+    Thread-safe; one instance is meant to be shared by the whole worker.
+
+    Args:
+        reward_amount: Credits paid to the author of a topic reaching ``threshold``.
+        threshold: Votes needed for the reward.
+        max_votes: The buffer is due for flushing once it holds this many votes.
+        max_age: ... or once its oldest vote is this old.
+    """
+
+    def __init__(
+        self,
+        reward_amount: Decimal,
+        *,
+        threshold: int = VOTE_REWARD_THRESHOLD,
+        max_votes: int = 1000,
+        max_age: timedelta = timedelta(seconds=2),
+    ):
+        self.reward_amount = quantize(Decimal(reward_amount))
+        if self.reward_amount <= ZERO:
+            raise ValueError("reward_amount must be positive")
+        self.threshold = threshold
+        self.max_votes = max_votes
+        self.max_age = max_age
+        self._votes: Set[Vote] = set()
+        self._oldest: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._votes)
+
+    def record(self, topic_id: int, user_id: int, *, at: Optional[datetime] = None) -> bool:
+        """Buffer one upvote; returns True when the buffer is due for flushing."""
+        at = at or datetime.now(timezone.utc)
+        with self._lock:
+            self._votes.add((topic_id, user_id))
+            if self._oldest is None or at < self._oldest:
+                self._oldest = at
+            return self._is_due(at)
+
+    def flush(
+        self,
+        db: Session,
+        *,
+        force: bool = False,
+        now: Optional[datetime] = None,
+        payments: Optional[PaymentManager] = None,
+    ) -> TopicVoteBatchResult:
+        """Write the buffered votes if the buffer is due (always with ``force``).
+
+        The caller commits. If ingestion raises, the votes are put back into
+        the buffer; retrying is safe because both the votes and the rewards
+        are idempotent.
+        """
+        votes = self.drain(force=force, now=now)
+        try:
+            return ingest_votes(db, votes, self.reward_amount, threshold=self.threshold, payments=payments)
+        except Exception:
+            self.requeue(votes)
+            raise
+
+    def drain(self, *, force: bool = False, now: Optional[datetime] = None) -> List[Vote]:
+        """Remove and return the buffered votes if due (all of them with ``force``)."""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            if not self._votes or not (force or self._is_due(now)):
+                return []
+            votes = list(self._votes)
+            self._votes.clear()
+            self._oldest = None
+            return votes
+
+    def requeue(self, votes: Iterable[Vote]) -> None:
+        """Return drained votes to the buffer."""
+        with self._lock:
+            self._votes.update(votes)
+            if self._votes and self._oldest is None:
+                self._oldest = datetime.now(timezone.utc)
+
+    def _is_due(self, now: datetime) -> bool:
+        return len(self._votes) >= self.max_votes or (self._oldest is not None and now - self._oldest >= self.max_age)
@@ -11,6 +11,7 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -154,7 +155,7 @@ class TutorSession(Base):
     topic: Mapped["TutorTopic"] = relationship("TutorTopic", back_populates="sessions")
     messages: Mapped[List["TutorMessage"]] = relationship(
         "TutorMessage", back_populates="session", cascade="all, delete-orphan",
-        order_by="TutorMessage.created_at",
+        order_by="(TutorMessage.created_at, TutorMessage.id)",
     )
     question_results: Mapped[List["TutorQuestionResult"]] = relationship(
         "TutorQuestionResult", back_populates="session", cascade="all, delete-orphan",
@@ -169,7 +170,7 @@ class TutorMessage(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     session_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("tutor_sessions.id", ondelete="CASCADE"),
-        nullable=False, index=True,
+        nullable=False,
     )
     role: Mapped[MessageRole] = mapped_column(
         Enum(MessageRole, name="message_role", native_enum=False),
@@ -196,6 +197,23 @@ class TutorMessage(Base):
     session: Mapped["TutorSession"] = relationship("TutorSession", back_populates="messages")
 
 
+# Transcript windows (see tutor_transcript): the newest messages of a session,
+# and its phase summaries.
+Index(
+    "ix_tutor_messages_session_recent",
+    TutorMessage.session_id,
+    TutorMessage.created_at.desc(),
+    TutorMessage.id.desc(),
+)
+Index(
+    "ix_tutor_messages_session_summaries",
+    TutorMessage.session_id,
+    TutorMessage.created_at.desc(),
+    TutorMessage.id.desc(),
+    postgresql_where=TutorMessage.phase == LessonPhase.summary,
+)
+
+
 class TutorQuestionResult(Base):
     """Результат ответа ученика на конкретный вопрос."""
 
@@ -0,0 +1,140 @@
+"""Bounded transcript windows of tutor sessions for LLM prompts.
+
+``TutorSession.messages`` loads the whole transcript, while a prompt only
+needs the latest messages plus the summaries of earlier lesson phases.
+``load_transcript`` reads just that, as plain rows (``id, role, content,
+message_type, phase, question_id, tokens_used, created_at``) instead of ORM
+objects:
+
+* the newest ``limit`` messages, walking ``ix_tutor_messages_session_recent``
+  (``session_id, created_at DESC, id DESC``) backwards from the end of the
+  session, so the cost does not grow with the session length;
+* the newest ``max_summaries`` messages of the ``summary`` phase older than
+  that window, from the partial index ``ix_tutor_messages_session_summaries``.
+
+With ``token_budget`` the window is cut further, newest first, so that
+summaries and messages together stay within the budget. A message counts its
+``tokens_used``, or ``len(content) / 4`` when that was not recorded; the
+newest message is always kept.
+
+Both lists come back oldest first, ready to be appended to a prompt.
+"""
+
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from shared_models.tutor_models import LessonPhase, TutorMessage
+
+TRANSCRIPT_WINDOW = 20
+MAX_SUMMARIES = 5
+CHARS_PER_TOKEN = 4
+
+TRANSCRIPT_COLUMNS = (
+    TutorMessage.id,
+    TutorMessage.role,
+    TutorMessage.content,
+    TutorMessage.message_type,
+    TutorMessage.phase,
+    TutorMessage.question_id,
+    TutorMessage.tokens_used,
+    TutorMessage.created_at,
+)
+
+
+@dataclass(frozen=True)
+class TutorTranscript:
+    """Prompt context of a session: earlier phase summaries and the latest messages, both oldest first."""
+
+    summaries: Tuple[Any, ...]
+    messages: Tuple[Any, ...]
+    tokens: int
+    truncated: bool
+
+    def __iter__(self):
+        yield from self.summaries
+        yield from self.messages
+
+
+def load_transcript(
+    db: Session,
+    session_id: uuid.UUID,
+    *,
+    limit: int = TRANSCRIPT_WINDOW,
+    token_budget: Optional[int] = None,
+    max_summaries: int = MAX_SUMMARIES,
+) -> TutorTranscript:
+    """The last ``limit`` messages of ``session_id`` and the phase summaries before them.
+
+    ``truncated`` tells whether older messages were left out.
+    """
+    newest_first = (TutorMessage.created_at.desc(), TutorMessage.id.desc())
+    window = db.execute(
+        select(*TRANSCRIPT_COLUMNS)
+        .where(TutorMessage.session_id == session_id)
+        .order_by(*newest_first)
+        .limit(limit + 1)
+    ).all()
+    truncated = len(window) > limit
+    window = window[:limit]
+
+    summaries: Sequence[Any] = ()
+    if truncated and max_summaries > 0:
+        oldest = window[-1]
+        summaries = db.execute(
+            select(*TRANSCRIPT_COLUMNS)
+            .where(
+                TutorMessage.session_id == session_id,
+                TutorMessage.phase == LessonPhase.summary,
+                tuple_(TutorMessage.created_at, TutorMessage.id) < tuple_(oldest.created_at, oldest.id),
+            )
+            .order_by(*newest_first)
+            .limit(max_summaries)
+        ).all()
+
+    summaries, messages, tokens, cut = fit_budget(summaries, window, token_budget)
+    return TutorTranscript(
+        summaries=tuple(reversed(summaries)),
+        messages=tuple(reversed(messages)),
+        tokens=tokens,
+        truncated=truncated or cut,
+    )
+
+
+def fit_budget(
+    summaries: Sequence[Any], messages: Sequence[Any], token_budget: Optional[int]
+) -> Tuple[Sequence[Any], Sequence[Any], int, bool]:
+    """Cut newest-first ``messages``, then ``summaries``, to ``token_budget``.
+
+    Messages take precedence: the newest one is always kept, older ones are
+    added while they fit, summaries fill what is left. Returns the kept rows
+    (still newest first), their tokens and whether anything was dropped.
+    """
+    kept_messages, tokens = [], 0
+    for row in messages:
+        cost = message_tokens(row)
+        if token_budget is not None and kept_messages and tokens + cost > token_budget:
+            break
+        kept_messages.append(row)
+        tokens += cost
+    kept_summaries = []
+    for row in summaries:
+        cost = message_tokens(row)
+        if token_budget is not None and tokens + cost > token_budget:
+            break
+        kept_summaries.append(row)
+        tokens += cost
+    cut = len(kept_messages) < len(messages) or len(kept_summaries) < len(summaries)
+    return kept_summaries, kept_messages, tokens, cut
+
+
+def message_tokens(row: Any) -> int:
+    """Recorded ``tokens_used`` of a message, or an estimate from its length."""
+    if row.tokens_used is not None:
+        return row.tokens_used
+    return max(len(row.content or "") // CHARS_PER_TOKEN, 1)
@@ -0,0 +1,196 @@
+"""Write everything a tutor turn produces in one transaction.
+
+A turn of the tutor typically stores the student's message, the assistant's
+reply, maybe a system note, a ``TutorQuestionResult`` for the answered
+question, and moves ``TutorSession.current_phase`` /
+``current_question_index`` on. ``TutorTurn`` collects all of it in memory and
+``flush`` writes it with one multi-row ``INSERT … RETURNING`` per table and
+one ``UPDATE`` of the session, instead of an ORM flush (and often a commit)
+per row. Nothing is committed; the caller commits once per turn::
+
+    turn = TutorTurn(session.id, phase=session.current_phase)
+    turn.user(answer)
+    turn.add_result("q3", question_text, student_answer=answer, is_correct=True, score=1.0)
+    turn.assistant(reply, tokens_used=usage.total_tokens)
+    turn.advance(question_index=session.current_question_index + 1)
+    turn.flush(db)
+    db.commit()
+
+``flush_async`` does the same on an ``AsyncSession``. For streamed LLM
+replies ``stream_assistant`` passes the chunks through and records the
+assistant message once the stream has finished, so a reply is stored as one
+row, and not at all if the stream breaks off.
+
+Messages are stamped with the time they were added to the turn, which keeps
+them in order within the turn.
+"""
+
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from shared_models.tutor_models import (
+    LessonPhase,
+    MessageRole,
+    MessageType,
+    TutorMessage,
+    TutorQuestionResult,
+    TutorSession,
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@dataclass(frozen=True)
+class TutorTurnResult:
+    """Ids of the rows written by ``TutorTurn.flush``, in the order they were added."""
+
+    message_ids: List[int] = field(default_factory=list)
+    result_ids: List[int] = field(default_factory=list)
+    session_updated: bool = False
+
+
+class TutorTurn:
+    """Messages, question results and session state of one tutor turn, written together.
+
+    Args:
+        session_id: The ``TutorSession`` the turn belongs to.
+        phase: Default lesson phase of the turn's messages and results.
+    """
+
+    def __init__(self, session_id: uuid.UUID, *, phase: LessonPhase = LessonPhase.dialog):
+        self.session_id = session_id
+        self.phase = phase
+        self._messages: List[Dict[str, Any]] = []
+        self._results: List[Dict[str, Any]] = []
+        self._session: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._messages) + len(self._results) + bool(self._session)
+
+    def add_message(
+        self,
+        role: MessageRole,
+        content: str,
+        *,
+        message_type: MessageType = MessageType.text,
+        phase: Optional[LessonPhase] = None,
+        question_id: Optional[str] = None,
+        tokens_used: Optional[int] = None,
+        at: Optional[datetime] = None,
+    ) -> None:
+        self._messages.append(
+            {
+                "session_id": self.session_id,
+                "role": role,
+                "content": content,
+                "message_type": message_type,
+                "phase": phase or self.phase,
+                "question_id": question_id,
+                "tokens_used": tokens_used,
+                "created_at": at or datetime.now(timezone.utc),
+            }
+        )
+
+    def user(self, content: str, **fields: Any) -> None:
+        self.add_message(MessageRole.user, content, **fields)
+
+    def assistant(self, content: str, **fields: Any) -> None:
+        self.add_message(MessageRole.assistant, content, **fields)
+
+    def system(self, content: str, **fields: Any) -> None:
+        self.add_message(MessageRole.system, content, **fields)
+
+    async def stream_assistant(self, chunks: AsyncIterable[str], **fields: Any) -> AsyncIterator[str]:
+        """Yield the chunks of a streamed reply; add it as one assistant message when the stream ends."""
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.assistant("".join(parts), **fields)
+
+    def add_result(
+        self,
+        question_id: str,
+        question_text: str,
+        *,
+        student_answer: Optional[str] = None,
+        is_correct: Optional[bool] = None,
+        score: float = 0.0,
+        feedback: Optional[str] = None,
+        attempts: int = 1,
+        phase: Optional[LessonPhase] = None,
+        time_spent_seconds: Optional[int] = None,
+    ) -> None:
+        self._results.append(
+            {
+                "session_id": self.session_id,
+                "question_id": question_id,
+                "question_text": question_text,
+                "student_answer": student_answer,
+                "is_correct": is_correct,
+                "score": score,
+                "feedback": feedback,
+                "attempts": attempts,
+                "phase": phase or self.phase,
+                "time_spent_seconds": time_spent_seconds,
+            }
+        )
+
+    def advance(self, *, phase: Optional[LessonPhase] = None, question_index: Optional[int] = None) -> None:
+        """Set the session's phase and/or question index; later messages default to the new phase."""
+        if phase is not None:
+            self._session["current_phase"] = self.phase = phase
+        if question_index is not None:
+            self._session["current_question_index"] = question_index
+
+    def flush(self, db: Session) -> TutorTurnResult:
+        """Write the turn and clear it. The caller commits."""
+        message_ids, result_ids, session_updated = [], [], False
+        for kind, statement, rows in self._statements():
+            if kind == "session":
+                session_updated = db.execute(statement).rowcount > 0
+            else:
+                (message_ids if kind == "messages" else result_ids).extend(db.scalars(statement, rows).all())
+        self._clear()
+        return TutorTurnResult(message_ids=message_ids, result_ids=result_ids, session_updated=session_updated)
+
+    async def flush_async(self, db: "AsyncSession") -> TutorTurnResult:
+        """``flush`` on an ``AsyncSession``."""
+        message_ids, result_ids, session_updated = [], [], False
+        for kind, statement, rows in self._statements():
+            if kind == "session":
+                session_updated = (await db.execute(statement)).rowcount > 0
+            else:
+                (message_ids if kind == "messages" else result_ids).extend((await db.scalars(statement, rows)).all())
+        self._clear()
+        return TutorTurnResult(message_ids=message_ids, result_ids=result_ids, session_updated=session_updated)
+
+    def _statements(self) -> List[Tuple[str, Any, Optional[List[Dict[str, Any]]]]]:
+        statements = []
+        if self._messages:
+            messages = TutorMessage.__table__
+            statements.append(
+                ("messages", insert(messages).returning(messages.c.id, sort_by_parameter_order=True), self._messages)
+            )
+        if self._results:
+            results = TutorQuestionResult.__table__
+            statements.append(
+                ("results", insert(results).returning(results.c.id, sort_by_parameter_order=True), self._results)
+            )
+        if self._session:
+            # ORM-enabled, so a TutorSession loaded in the same session sees the new state.
+            statements.append(
+                ("session", update(TutorSession).where(TutorSession.id == self.session_id).values(self._session), None)
+            )
+        return statements
+
+    def _clear(self) -> None:
+        self._messages, self._results, self._session = [], [], {}
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Тест правил движения баланса в PaymentManager (без подключения к БД)
+"""
+
+import csv
+import io
+import sys
+import os
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+# Добавляем путь к shared_models в sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "."))
+
+from sqlalchemy.dialects import postgresql
+
+from shared_models import (
+    AITokenMeter,
+    BalanceDelta,
+    BloomFilter,
+    LedgerEntryCreate,
+    LedgerExportFilter,
+    PaymentManager,
+    TopicVoteBuffer,
+    TransactionType,
+)
+from shared_models.payment_manager import ZERO, balance_delta, counterpart_delta, posting_row, transfer_uuid
+from shared_models.balance_history import month_start, next_month
+from shared_models.ledger_export import EXPORT_COLUMNS, export_csv, export_parquet, export_query, parquet_schema
+from shared_models.payment_admin import decode_cursor, encode_cursor
+from shared_models.payment_reconciliation import ledger_sums
+
+
+class FakeLedgerSession:
+    """Just enough of a ``Session`` for ``settle_batch``: records every statement and
+    answers the balance lock from ``balances`` and the ledger insert with new ids."""
+
+    def __init__(self, balances):
+        self.balances = balances
+        self.statements = []
+
+    def execute(self, stmt, params=None, **kwargs):
+        self.statements.append((stmt, params))
+        if stmt.is_select:
+            width = len(stmt.selected_columns)
+            return FakeResult([(uid, *values)[:width] for uid, values in sorted(self.balances.items())])
+        if stmt.is_insert and stmt.table.name == "balance_transactions":
+            return FakeResult(
+                [
+                    (tx_id, row["user_id"], row["transaction_type"], row["amount"])
+                    for tx_id, row in enumerate(params, start=len(self.statements) * 1000)
+                ]
+            )
+        return FakeResult([])
+
+    def written(self, table_name):
+        return [
+            params
+            for stmt, params in self.statements
+            if (stmt.is_insert or stmt.is_update) and stmt.table.name == table_name
+        ]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+        self.rowcount = len(rows)
+
+    def all(self):
+        return self.rows
+
+    def tuples(self):
+        return self.rows
+
+    def scalars(self):
+        return [row[0] for row in self.rows]
+
+
+class FakeRequestSession(FakeLedgerSession):
+    """``FakeLedgerSession`` that also serves ``candidates`` of one request table and
+    applies its UPDATEs to ``rows``; an UPDATE joined on the ledger only touches rows
+    whose ``key(row)`` has a ledger entry."""
+
+    def __init__(self, balances, table, rows, candidates, key):
+        super().__init__(balances)
+        self.table = table
+        self.rows = rows
+        self.candidates = candidates
+        self.key = key
+        self.ledger = {}
+
+    def execute(self, stmt, params=None, **kwargs):
+        if stmt.is_select and self.table in stmt.get_final_froms():
+            self.statements.append((stmt, params))
+            return FakeResult(self.candidates)
+        if stmt.is_update and stmt.table is self.table:
+            self.statements.append((stmt, params))
+            compiled = stmt.compile(dialect=postgresql.dialect())
+            ids = list(compiled.params["id_1"])
+            if "balance_transactions" in str(compiled):
+                ids = [row_id for row_id in ids if self.key(self.rows[row_id]) in self.ledger]
+            for row_id in ids:
+                self.rows[row_id].update(
+                    {
+                        name: compiled.params[name]
+                        for name in ("status", "processed_by_admin_id")
+                        if name in compiled.params
+                    }
+                )
+            return FakeResult([(row_id,) for row_id in ids])
+        result = super().execute(stmt, params, **kwargs)
+        if stmt.is_insert and stmt.table.name == "balance_transactions":
+            self.ledger.update({row["idempotency_key"]: tx[0] for tx, row in zip(result.rows, params)})
+        if stmt.is_delete:
+            deleted = set(stmt.compile(dialect=postgresql.dialect()).params["id_1"])
+            self.ledger = {key: tx_id for key, tx_id in self.ledger.items() if tx_id not in deleted}
+        return result
+
+
+def test_balance_delta_directions():
+    assert balance_delta(TransactionType.topup_stub, Decimal("10")) == BalanceDelta(
+        available=Decimal("10.00"), earned=Decimal("10.00")
+    )
+    assert balance_delta(TransactionType.spend_quiz, Decimal("2.5")) == BalanceDelta(
+        available=Decimal("-2.50"), spent=Decimal("2.50")
+    )
+    assert balance_delta(TransactionType.reserve, Decimal("4")) == BalanceDelta(
+        available=Decimal("-4.00"), reserved=Decimal("4.00")
+    )
+    assert balance_delta(TransactionType.release, Decimal("4")) == BalanceDelta(
+        available=Decimal("4.00"), reserved=Decimal("-4.00")
+    )
+    assert balance_delta(TransactionType.admin_adjustment, Decimal("-3")).available == Decimal("-3.00")
+
+    with pytest.raises(ValueError):
+        balance_delta(TransactionType.spend_quiz, Decimal("-1"))
+
+
+def test_transfer_legs_net_to_zero():
+    for tx_type in (TransactionType.transfer_to_mentor, TransactionType.refund_to_student):
+        owner = balance_delta(tx_type, Decimal("7"))
+        other = counterpart_delta(tx_type, Decimal("7"))
+        assert owner.available + other.available == 0
+
+
+def test_cas_statement_is_single_round_trip():
+    stmt = PaymentManager(db=None)._cas_and_insert(
+        1,
+        3,
+        balance_delta(TransactionType.spend_booking, Decimal("5")),
+        PaymentManager._ledger_row(
+            user_id=1,
+            amount=Decimal("5.00"),
+            transaction_type=TransactionType.spend_booking,
+            idempotency_key="booking-1",
+        ),
+    )
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "WITH upd AS" in sql
+    assert "user_balance.version =" in sql
+    assert "ON CONFLICT (idempotency_key) DO NOTHING" in sql
+
+
+def test_settle_batch_rejects_transfers():
+    entry = LedgerEntryCreate(
+        user_id=1,
+        amount=Decimal("5"),
+        transaction_type=TransactionType.transfer_to_mentor,
+        idempotency_key="transfer-1",
+    )
+    with pytest.raises(ValueError):
+        PaymentManager(db=None).settle_batch([entry])
+
+
+def test_ledger_sums_include_counterpart_leg():
+    sql = str(ledger_sums().compile(dialect=postgresql.dialect()))
+    assert "UNION ALL" in sql
+    assert "balance_transactions.counterpart_user_id AS user_id" in sql
+    assert "GROUP BY movements.user_id" in sql
+
+
+def test_ai_token_meter_aggregates_window():
+    meter = AITokenMeter(Decimal("0.5"), max_calls=3)
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    due = [meter.record(1, "session-1", 300, 200, at=started + timedelta(seconds=i)) for i in range(3)]
+    assert due == [False, False, True]
+
+    (window,) = meter.drain()
+    entry = meter.to_entry(window)
+    assert entry.amount == Decimal("0.75")
+    assert entry.ai_tokens_used == 1500
+    assert entry.idempotency_key == window.idempotency_key
+    assert len(meter) == 0
+
+
+def test_snapshot_periods_are_utc_months():
+    moment = datetime(2026, 12, 31, 23, 30, tzinfo=timezone(timedelta(hours=-3)))
+    assert month_start(moment) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+    assert next_month(datetime(2026, 12, 5, tzinfo=timezone.utc)) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+
+
+def test_payment_queue_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 0, 5, 123, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_transfer_postings_share_id_and_net_to_zero():
+    transfer_id = transfer_uuid("transfer-1")
+    amount = Decimal("7.00")
+    debit = posting_row(1, 10, balance_delta(TransactionType.transfer_to_mentor, amount), transfer_id)
+    credit = posting_row(1, 20, counterpart_delta(TransactionType.transfer_to_mentor, amount), transfer_id)
+    assert (debit["side"], credit["side"]) == ("debit", "credit")
+    assert debit["available_delta"] + credit["available_delta"] == 0
+    assert transfer_uuid("transfer-1") == transfer_id
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"event-{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other-{i}" in bloom for i in range(1000))
+    assert false_positives < 50
+
+
+def test_topic_vote_buffer_dedups_and_flushes_when_due():
+    buffer = TopicVoteBuffer(Decimal("5"), max_votes=3, max_age=timedelta(seconds=10))
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert not buffer.record(1, 10, at=start)
+    assert not buffer.record(1, 10, at=start)
+    assert not buffer.record(1, 11, at=start)
+    assert len(buffer) == 2
+    assert buffer.drain(now=start) == []
+    assert len(buffer.drain(now=start + timedelta(seconds=10))) == 2
+    assert not buffer
+    assert buffer.record(2, 10, at=start) is False
+    assert buffer.record(2, 11, at=start) is False
+    assert buffer.record(2, 12, at=start) is True
+
+
+def test_ai_token_meter_rekeys_grown_windows():
+    def failing_settlement(entries, allow_overdraft):
+        raise RuntimeError("connection lost")
+
+    meter = AITokenMeter(Decimal("1"))
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    meter.record(1, "session-1", 1500, 500, at=started)
+    with pytest.raises(RuntimeError):
+        meter.flush(None, force=True, payments=SimpleNamespace(settle_batch=failing_settlement))
+    (window,) = meter.drain(force=True)
+    first_key = window.idempotency_key
+
+    # Без новых вызовов окно повторяется под тем же ключом.
+    meter.requeue([window])
+    assert meter.drain(force=True)[0].idempotency_key == first_key
+
+    meter.record(1, "session-1", 1000, 0, at=started + timedelta(seconds=5))
+    meter.requeue([window])
+    (window,) = meter.drain(force=True)
+    entry = meter.to_entry(window)
+    assert entry.amount == Decimal("3.00")
+    assert entry.idempotency_key != first_key
+
+
+def test_settle_batch_drops_entries_that_overdraw():
+    db = FakeLedgerSession(
+        {1: (Decimal("10.00"), ZERO), 2: (Decimal("1.00"), ZERO), 3: (Decimal("10.00"), Decimal("2.00"))}
+    )
+    entries = [
+        LedgerEntryCreate(
+            user_id=1, amount=Decimal("5"), transaction_type=TransactionType.spend_quiz, idempotency_key="a"
+        ),
+        LedgerEntryCreate(
+            user_id=2, amount=Decimal("5"), transaction_type=TransactionType.spend_quiz, idempotency_key="b"
+        ),
+        # Снятие резерва больше зарезервированного тоже отклоняется.
+        LedgerEntryCreate(
+            user_id=3, amount=Decimal("5"), transaction_type=TransactionType.release, idempotency_key="c"
+        ),
+    ]
+    result = PaymentManager(db).settle_batch(entries)
+    assert (result.inserted, result.failed, result.failed_user_ids) == (1, 2, [2, 3])
+
+    # Ключи отклонённых записей освобождаются: строки удаляются в той же транзакции.
+    (inserted,) = db.written("balance_transactions")
+    tx_ids = {row["idempotency_key"]: tx_id for tx_id, row in enumerate(inserted, start=3000)}
+    (deleted,) = [stmt for stmt, params in db.statements if stmt.is_delete]
+    assert deleted.table.name == "balance_transactions"
+    assert deleted.compile(dialect=postgresql.dialect()).params["id_1"] == [tx_ids["b"], tx_ids["c"]]
+    net = db.written("user_balance")[-1]
+    assert net["net_user_id"] == [1] and net["net_d_available"] == [Decimal("-5.00")]
+
+
+def test_approve_withdrawals_marks_uncovered_requests_failed():
+    from shared_models.payment_admin import PaymentQueue
+    from shared_models.payment_models import WithdrawRequest
+    from shared_models.schemas import WithdrawRequestStatus
+
+    rows = {
+        1: {"id": 1, "user_id": 1, "amount_requested": Decimal("4.00"), "status": WithdrawRequestStatus.pending},
+        2: {"id": 2, "user_id": 2, "amount_requested": Decimal("3.00"), "status": WithdrawRequestStatus.pending},
+        3: {"id": 3, "user_id": 2, "amount_requested": Decimal("4.00"), "status": WithdrawRequestStatus.processing},
+        4: {"id": 4, "user_id": 1, "amount_requested": Decimal("1.00"), "status": WithdrawRequestStatus.completed},
+    }
+    db = FakeRequestSession(
+        {1: (Decimal("10.00"), ZERO), 2: (Decimal("5.00"), ZERO)},
+        WithdrawRequest.__table__,
+        rows,
+        # Закрытая заявка 4 не блокируется.
+        [SimpleNamespace(**rows[request_id]) for request_id in (1, 2, 3)],
+        key=lambda row: f"withdraw_request:{row['id']}",
+    )
+    result = PaymentQueue(db).approve_withdrawals([4, 3, 2, 1], admin_id=9)
+    assert (result.approved, result.failed, result.skipped) == ([1], [2, 3], [4])
+    assert {request_id: row["status"] for request_id, row in rows.items()} == {
+        1: WithdrawRequestStatus.completed,
+        2: WithdrawRequestStatus.failed,
+        3: WithdrawRequestStatus.failed,
+        4: WithdrawRequestStatus.completed,
+    }
+    assert [rows[request_id]["processed_by_admin_id"] for request_id in (1, 2, 3)] == [9, 9, 9]
+
+
+def test_expire_batch_marks_rejected_releases_failed():
+    from shared_models.booking_reservations import ReservationManager
+    from shared_models.payment_models import BookingReservation
+    from shared_models.schemas import ReservationStatus
+
+    rows = {
+        1: {"id": 1, "schedule_id": 11, "user_id": 1, "amount": Decimal("5.00"), "status": ReservationStatus.held},
+        2: {"id": 2, "schedule_id": 12, "user_id": 2, "amount": Decimal("3.00"), "status": ReservationStatus.held},
+    }
+    # Резерв пользователя 2 разошёлся с удержанием: освобождение отклоняется.
+    db = FakeRequestSession(
+        {1: (ZERO, Decimal("5.00")), 2: (ZERO, Decimal("1.00"))},
+        BookingReservation.__table__,
+        rows,
+        [SimpleNamespace(**row) for row in rows.values()],
+        key=lambda row: f"booking:{row['schedule_id']}:release",
+    )
+    assert ReservationManager(db).expire_batch() == 2
+    assert rows[1]["status"] == ReservationStatus.expired
+    assert rows[2]["status"] == ReservationStatus.failed
+
+    rows[2]["status"] = ReservationStatus.held
+    db = FakeRequestSession(
+        {2: (ZERO, Decimal("3.00"))},
+        BookingReservation.__table__,
+        rows,
+        [SimpleNamespace(**rows[2])],
+        key=lambda row: f"booking:{row['schedule_id']}:release",
+    )
+    assert ReservationManager(db).expire_batch() == 1
+    assert rows[2]["status"] == ReservationStatus.expired
+
+
+def test_services_follow_double_entry_setting():
+    from shared_models import payment_manager
+    from shared_models.booking_reservations import ReservationManager
+    from shared_models.payment_admin import PaymentQueue
+    from shared_models.payment_reconciliation import LedgerReconciler
+
+    previous = payment_manager.DOUBLE_ENTRY
+    payment_manager.DOUBLE_ENTRY = True
+    try:
+        assert ReservationManager(None).payments.double_entry
+        assert PaymentQueue(None).payments.double_entry
+        assert LedgerReconciler(None).payments.double_entry
+        assert not PaymentManager(None, double_entry=False).double_entry
+
+        meter = AITokenMeter(Decimal("1"))
+        meter.record(7, "session-1", 1500, 500)
+        db = FakeLedgerSession({7: (Decimal("10.00"), ZERO)})
+        meter.flush(db, force=True)
+        (postings,) = db.written("ledger_postings")
+        assert [(row["user_id"], row["available_delta"]) for row in postings] == [(7, Decimal("-2.00"))]
+    finally:
+        payment_manager.DOUBLE_ENTRY = previous
+
+    injected = PaymentManager(None, double_entry=True)
+    assert ReservationManager(None, payments=injected).payments is injected
+
+
+class FakeExportSession:
+    """Serves ``rows`` to the ledger exporters in ``yield_per`` partitions."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def execute(self, stmt, params=None, *, execution_options=None):
+        self.statements.append(stmt)
+        size = execution_options["yield_per"]
+        return SimpleNamespace(
+            partitions=lambda: (self.rows[start : start + size] for start in range(0, len(self.rows), size)),
+            close=lambda: None,
+        )
+
+
+def export_rows():
+    Row = namedtuple("Row", EXPORT_COLUMNS)
+    created = datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc)
+    base = dict.fromkeys(EXPORT_COLUMNS)
+    return [
+        # Enums and JSON arrive as their stored text (see _export_column).
+        Row(
+            **dict(
+                base,
+                id=1,
+                user_id=5,
+                transaction_type="topup_stub",
+                status="completed",
+                amount=Decimal("10.00"),
+                idempotency_key="topup-1",
+                extra_metadata='{"source": "stub"}',
+                created_at=created,
+            )
+        ),
+        Row(
+            **dict(
+                base,
+                id=2,
+                user_id=6,
+                counterpart_user_id=5,
+                transaction_type="transfer_to_mentor",
+                status="completed",
+                amount=Decimal("2.50"),
+                idempotency_key="transfer-1",
+                created_at=created,
+            )
+        ),
+        Row(
+            **dict(
+                base,
+                id=3,
+                user_id=5,
+                transaction_type="spend_quiz",
+                status="failed",
+                amount=Decimal("0.10"),
+                idempotency_key="quiz-1",
+                created_at=created,
+            )
+        ),
+    ]
+
+
+def test_ledger_export_query_filters():
+    sql = str(
+        export_query(
+            LedgerExportFilter(user_id=5, transaction_types=[TransactionType.spend_quiz], after_id=10)
+        ).compile(dialect=postgresql.dialect())
+    )
+    assert (
+        "(balance_transactions.user_id = %(user_id_1)s::INTEGER"
+        " OR balance_transactions.counterpart_user_id = %(counterpart_user_id_1)s::INTEGER)"
+    ) in sql
+    assert "balance_transactions.transaction_type IN (__[POSTCOMPILE_transaction_type_1])" in sql
+    assert "balance_transactions.id > %(id_1)s::INTEGER" in sql
+    assert "CAST(balance_transactions.extra_metadata AS TEXT) AS extra_metadata" in sql
+    assert sql.endswith("ORDER BY balance_transactions.id")
+    assert "WHERE" not in str(export_query().compile(dialect=postgresql.dialect()))
+
+
+def test_ledger_export_csv_rows():
+    out = io.StringIO()
+    result = export_csv(FakeExportSession(export_rows()), out, LedgerExportFilter(user_id=5), chunk_size=2)
+    assert (result.rows, result.last_id) == (3, 3)
+    lines = list(csv.reader(io.StringIO(out.getvalue())))
+    assert lines[0] == list(EXPORT_COLUMNS)
+    first = dict(zip(EXPORT_COLUMNS, lines[1]))
+    assert first["transaction_type"] == "topup_stub" and first["status"] == "completed"
+    assert first["amount"] == "10.00"
+    assert first["extra_metadata"] == '{"source": "stub"}'
+    assert first["counterpart_user_id"] == "" and first["created_at"] == "2026-03-01T12:30:00+00:00"
+    assert dict(zip(EXPORT_COLUMNS, lines[2]))["counterpart_user_id"] == "5"
+
+
+def test_ledger_export_parquet_chunks():
+    pq = pytest.importorskip("pyarrow.parquet")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ledger.parquet")
+        result = export_parquet(FakeExportSession(export_rows()), path, chunk_size=2)
+        parquet = pq.ParquetFile(path)
+        assert (result.rows, result.last_id) == (3, 3)
+        assert parquet.num_row_groups == 2
+        assert parquet.schema_arrow == parquet_schema()
+        assert str(parquet.schema_arrow.field("amount").type) == "decimal128(15, 2)"
+        table = parquet.read()
+        assert table.column("amount").to_pylist() == [Decimal("10.00"), Decimal("2.50"), Decimal("0.10")]
+        assert table.column("extra_metadata").to_pylist()[0] == '{"source": "stub"}'
+
+
+if __name__ == "__main__":
+    test_balance_delta_directions()
+    test_transfer_legs_net_to_zero()
+    test_cas_statement_is_single_round_trip()
+    test_settle_batch_rejects_transfers()
+    test_settle_batch_drops_entries_that_overdraw()
+    test_approve_withdrawals_marks_uncovered_requests_failed()
+    test_expire_batch_marks_rejected_releases_failed()
+    test_ledger_sums_include_counterpart_leg()
+    test_ai_token_meter_aggregates_window()
+    test_ai_token_meter_rekeys_grown_windows()
+    test_snapshot_periods_are_utc_months()
+    test_payment_queue_cursor_round_trip()
+    test_transfer_postings_share_id_and_net_to_zero()
+    test_bloom_filter_has_no_false_negatives()
+    test_topic_vote_buffer_dedups_and_flushes_when_due()
+    test_services_follow_double_entry_setting()
+    test_ledger_export_query_filters()
+    test_ledger_export_csv_rows()
+    test_ledger_export_parquet_chunks()
+    print("✅ PaymentManager: все проверки пройдены")
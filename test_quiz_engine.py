@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Тест компиляции и оценки квизов (без подключения к БД)
+"""
+
+import io
+import sys
+import os
+from datetime import date, datetime, timedelta, timezone
+
+# Добавляем путь к shared_models в sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "."))
+
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import inspect
+
+from shared_models import (
+    AnswerSchema,
+    CourseProgress,
+    QuestionSchema,
+    QuizAnswer,
+    QuizCache,
+    QuizAccessReason,
+    QuizAccessType,
+    QuizCourseItemCompletion,
+    QuizProgress,
+    QuizQuestion,
+    QuizStatus,
+    compile_quiz,
+    grade_batch,
+)
+from shared_models.anti_cheat import AntiCheatIncidentBuffer, decide_violations
+from shared_models.quiz_access import decide_access
+from shared_models.quiz_bundle import BUNDLE_FORMAT, BUNDLE_VERSION, iter_bundle
+from shared_models.quiz_stats import score_bucket
+from shared_models.quiz_storage import ANSWER_FIELDS, QUESTION_FIELDS
+
+PAYLOAD = {
+    "questions": [
+        {
+            "id": "q1",
+            "text": "2 + 2",
+            "type": "single_choice",
+            "answers": [{"id": "a", "text": "3"}, {"id": "b", "text": "4", "is_correct": True, "points": 2}],
+        },
+        {
+            "id": "q2",
+            "text": "Простые числа",
+            "type": "multiple_choice",
+            "answers": [
+                {"text": "2", "is_correct": True},
+                {"text": "3", "is_correct": True},
+                {"text": "4"},
+            ],
+        },
+        {
+            "id": "q3",
+            "text": "Столица Франции",
+            "type": "text_input",
+            "points": 3,
+            "answers": [{"text": "Paris", "is_correct": True}],
+        },
+    ]
+}
+
+
+def test_compiled_quiz_grades_attempt():
+    quiz = compile_quiz(1, PAYLOAD, passing_score=50)
+    assert quiz.total_points == 7
+    result = quiz.grade({"q1": "b", "q2": ["1", "0"], "q3": "  paris "})
+    assert (result.correct_answers, result.earned_points, result.percentage) == (3, 7, 100.0)
+    result = quiz.grade({"q1": "a", "q2": ["0"]})
+    assert (result.correct_answers, result.earned_points) == (0, 0)
+    assert not quiz.passed(result)
+    assert sorted(quiz.answer_order("q2", seed=5)) == ["0", "1", "2"]
+    assert quiz.answer_order("q2", seed=5) == quiz.answer_order("q2", seed=5)
+
+
+def test_quiz_cache_is_keyed_by_version():
+    cache = QuizCache(maxsize=2)
+    version = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    quiz = compile_quiz(1, PAYLOAD, updated_at=version)
+    cache._store(quiz)
+    assert cache._lookup(1, version) is quiz
+    assert cache._lookup(1, version + timedelta(seconds=1)) is None
+    cache._store(compile_quiz(1, PAYLOAD, updated_at=version + timedelta(seconds=1)))
+    assert len(cache) == 1
+    for quiz_id in (2, 3):
+        cache._store(compile_quiz(quiz_id, PAYLOAD, updated_at=version))
+    assert len(cache) == 2 and cache._lookup(1, version + timedelta(seconds=1)) is None
+
+
+def test_batch_grading_matches_single_attempt_grading():
+    pytest.importorskip("numpy")
+    quiz = compile_quiz(1, PAYLOAD)
+    attempts = [
+        {"q1": "b", "q2": ["1", "0"], "q3": "Paris"},
+        {"q1": ["b", "zz"], "q2": ["0", "1", "2"], "q3": "London"},
+        {"q1": "a", "q2": ["1", "0", "zz"]},
+        {},
+    ]
+    graded = grade_batch(quiz, attempts)
+    assert graded.payloads() == [quiz.grade(answers) for answers in attempts]
+    assert graded.earned_points.tolist() == [7, 0, 0, 0]
+
+
+def test_normalized_tables_cover_schemas():
+    assert set(QuestionSchema.model_fields) - {"id", "answers"} == set(QUESTION_FIELDS)
+    assert set(AnswerSchema.model_fields) - {"id"} == set(ANSWER_FIELDS)
+    assert set(QUESTION_FIELDS) <= set(QuizQuestion.__table__.c.keys())
+    assert set(ANSWER_FIELDS) <= set(QuizAnswer.__table__.c.keys())
+
+
+def test_deleting_last_normalized_question_leaves_quiz_empty():
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import Session
+
+    from shared_models import Quiz, delete_question, load_quiz_payload
+
+    engine = create_engine("sqlite://")
+    tables = [Quiz.__table__, QuizQuestion.__table__, QuizAnswer.__table__]
+    Quiz.metadata.create_all(engine, tables=tables)
+    with Session(engine) as db:
+        # The JSON snapshot still holds the question that is deleted below.
+        quiz = Quiz(id=1, creator_id=1, title="Quiz", payload=PAYLOAD, questions_normalized=True)
+        db.add(quiz)
+        db.flush()
+        db.execute(insert(QuizQuestion.__table__).values(quiz_id=1, question_key="q1", position=0, text="2 + 2"))
+
+        assert [question.id for question in load_quiz_payload(db, 1).questions] == ["q1"]
+        assert delete_question(db, 1, "q1")
+        assert load_quiz_payload(db, 1).questions == []
+        assert QuizCache().load(db, 1).questions == ()
+        assert QuizCache().get(quiz).questions == ()
+
+
+def test_progress_answers_track_nested_changes():
+    progress = QuizProgress(answers={"answers": {}})
+    state = inspect(progress)
+    state._commit_all(state.dict)
+    assert not state.modified
+    progress.answers["answers"]["q1"] = "b"
+    assert state.modified
+    assert progress.answers == {"answers": {"q1": "b"}}
+
+
+def test_score_histogram_buckets():
+    assert [score_bucket(p) for p in (0, 9.99, 10, 55.5, 90, 100)] == [0, 0, 1, 5, 9, 9]
+
+
+def test_course_completions_are_keyed_by_progress_and_item():
+    table = QuizCourseItemCompletion.__table__
+    assert [column.name for column in table.primary_key] == ["progress_id", "item_id"]
+    assert {index.name for index in CourseProgress.__table__.indexes} >= {"ix_quiz_course_progress_user_course"}
+    assert CourseProgress.__table__.c.completed_required_count.server_default.arg == "0"
+
+
+def course_db():
+    from sqlalchemy import create_engine, event
+
+    from shared_models import QuizCourse, QuizCourseItem
+
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def _functions(connection, record):
+        # Как в PostgreSQL, least() пропускает NULL.
+        connection.create_function("least", -1, lambda *values: min((v for v in values if v is not None), default=None))
+
+    tables = [
+        QuizCourse.__table__,
+        QuizCourseItem.__table__,
+        CourseProgress.__table__,
+        QuizCourseItemCompletion.__table__,
+    ]
+    QuizCourse.metadata.create_all(engine, tables=tables)
+    return engine
+
+
+def test_rebuild_course_progress_counts_required_items():
+    from sqlalchemy import insert, select
+    from sqlalchemy.orm import Session
+
+    from shared_models import QuizCourse, QuizCourseItem
+    from shared_models.course_progress import rebuild_course_progress
+
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with Session(course_db()) as db:
+        db.execute(
+            insert(QuizCourse.__table__),
+            [
+                {"id": course, "creator_id": 1, "title": "Course", "created_at": now, "updated_at": now}
+                for course in (1, 2, 3)
+            ],
+        )
+        db.execute(
+            insert(QuizCourseItem.__table__),
+            [
+                {"id": 10, "course_id": 1, "quiz_id": 1, "order_index": 0, "is_required": True},
+                {"id": 11, "course_id": 1, "quiz_id": 2, "order_index": 1, "is_required": False},
+                {"id": 12, "course_id": 1, "quiz_id": 3, "order_index": 2, "is_required": True},
+                # Без обязательных элементов засчитываются все.
+                {"id": 20, "course_id": 2, "quiz_id": 1, "order_index": 0, "is_required": False},
+                {"id": 21, "course_id": 2, "quiz_id": 2, "order_index": 1, "is_required": False},
+            ],
+        )
+        db.execute(
+            insert(CourseProgress.__table__),
+            [
+                {"id": 1, "user_id": 1, "course_id": 1},
+                {"id": 2, "user_id": 1, "course_id": 2},
+                {"id": 3, "user_id": 2, "course_id": 1},
+                {"id": 4, "user_id": 1, "course_id": 3},
+            ],
+        )
+        db.execute(
+            insert(QuizCourseItemCompletion.__table__),
+            [
+                {"progress_id": progress, "item_id": item, "completed_at": now}
+                for progress, item in [(1, 10), (1, 11), (2, 20), (3, 10), (3, 12)]
+            ],
+        )
+        for course in (1, 2, 3):
+            rebuild_course_progress(db, course)
+
+        table = CourseProgress.__table__
+        rows = db.execute(
+            select(
+                table.c.id,
+                table.c.completed_required_count,
+                table.c.completion_percentage,
+                table.c.current_item_id,
+                table.c.is_completed,
+            ).order_by(table.c.id)
+        ).all()
+        assert [tuple(row) for row in rows] == [
+            (1, 1, 50.0, 12, False),
+            (2, 1, 50.0, 21, False),
+            (3, 2, 100.0, 11, True),
+            (4, 0, 0.0, None, False),
+        ]
+
+
+class RecordingConnection:
+    def __init__(self, locked):
+        self.locked = locked
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        from sqlalchemy.dialects import postgresql
+
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return SimpleNamespace(all=lambda: self.locked if len(self.statements) == 1 else [])
+
+
+def test_complete_quiz_gates_sequential_items_per_progress():
+    from shared_models.course_progress import complete_quiz
+
+    connection = RecordingConnection(locked=[])
+    assert complete_quiz(connection, 7, 3, result_id=9) == []
+    assert len(connection.statements) == 1
+    assert "FOR NO KEY UPDATE OF quiz_course_progress" in connection.statements[0]
+
+    connection = RecordingConnection(locked=[SimpleNamespace(id=1)])
+    assert complete_quiz(connection, 7, 3, result_id=9) == []
+    update = connection.statements[1]
+    assert "ON CONFLICT DO NOTHING" in update
+    assert "quiz_courses.is_sequential IS false OR NOT (EXISTS" in update
+    assert "(earlier.order_index, earlier.id) < (quiz_course_items.order_index, quiz_course_items.id)" in update
+    # Проверки выполненных элементов относятся к строке прогресса, а не к любому пользователю.
+    assert "FROM quiz_course_item_completions AS done \nWHERE done.progress_id = quiz_course_progress.id" in update
+    assert update.count("FROM quiz_course_item_completions AS done \n") == 2
+    assert "FROM inserted \nWHERE inserted.progress_id = quiz_course_progress.id" in update
+
+
+def test_passed_results_complete_course_items():
+    from shared_models import course_progress
+
+    calls = []
+    original = course_progress.complete_quiz
+    course_progress.complete_quiz = lambda connection, user_id, quiz_id, **kwargs: calls.append(
+        (user_id, quiz_id, kwargs)
+    )
+    try:
+        course_progress._complete_course_items(None, None, SimpleNamespace(passed=False, user_id=1, quiz_id=2, id=3))
+        assert calls == []
+        course_progress._complete_course_items(None, None, SimpleNamespace(passed=True, user_id=1, quiz_id=2, id=3))
+        assert calls == [(1, 2, {"result_id": 3})]
+    finally:
+        course_progress.complete_quiz = original
+
+
+def test_quiz_access_decision():
+    row = SimpleNamespace(
+        creator_id=1,
+        status=QuizStatus.PUBLISHED,
+        access_type=QuizAccessType.PAID,
+        max_attempts=2,
+        attempts=2,
+        resume_attempt_id=None,
+        paid=True,
+    )
+    assert decide_access(5, None, row).reason == QuizAccessReason.LOGIN_REQUIRED
+    assert decide_access(5, 2, row).reason == QuizAccessReason.ATTEMPTS_EXHAUSTED
+    assert decide_access(5, 2, SimpleNamespace(**{**vars(row), "resume_attempt_id": 9})).resume_attempt_id == 9
+    assert (
+        decide_access(5, 2, SimpleNamespace(**{**vars(row), "paid": False})).reason == QuizAccessReason.PAYMENT_REQUIRED
+    )
+    assert decide_access(5, 1, row).allowed
+    assert decide_access(5, 2, None).reason == QuizAccessReason.NOT_FOUND
+
+
+def test_sweeper_index_only_covers_live_attempts():
+    index = next(index for index in QuizProgress.__table__.indexes if index.name == "ix_quiz_progress_in_progress")
+    assert [column.name for column in index.columns] == ["updated_at"]
+    assert "IN_PROGRESS" in str(index.dialect_options["postgresql"]["where"])
+
+
+class SweeperSession:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+        self.added = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        rows = self.results.pop(0)
+        return SimpleNamespace(all=lambda: rows)
+
+    def add_all(self, objects):
+        self.added.extend(objects)
+
+    def flush(self):
+        pass
+
+
+def test_sweeper_locks_idle_and_timed_out_attempts():
+    from sqlalchemy.dialects import postgresql
+
+    from shared_models.quiz_sweeper import sweep_abandoned_attempts
+
+    now = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+    db = SweeperSession([])
+    assert sweep_abandoned_attempts(db, now=now, idle_timeout=timedelta(hours=1), grace=timedelta(minutes=2)) == 0
+    assert len(db.statements) == 1
+
+    compiled = db.statements[0].compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    assert "FOR UPDATE OF quiz_progress SKIP LOCKED" in sql
+    assert "quiz_progress.updated_at < %(updated_at_1)s" in sql
+    assert "quiz_progress.started_at + make_interval(" in sql and "quizzes.time_limit_minutes) < %(param_1)s" in sql
+    assert "ORDER BY quiz_progress.updated_at" in sql
+    assert compiled.params["updated_at_1"] == now - timedelta(hours=1)
+    assert compiled.params["param_1"] == now - timedelta(minutes=2)
+    assert compiled.params["param_2"] == 500
+
+
+def test_sweeper_grades_partial_attempts():
+    from shared_models.quiz_sweeper import sweep_abandoned_attempts
+
+    started = datetime(2026, 3, 1, 10, tzinfo=timezone.utc)
+    stale = [SimpleNamespace(id=attempt, updated_at=started + timedelta(minutes=attempt)) for attempt in (1, 2, 3, 4)]
+    abandoned = [
+        SimpleNamespace(
+            id=1, user_id=5, quiz_id=1, answers={"answers": {"q1": "b", "q3": "Paris"}}, started_at=started
+        ),
+        # Без ответов результат не записывается.
+        SimpleNamespace(id=2, user_id=5, quiz_id=1, answers={"answers": {}}, started_at=started),
+        SimpleNamespace(id=3, user_id=6, quiz_id=1, answers=None, started_at=started),
+        # Квиз удалён.
+        SimpleNamespace(id=4, user_id=6, quiz_id=2, answers={"answers": {"q1": "a"}}, started_at=started),
+    ]
+    db = SweeperSession(stale, abandoned)
+    quizzes = {1: compile_quiz(1, PAYLOAD, passing_score=50)}
+    cache = SimpleNamespace(load=lambda db, quiz_id: quizzes.get(quiz_id))
+    assert sweep_abandoned_attempts(db, grade=True, cache=cache) == 4
+    assert "ABANDONED" in str(db.statements[1].compile(compile_kwargs={"literal_binds": True}))
+
+    [result] = db.added
+    assert (result.user_id, result.quiz_id, result.attempt_id) == (5, 1, 1)
+    assert (result.correct_answers, result.earned_points, result.total_points) == (2, 5, 7)
+    assert result.passed and result.time_spent_seconds == 60
+    assert result.result_payload["earned_points"] == 5
+
+
+def test_bundle_reader_checks_header():
+    msgpack = pytest.importorskip("msgpack")
+    zstandard = pytest.importorskip("zstandard")
+    records = [{"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION}, {"kind": "quiz", "id": 1, "payload": PAYLOAD}]
+    bundle = zstandard.ZstdCompressor().compress(b"".join(msgpack.packb(record) for record in records))
+    assert list(iter_bundle(io.BytesIO(bundle))) == records[1:]
+    with pytest.raises(ValueError):
+        list(iter_bundle(io.BytesIO(b"{}")))
+
+
+def test_incident_buffer_collapses_repeats():
+    buffer = AntiCheatIncidentBuffer(max_incidents=4, max_age=timedelta(minutes=1), repeat_window=timedelta(seconds=5))
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    incident = {"session_id": "s1", "user_id": 1, "session_type": "quiz", "incident_type": "focus_loss"}
+    assert not buffer.record(incident, at=start)
+    assert not buffer.record(incident, at=start + timedelta(seconds=1))
+    assert not buffer.record(dict(incident, incident_type="dev_tools_detected"), at=start + timedelta(seconds=2))
+    assert not buffer.record(incident, at=start + timedelta(seconds=3))
+    assert buffer.record(dict(incident, session_id="s2"), at=start + timedelta(seconds=3))
+    rows = buffer.drain(now=start + timedelta(seconds=3))
+    assert [row["incident_type"] for row in rows] == ["focus_loss", "dev_tools_detected", "focus_loss", "focus_loss"]
+    assert rows[0]["metadata"]["repeat_count"] == 1
+    assert len(buffer) == 0
+
+
+def test_incident_buffer_counts_repeats_after_flush():
+    class RecordingSession:
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, statement, params=None):
+            self.statements.append((statement.table.name, params))
+
+    buffer = AntiCheatIncidentBuffer(max_age=timedelta(minutes=1), repeat_window=timedelta(seconds=5))
+    start = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    incident = {"session_id": "s1", "user_id": 1, "session_type": "quiz", "incident_type": "focus_loss"}
+    # Время клиента без часового пояса считается UTC.
+    buffer.record(dict(incident, created_at=datetime(2026, 1, 1, 12)), at=start)
+    buffer.record(dict(incident, created_at=start + timedelta(seconds=1)), at=start)
+    db = RecordingSession()
+    assert buffer.flush(db, force=True, now=start).model_dump() == {"inserted": 1, "collapsed": 1}
+    assert db.statements[0][1][0]["created_at"] == start
+
+    # Повтор уже записанного инцидента попадает только в счётчик сессии.
+    buffer.record(dict(incident, created_at=start + timedelta(seconds=2)), at=start + timedelta(seconds=2))
+    assert len(buffer) == 0
+    db = RecordingSession()
+    assert buffer.flush(db, now=start + timedelta(minutes=2)).model_dump() == {"inserted": 0, "collapsed": 1}
+    [(table, [counter])] = db.statements
+    assert table == "anti_cheat_session_counters"
+    assert (counter["violation_count"], counter["repeat_count"]) == (0, 1)
+    assert counter["last_incident_at"] == start + timedelta(seconds=2)
+
+
+def test_violation_decision_against_warnings_limit():
+    config = {"enabled": True, "warnings_limit": 2}
+    assert [decide_violations("s1", count, config).action.value for count in range(4)] == [
+        "none",
+        "warn",
+        "warn",
+        "terminate",
+    ]
+    assert decide_violations("s1", 1, config).warnings_left == 1
+    assert decide_violations("s1", 5, {"enabled": False, "warnings_limit": 2}).action.value == "none"
+    assert decide_violations("s1", 5, None).action.value == "none"
+
+
+def test_incident_partitions_are_monthly():
+    from shared_models.anti_cheat_partitions import PARTITION_PATTERN, add_months, partition_name
+    from shared_models.models import AntiCheatIncident
+
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2027, 1, 1)) == "anti_cheat_incidents_p202701"
+    assert PARTITION_PATTERN.match("anti_cheat_incidents_p202701")
+    assert not PARTITION_PATTERN.match("anti_cheat_incidents_default")
+    table = AntiCheatIncident.__table__
+    assert table.dialect_options["postgresql"]["partition_by"] == "RANGE (created_at)"
+    assert {column.name for column in table.primary_key} == {"id", "created_at"}
+
+
+def test_transcript_budget_keeps_newest_messages():
+    from shared_models.tutor_transcript import fit_budget
+
+    newest_first = [SimpleNamespace(id=i, tokens_used=10, content="") for i in (5, 4, 3)]
+    summaries = [SimpleNamespace(id=1, tokens_used=None, content="x" * 40)]
+    kept_summaries, kept, tokens, cut = fit_budget(summaries, newest_first, 25)
+    assert [row.id for row in kept] == [5, 4] and kept_summaries == [] and tokens == 20 and cut
+    assert fit_budget(summaries, newest_first, None)[2] == 40
+    assert [row.id for row in fit_budget([], newest_first, 1)[1]] == [5]
+
+
+def test_tutor_turn_collects_one_statement_per_table():
+    import asyncio
+    import uuid
+
+    from shared_models import LessonPhase, MessageRole, TutorTurn
+
+    async def reply():
+        for chunk in ("Hel", "lo"):
+            yield chunk
+
+    async def stream(turn):
+        return [chunk async for chunk in turn.stream_assistant(reply(), tokens_used=2)]
+
+    turn = TutorTurn(uuid.uuid4())
+    turn.user("42")
+    turn.add_result("q1", "6 x 7?", student_answer="42", is_correct=True, score=1.0)
+    assert asyncio.run(stream(turn)) == ["Hel", "lo"]
+    turn.advance(phase=LessonPhase.quiz, question_index=1)
+    turn.system("quiz time")
+    assert [kind for kind, _, _ in turn._statements()] == ["messages", "results", "session"]
+    assert [(row["role"], row["content"], row["phase"]) for row in turn._messages] == [
+        (MessageRole.user, "42", LessonPhase.dialog),
+        (MessageRole.assistant, "Hello", LessonPhase.dialog),
+        (MessageRole.system, "quiz time", LessonPhase.quiz),
+    ]
+
+
+if __name__ == "__main__":
+    test_compiled_quiz_grades_attempt()
+    test_quiz_cache_is_keyed_by_version()
+    test_batch_grading_matches_single_attempt_grading()
+    test_normalized_tables_cover_schemas()
+    test_deleting_last_normalized_question_leaves_quiz_empty()
+    test_progress_answers_track_nested_changes()
+    test_score_histogram_buckets()
+    test_course_completions_are_keyed_by_progress_and_item()
+    test_rebuild_course_progress_counts_required_items()
+    test_complete_quiz_gates_sequential_items_per_progress()
+    test_passed_results_complete_course_items()
+    test_quiz_access_decision()
+    test_sweeper_index_only_covers_live_attempts()
+    test_sweeper_locks_idle_and_timed_out_attempts()
+    test_sweeper_grades_partial_attempts()
+    test_bundle_reader_checks_header()
+    test_incident_buffer_collapses_repeats()
+    test_incident_buffer_counts_repeats_after_flush()
+    test_violation_decision_against_warnings_limit()
+    test_incident_partitions_are_monthly()
+    test_transcript_budget_keeps_newest_messages()
+    test_tutor_turn_collects_one_statement_per_table()
+    print("✅ Quiz engine: все проверки пройдены")